@@ -1,20 +1,142 @@
 # main_erp_vue_final.py
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify, render_template_string
 from flask_socketio import SocketIO
 import pandas as pd
 import json
 from datetime import datetime, date, timedelta
 import uuid
+import contextvars
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
 from typing import Dict, List, Any, Optional
+from urllib.parse import unquote
 import os
 
+from change_log import ChangeLog, StoreChanges
+from http_compression import CompressedAsset, compress_response
+from json_provider import make_json_provider
+from metrics import SIZE_BUCKETS, erp_metrics
+from record_history import RecordHistory
+from state_store import SQLiteStateStore
+
+# ==================== METRICS ====================
+# Requests and DataManager operations slower than these thresholds are printed to the slow log
+SLOW_REQUEST_SECONDS = float(os.environ.get('ERP_SLOW_REQUEST_MS', '250')) / 1000
+SLOW_OPERATION_SECONDS = float(os.environ.get('ERP_SLOW_OPERATION_MS', '50')) / 1000
+# How often a long-polling GET /api/changes checks the change log
+CHANGE_POLL_SECONDS = 0.1
+# Multi-process mode: how long a worker serves reads before checking the shared store for other workers' writes
+STATE_REFRESH_SECONDS = float(os.environ.get('ERP_REFRESH_INTERVAL_MS', '5')) / 1000
+
+erp_metrics.describe('request_seconds', 'Latency of each HTTP route, including shared-state sync and compression')
+erp_metrics.describe('response_bytes', 'Size of each HTTP response body as sent (after compression)', SIZE_BUCKETS)
+erp_metrics.describe('operation_seconds', 'Latency of DataManager operations')
+erp_metrics.describe('socketio_emit_seconds', 'Time spent serializing and fanning out each Socket.IO emit')
+erp_metrics.describe('socketio_emits_total', 'Socket.IO emits per event and payload type')
+erp_metrics.describe('slow_total', 'Requests and operations over their slow-log threshold')
+
+def timed_operation(op: str, per_table: bool = False):
+    """Times a DataManager method into operation_seconds (labelled by its table argument if per_table)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            labels = {'op': op, 'table': args[0]} if per_table else {'op': op}
+            start = time.perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                erp_metrics.observe('operation_seconds', elapsed, **labels)
+                if elapsed >= SLOW_OPERATION_SECONDS:
+                    erp_metrics.inc('slow_total', kind='operation')
+                    print(f"SLOW operation {' '.join(labels.values())}: {elapsed * 1000:.1f}ms")
+        return wrapper
+    return decorator
+
 # ==================== DATA MODELS ====================
 
+# Rows map onto this many entity locks per table (by hash of their id), so the locks take fixed memory
+ENTITY_LOCK_STRIPES = 64
+# Longest pause between tries while waiting for a contended entity lock
+ENTITY_LOCK_MAX_PAUSE = 0.05
+
+# Who is making the current request's changes and, for the voice agent, what the user said:
+# (actor, utterance, remote_addr). Actor and utterance come from the X-ERP-Actor / X-ERP-Utterance
+# headers, which any client can set, so the address the request came from is recorded alongside
+# them in the change log.
+current_actor: contextvars.ContextVar = contextvars.ContextVar('current_actor', default=('system', None, None))
+
+class InsufficientStockError(ValueError):
+    pass
+
 class DataManager:
-    def __init__(self, socketio_instance):
+    """
+    In-memory ERP store.
+
+    Concurrency model: every table DataFrame is treated as an immutable snapshot. Writers build
+    a new DataFrame (concat, drop, or copy-then-modify) and publish it with a single attribute
+    swap, so readers that grab e.g. `data_manager.customers` once always see a consistent table
+    and never wait on a lock. Writers to the same table are serialized by that table's lock so
+    no copy-modify-swap can overwrite another; multi-step read-modify-write operations (stock
+    reservation) additionally hold entity locks, striped per table by row id, leaving most
+    unrelated rows free. Table locks are never held across a green-thread switch, so plain
+    threading locks are enough for them. Entity locks are held across cooperative sleeps, and
+    green threads all share one OS thread (eventlet is not monkey-patched), so entity locks
+    track their owner per context and wait with the server's cooperative sleep.
+
+    With a shared `store` (multi-process mode) every write also runs inside a store
+    transaction that first reloads the table if another worker changed it, and readers call
+    refresh() to pick up other workers' writes. Lock order is always
+    entity lock -> store transaction -> table lock.
+    """
+    TABLES = ['customers', 'products', 'employees', 'sales_orders', 'order_items', 'invoices', 'suppliers']
+    # (child table, foreign key column) -> parent table
+    FOREIGN_KEYS = {
+        ('sales_orders', 'customer_id'): 'customers',
+        ('order_items', 'order_id'): 'sales_orders',
+        ('order_items', 'product_id'): 'products',
+        ('invoices', 'order_id'): 'sales_orders',
+        ('invoices', 'customer_id'): 'customers',
+        ('products', 'supplier_id'): 'suppliers',
+    }
+    # Table -> prefix of its data_update event names (customer_added, order_deleted, ...)
+    EVENT_PREFIXES = {'customers': 'customer', 'products': 'product', 'employees': 'employee', 'sales_orders': 'order',
+                      'order_items': 'item', 'invoices': 'invoice', 'suppliers': 'supplier'}
+    CHANGE_EVENTS = {'insert': 'added', 'update': 'updated', 'delete': 'deleted'}
+
+    def __init__(self, socketio_instance, store: Optional[SQLiteStateStore] = None):
         self.socketio = socketio_instance
+        self.store = store
+        # Fine-grained locks: striped per table by row id for row writes, one per table for appends/drops
+        self._entity_locks = {name: [threading.Lock() for _ in range(ENTITY_LOCK_STRIPES)] for name in self.TABLES}
+        # The (table, stripe) entity locks the current thread or green thread holds, for re-entry
+        self._held_entity_locks = contextvars.ContextVar(f'held_entity_locks_{id(self)}', default=frozenset())
+        self._table_locks = {name: threading.RLock() for name in self.TABLES}
         self._initialize_sample_data()
+        # Per-table mutation counters, used by clients (e.g. the voice agent's
+        # response cache) to detect whether cached answers are still valid.
+        self.data_versions = {name: 0 for name in self.TABLES}
+        # Ordered log of every row change, for clients catching up after a disconnect (GET /api/changes)
+        self.change_log = ChangeLog(spill=StoreChanges(store) if store is not None else None)
+        # Sequence number of the calling request's latest change (a context var, so each green thread has its own)
+        self._last_change = contextvars.ContextVar('last_change_seq', default=None)
+        # Changes held back by an _atomic_changes() block until it succeeds (None outside one)
+        self._pending_changes = contextvars.ContextVar('pending_changes', default=None)
+        # Per-record version chains built from the change log (GET /api/<entity>/<id>/history)
+        self.history = RecordHistory()
+        self._columns = {name: list(getattr(self, name).columns) for name in self.TABLES}
+        self._rebuild_indexes()
+        if self.store is not None:
+            seeded = self.store.seed({name: [self._clean_record(r) for r in getattr(self, name).to_dict('records')]
+                                      for name in self.TABLES})
+            # Force a load from the store unless this worker just wrote its own data there
+            self._store_versions = {name: (0 if seeded else -1) for name in self.TABLES}
+            self.refresh()
+        self._refreshed_at = time.monotonic()
 
     def _initialize_sample_data(self):
         # Customers
@@ -42,6 +164,7 @@ class DataManager:
             {'id': 'ord002', 'customer_id': 'cust002', 'order_date': '2024-05-28', 'status': 'Pending', 'total_amount': 899.97, 'shipping_address': '456 Innovation Blvd, SF', 'notes': 'Standard delivery'}
         ]
         self.sales_orders = pd.DataFrame(order_data)
+        self.order_items = pd.DataFrame(columns=['id', 'order_id', 'product_id', 'quantity', 'unit_price'])
 
         invoice_data = [
             {'id': 'inv001', 'invoice_number': 'INV001', 'order_id': 'ord001', 'customer_id': 'cust001', 'issue_date': '2024-05-25', 'due_date': '2024-06-24', 'total_amount': 1499.95, 'status': 'Paid', 'paid_amount': 1499.95},
@@ -55,26 +178,257 @@ class DataManager:
     def generate_id(self, prefix=''):
         return prefix + str(uuid.uuid4())[:8]
 
+    @contextmanager
+    def _entity_lock(self, df_name: str, *item_ids: str):
+        """
+        Holds the entity locks of the given rows of df_name. Re-entrant within a thread or green
+        thread; stripes are taken in index order, so callers locking several rows can't deadlock.
+        """
+        held = self._held_entity_locks.get()
+        stripes = sorted({(df_name, hash(str(item_id)) % ENTITY_LOCK_STRIPES) for item_id in item_ids} - held)
+        acquired = []
+        try:
+            for table, stripe in stripes:
+                lock = self._entity_locks[table][stripe]
+                pause = 0.001
+                while not lock.acquire(blocking=False):
+                    self.socketio.sleep(pause)
+                    pause = min(pause * 2, ENTITY_LOCK_MAX_PAUSE)
+                acquired.append(lock)
+            token = self._held_entity_locks.set(held | set(stripes))
+            try:
+                yield
+            finally:
+                self._held_entity_locks.reset(token)
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def _commit_change(self, df_name: str, upserted: List[Dict] = (), deleted: List[Dict] = (), op: str = 'update',
+                       previous: Optional[Dict] = None):
+        """
+        Records a mutation: persists it to the shared store transaction (if any), appends it to the
+        change log and bumps the table version. `op` says whether the upserted rows are new ('insert');
+        `previous` is the row before an update and `deleted` holds the removed rows.
+        """
+        changes = []
+        for record in upserted:
+            data = self._clean_record(record)
+            before = ({col: previous.get(col) for col, value in data.items() if previous.get(col) != value}
+                      if previous is not None else None)
+            changes.append(self._change(df_name, op, record['id'], data, before))
+        changes += [self._change(df_name, 'delete', record['id'], None, self._clean_record(record)) for record in deleted]
+        txn = self.store.current_transaction() if self.store is not None else None
+        if txn is None:
+            pending = self._pending_changes.get()
+            if pending is not None:
+                pending.append((df_name, changes))
+            else:
+                self._publish_changes([(df_name, changes)])
+            return
+        for change in changes:
+            if change['data'] is not None:
+                txn.upsert(df_name, change['data'])
+            else:
+                txn.delete(df_name, change['id'])
+            self._last_change.set(txn.log_change(change))
+        self.data_versions[df_name] = self._store_versions[df_name] = txn.bump(df_name)
+
+    def _publish_changes(self, batches: List[tuple]):
+        """Appends (table, changes) batches to the change log and history and bumps each table's version once."""
+        for _, changes in batches:
+            for change in changes:
+                self._last_change.set(self.change_log.record(change))
+                self.history.apply(change)
+        for df_name in dict.fromkeys(df_name for df_name, _ in batches):
+            self.data_versions[df_name] = self.data_versions.get(df_name, 0) + 1
+
+    @contextmanager
+    def _atomic_changes(self):
+        """
+        Publishes the changes written inside the block only if the whole block succeeds, so writes
+        that are undone after a failure never reach the change log, the history or data_versions.
+        In multi-process mode the store transaction already gives this.
+        """
+        if self.store is not None or self._pending_changes.get() is not None:
+            yield
+            return
+        pending = []
+        token = self._pending_changes.set(pending)
+        try:
+            yield
+        finally:
+            self._pending_changes.reset(token)
+        self._publish_changes(pending)
+
+    def _change(self, df_name: str, op: str, item_id: str, data: Optional[Dict], before: Optional[Dict]) -> Dict:
+        # before: the changed columns' old values for updates, the whole row for deletes
+        actor, utterance, remote_addr = current_actor.get()
+        return {'table': df_name, 'op': op, 'id': item_id, 'data': data, 'before': before,
+                'type': f"{self.EVENT_PREFIXES.get(df_name, df_name)}_{self.CHANGE_EVENTS[op]}",
+                'timestamp': datetime.now().isoformat(), 'actor': actor, 'utterance': utterance,
+                'remote_addr': remote_addr}
+
+    def wait_for_changes(self, since: int, timeout: float = 0, limit: int = 500, tables: Optional[set] = None) -> Dict:
+        """Long-poll: the change log after `since`, waiting up to `timeout` seconds for a (matching) change."""
+        deadline = time.monotonic() + timeout
+        while True:
+            result = self.change_log.read(since, limit, tables)
+            if result['changes'] or result['reset'] or time.monotonic() >= deadline:
+                return result
+            since = result['cursor']  # skip past changes to other tables
+            # Cooperative sleep: the server runs on eventlet green threads
+            self.socketio.sleep(CHANGE_POLL_SECONDS)
+
+    # ==================== SHARED STORE SYNC ====================
+
+    @contextmanager
+    def _store_write(self, df_name: str):
+        """Joins or opens a shared-store transaction, reloading df_name first if another worker changed it."""
+        if self.store is None:
+            yield
+            return
+        with self.store.transaction() as txn:
+            versions, last_change = dict(self.data_versions), self._last_change.get()
+            try:
+                if txn.get_version(df_name) != self._store_versions[df_name]:
+                    self._reload_table(df_name)
+                yield
+            except BaseException:
+                # The store rolls back, so make the next refresh reload whatever this worker changed,
+                # and take back the version bumps and sequence number that were never committed
+                for name in txn.touched:
+                    self._store_versions[name] = -1
+                    self.data_versions[name] = versions.get(name, 0)
+                self._last_change.set(last_change)
+                raise
+
+    @timed_operation('refresh')
+    def refresh(self):
+        """Reloads every table another worker has changed since this worker last saw it."""
+        if self.store is None:
+            return
+        for name, version in self.store.versions().items():
+            if name in self._store_versions and version != self._store_versions[name]:
+                self._reload_table(name)
+
+    def refresh_if_stale(self, max_age: float):
+        """refresh(), unless this worker already checked the store within the last max_age seconds."""
+        if self.store is None or time.monotonic() - self._refreshed_at < max_age:
+            return
+        self._refreshed_at = time.monotonic()
+        self.refresh()
+
+    def _reload_table(self, df_name: str):
+        records, version = self.store.load(df_name)
+        df = pd.DataFrame(records, columns=self._columns[df_name])
+        with self._table_locks[df_name]:
+            setattr(self, df_name, df)
+            self._reindex_table(df_name)
+            self.data_versions[df_name] = self._store_versions[df_name] = version
+
+    # ==================== INDEXES ====================
+
+    @staticmethod
+    def _parse_flag(value, name: str) -> bool:
+        """Strict boolean: JSON true/false or the strings 'true'/'false' (any case); anything else is a ValueError."""
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+            return value.strip().lower() == 'true'
+        raise ValueError(f"'{name}' must be true or false")
+
+    @staticmethod
+    def _is_missing(value) -> bool:
+        return not isinstance(value, (list, dict)) and pd.isna(value)
+
+    @classmethod
+    def _clean_record(cls, record: Dict) -> Dict:
+        return {k: (None if cls._is_missing(v) else v) for k, v in record.items()}
+
+    def _rebuild_indexes(self):
+        """
+        Builds the primary-key index (table -> id -> record) and the foreign-key indexes
+        ((table, column) -> parent id -> set of child ids). Both are kept up to date
+        incrementally by the add/update/delete helpers, so joins touch only related rows.
+        """
+        self.pk_index = {name: {} for name in self.TABLES}
+        self.fk_index = {key: defaultdict(set) for key in self.FOREIGN_KEYS}
+        for name in self.TABLES:
+            self._reindex_table(name)
+
+    def _reindex_table(self, df_name: str):
+        # Build fresh index structures and swap them in, so concurrent readers never see a partial index
+        records = [self._clean_record(r) for r in getattr(self, df_name).to_dict('records')]
+        self.pk_index[df_name] = {r['id']: r for r in records}
+        for (table, column) in self.FOREIGN_KEYS:
+            if table == df_name:
+                index = defaultdict(set)
+                for r in records:
+                    if r.get(column):
+                        index[r[column]].add(r['id'])
+                self.fk_index[(table, column)] = index
+
+    def _index_record(self, df_name: str, record: Dict):
+        self.pk_index[df_name][record['id']] = record
+        for (table, column) in self.FOREIGN_KEYS:
+            if table == df_name and record.get(column):
+                self.fk_index[(table, column)][record[column]].add(record['id'])
+
+    def _unindex_record(self, df_name: str, record: Dict):
+        self.pk_index[df_name].pop(record['id'], None)
+        for (table, column) in self.FOREIGN_KEYS:
+            if table == df_name and record.get(column):
+                children = self.fk_index[(table, column)].get(record[column])
+                if children is not None:
+                    children.discard(record['id'])
+                    if not children:
+                        del self.fk_index[(table, column)][record[column]]
+
+    def get_record(self, df_name: str, item_id: str) -> Optional[Dict]:
+        return self.pk_index[df_name].get(item_id)
+
+    def get_related(self, df_name: str, fk_column: str, parent_id: str) -> List[Dict]:
+        # Copy the id set first; writers may mutate it concurrently
+        child_ids = tuple(self.fk_index[(df_name, fk_column)].get(parent_id, ()))
+        records = self.pk_index[df_name]
+        return [records[child_id] for child_id in child_ids if child_id in records]
+
+    def _emit(self, event: str, payload: Dict, payload_type: str):
+        start = time.perf_counter()
+        self.socketio.emit(event, payload, namespace='/')
+        erp_metrics.observe('socketio_emit_seconds', time.perf_counter() - start, event=event)
+        erp_metrics.inc('socketio_emits_total', event=event, type=payload_type)
+
     def _broadcast_update(self, event_type: str, data: Dict):
         # Ensure data is clean before broadcasting
-        cleaned_data = {k: (v if pd.notna(v) else None) for k, v in data.items()}
+        cleaned_data = self._clean_record(data)
         try:
-            self.socketio.emit('data_update', {'type': event_type, 'data': cleaned_data, 'timestamp': datetime.now().isoformat()}, namespace='/')
+            # seq: the change log position after this update, so a client can resume from it (GET /api/changes)
+            self._emit('data_update', {'type': event_type, 'data': cleaned_data, 'timestamp': datetime.now().isoformat(),
+                                       'seq': self._last_change.get()}, event_type)
             print(f"Broadcasted data_update: {event_type}")
         except Exception as e:
             print(f"Broadcast data_update error: {e}")
 
     def broadcast_ui_instruction(self, instruction: Dict):
         try:
-            self.socketio.emit('ui_instruction', instruction, namespace='/')
+            self._emit('ui_instruction', instruction, str(instruction.get('action')))
             print(f"Broadcasted ui_instruction: {instruction.get('action')}")
         except Exception as e:
             print(f"Broadcast ui_instruction error: {e}")
 
-    def _add_item(self, df_name: str, data: Dict, prefix: str, required_fields: List[str] = None) -> Optional[Dict]:
+    @timed_operation('add', per_table=True)
+    def _add_item(self, df_name: str, data: Dict, prefix: str, required_fields: List[str] = None, broadcast: bool = True) -> Optional[Dict]:
         if required_fields and any(not data.get(f) for f in required_fields):
             return None
-        
+        with self._store_write(df_name), self._table_locks[df_name]:
+            full_record = self._append_record(df_name, data, prefix)
+        if broadcast:
+            self._broadcast_update(f'{prefix}_added', full_record)
+        return full_record
+
+    def _append_record(self, df_name: str, data: Dict, prefix: str) -> Dict:
         df = getattr(self, df_name)
         new_id = self.generate_id(prefix)
         
@@ -97,32 +451,54 @@ class DataManager:
         
         new_row = pd.DataFrame([full_record])
         setattr(self, df_name, pd.concat([df, new_row], ignore_index=True))
-        
-        self._broadcast_update(f'{prefix}_added', full_record)
+        self._index_record(df_name, self._clean_record(full_record))
+        self._commit_change(df_name, upserted=[full_record], op='insert')
         return full_record
 
-    def _update_item(self, df_name: str, item_id: str, data: Dict, prefix: str, lookup_col: str = 'id') -> Optional[Dict]:
+    @timed_operation('update', per_table=True)
+    def _update_item(self, df_name: str, item_id: str, data: Dict, prefix: str, lookup_col: str = 'id', broadcast: bool = True) -> Optional[Dict]:
+        with self._entity_lock(df_name, item_id), self._store_write(df_name), self._table_locks[df_name]:
+            updated_data = self._apply_update(df_name, item_id, data, lookup_col)
+        if updated_data is not None and broadcast:
+            self._broadcast_update(f'{prefix}_updated', updated_data)
+        return updated_data
+
+    def _apply_update(self, df_name: str, item_id: str, data: Dict, lookup_col: str) -> Optional[Dict]:
         df = getattr(self, df_name)
         idx = df[df[lookup_col] == item_id].index
         if not idx.empty:
-            cleaned_data = {k: (v if pd.notna(v) and v != '' else None) for k, v in data.items()}
+            # Copy-on-write: readers holding the old snapshot never see a half-applied update
+            df = df.copy()
+            previous = self.pk_index[df_name].get(df.at[idx[0], 'id'])
+            cleaned_data = {k: (None if self._is_missing(v) or v == '' else v) for k, v in data.items()}
             for key, value in cleaned_data.items():
                 if key in df.columns and key != 'id':
                     df.loc[idx[0], key] = value
             updated_data = df.loc[idx[0]].to_dict()
-            self._broadcast_update(f'{prefix}_updated', updated_data)
+            setattr(self, df_name, df)
+            if previous is not None:
+                self._unindex_record(df_name, previous)
+            self._index_record(df_name, self._clean_record(updated_data))
+            self._commit_change(df_name, upserted=[updated_data], previous=previous)
             return updated_data
         return None
     
-    def _delete_item(self, df_name: str, item_id: str, prefix: str, lookup_col: str = 'id') -> Optional[Dict]:
-        df = getattr(self, df_name)
-        idx = df[df[lookup_col] == item_id].index
-        if not idx.empty:
+    @timed_operation('delete', per_table=True)
+    def _delete_item(self, df_name: str, item_id: str, prefix: str, lookup_col: str = 'id', broadcast: bool = True) -> Optional[Dict]:
+        with self._entity_lock(df_name, item_id), self._store_write(df_name), self._table_locks[df_name]:
+            df = getattr(self, df_name)
+            idx = df[df[lookup_col] == item_id].index
+            if idx.empty:
+                return None
             deleted_item_data = df.loc[idx[0]].to_dict()
             setattr(self, df_name, df.drop(idx).reset_index(drop=True))
+            deleted_records = df.loc[idx].to_dict('records')
+            for record in deleted_records:
+                self._unindex_record(df_name, record)
+            self._commit_change(df_name, deleted=deleted_records)
+        if broadcast:
             self._broadcast_update(f'{prefix}_deleted', deleted_item_data)
-            return deleted_item_data
-        return None
+        return deleted_item_data
 
     def add_customer(self, data: Dict) -> Optional[Dict]: return self._add_item('customers', data, 'customer', ['name', 'email'])
     def update_customer(self, id: str, data: Dict) -> Optional[Dict]: return self._update_item('customers', id, data, 'customer')
@@ -139,7 +515,110 @@ class DataManager:
     def add_invoice(self, data: Dict) -> Optional[Dict]: return self._add_item('invoices', data, 'invoice', ['customer_id', 'total_amount'])
     def update_invoice(self, id: str, data: Dict) -> Optional[Dict]: return self._update_item('invoices', id, data, 'invoice')
     def delete_invoice(self, id: str) -> Optional[Dict]: return self._delete_item('invoices', id, 'invoice')
+
+    @timed_operation('place_order')
+    def place_order(self, data: Dict) -> Dict:
+        """
+        Atomically reserves stock for the line items, creates the order, its items and (by default)
+        an invoice, then emits a single 'order_placed' broadcast.
+
+        Only the entity locks of the products being ordered are held while stock is checked and
+        decremented, so orders for unrelated products proceed in parallel. Raises ValueError for invalid input and
+        InsufficientStockError if any product cannot cover its quantity; nothing is written then.
+        If a write fails part-way, the earlier ones are undone and none of them is published to the
+        change log, the record history or data_versions.
+        """
+        if not isinstance(data, dict):
+            raise ValueError('An order must be a JSON object')
+        customer_id = data.get('customer_id')
+        if self.get_record('customers', customer_id) is None:
+            raise ValueError(f"Unknown customer '{customer_id}'")
+        items = data.get('items') or []
+        if not isinstance(items, list):
+            raise ValueError("'items' must be a list of {product_id, quantity} objects")
+        quantities = defaultdict(int)
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('product_id'), str):
+                raise ValueError(f"Invalid line item {item!r}, expected {{product_id, quantity}}")
+            try:
+                quantity = int(item.get('quantity') or 0)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid quantity for product '{item['product_id']}'")
+            if quantity <= 0:
+                raise ValueError(f"Invalid quantity for product '{item.get('product_id')}'")
+            quantities[item.get('product_id')] += quantity
+        if not quantities:
+            raise ValueError('An order needs at least one line item')
+        order_date = data.get('order_date') or datetime.now().strftime('%Y-%m-%d')
+        try:
+            issue_date = datetime.strptime(str(order_date), '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Invalid order_date {order_date!r}, expected YYYY-MM-DD")
+        create_invoice = self._parse_flag(data.get('create_invoice', True), 'create_invoice')
+        due_days = data.get('due_days')
+        if due_days in (None, ''):
+            due_days = 30
+        elif isinstance(due_days, bool) or not str(due_days).isdigit():
+            raise ValueError(f"Invalid due_days {due_days!r}, expected a whole number of days")
+        else:
+            due_days = int(due_days)
+
+        product_ids = sorted(quantities)
+        reserved, created = [], []
+        with ExitStack() as stack:
+            stack.enter_context(self._entity_lock('products', *product_ids))
+            # In multi-process mode this also serializes against other workers and reloads stale stock
+            stack.enter_context(self._store_write('products'))
+            stack.enter_context(self._atomic_changes())
+            products = {pid: self.get_record('products', pid) for pid in product_ids}
+            unknown = [pid for pid, product in products.items() if product is None]
+            if unknown:
+                raise ValueError(f"Unknown products: {', '.join(map(str, unknown))}")
+            short = [pid for pid in product_ids if (products[pid].get('stock_quantity') or 0) < quantities[pid]]
+            if short:
+                raise InsufficientStockError('Insufficient stock for ' + ', '.join(
+                    f"{products[pid]['name']} ({products[pid].get('stock_quantity') or 0} left, {quantities[pid]} requested)" for pid in short))
+
+            try:
+                for product_id in product_ids:
+                    new_stock = int(products[product_id].get('stock_quantity') or 0) - quantities[product_id]
+                    reserved.append(self._update_item('products', product_id, {'stock_quantity': new_stock}, 'product', broadcast=False))
+
+                total = round(sum(float(products[pid].get('price') or 0) * qty for pid, qty in quantities.items()), 2)
+                order = self._add_item('sales_orders', {
+                    'customer_id': customer_id, 'order_date': order_date, 'status': data.get('status') or 'Pending',
+                    'total_amount': total, 'shipping_address': data.get('shipping_address'), 'notes': data.get('notes'),
+                }, 'order', broadcast=False)
+                created.append(('sales_orders', order['id']))
+                items = []
+                for pid, qty in quantities.items():
+                    items.append(self._add_item('order_items', {
+                        'order_id': order['id'], 'product_id': pid, 'quantity': qty, 'unit_price': products[pid].get('price'),
+                    }, 'item', broadcast=False))
+                    created.append(('order_items', items[-1]['id']))
+
+                invoice = None
+                if create_invoice:
+                    invoice = self._add_item('invoices', {
+                        'invoice_number': self.generate_id('INV-').upper(), 'order_id': order['id'], 'customer_id': customer_id,
+                        'issue_date': order_date, 'due_date': (issue_date + timedelta(days=due_days)).strftime('%Y-%m-%d'),
+                        'total_amount': total, 'paid_amount': 0.0, 'status': 'Pending',
+                    }, 'invoice', broadcast=False)
+            except Exception:
+                # Undo everything written so far, newest first (_atomic_changes drops these from the change log too)
+                for df_name, item_id in reversed(created):
+                    self._delete_item(df_name, item_id, '', broadcast=False)
+                for product_id, _ in zip(product_ids, reserved):
+                    self._update_item('products', product_id, {'stock_quantity': products[product_id].get('stock_quantity')}, 'product', broadcast=False)
+                raise
+
+        result = {'id': order['id'], 'order': self._clean_record(order), 'items': [self._clean_record(i) for i in items],
+                  'invoice': self._clean_record(invoice) if invoice else None,
+                  'products': [self._clean_record(p) for p in reserved]}
+        self._broadcast_update('order_placed', result)
+        return result
     
+    @timed_operation('get_dashboard_metrics')
     def get_dashboard_metrics(self) -> Dict:
         return {
             'total_customers': len(self.customers) if not self.customers.empty else 0,
@@ -148,23 +627,309 @@ class DataManager:
             'total_employees': len(self.employees) if not self.employees.empty else 0,
             'total_invoices': len(self.invoices) if not self.invoices.empty else 0,
         }
+
+    # ==================== JOINED VIEWS ====================
+
+    @timed_operation('get_invoice_details')
+    def get_invoice_details(self, invoice_id: str) -> Optional[Dict]:
+        invoice = self.get_record('invoices', invoice_id)
+        if invoice is None:
+            return None
+        return {
+            'invoice': invoice,
+            'customer': self.get_record('customers', invoice.get('customer_id')),
+            'order': self.get_record('sales_orders', invoice.get('order_id')),
+        }
+
+    @timed_operation('get_customer_details')
+    def get_customer_details(self, customer_id: str, limit: int = 5) -> Optional[Dict]:
+        customer = self.get_record('customers', customer_id)
+        if customer is None:
+            return None
+        orders = sorted(self.get_related('sales_orders', 'customer_id', customer_id),
+                        key=lambda o: o.get('order_date') or '', reverse=True)
+        invoices = sorted(self.get_related('invoices', 'customer_id', customer_id),
+                          key=lambda i: i.get('issue_date') or '', reverse=True)
+        open_invoices = [i for i in invoices if i.get('status') not in ('Paid', 'Cancelled')]
+        return {
+            'customer': customer,
+            'order_count': len(orders),
+            'recent_orders': orders[:limit],
+            'recent_invoices': invoices[:limit],
+            'outstanding_amount': round(sum((i.get('total_amount') or 0) - (i.get('paid_amount') or 0) for i in open_invoices), 2),
+        }
+
+    @timed_operation('get_finance_view')
+    def get_finance_view(self) -> Dict:
+        """Invoices with their customer name joined in, plus the slim option lists the finance form needs."""
+        customers = dict(self.pk_index['customers'])
+        invoices = [{**inv, 'customer_name': (customers.get(inv.get('customer_id')) or {}).get('name')}
+                    for inv in list(self.pk_index['invoices'].values())]
+        return {
+            'invoices': invoices,
+            'customers': [{'id': c['id'], 'name': c.get('name')} for c in customers.values()],
+            'orders': [{'id': o['id'], 'customer_id': o.get('customer_id')} for o in list(self.pk_index['sales_orders'].values())],
+        }
+
+    # ==================== AGGREGATION ====================
+
+    # Public entity name -> DataFrame attribute
+    AGGREGATE_TABLES = {'orders': 'sales_orders', 'invoices': 'invoices', 'products': 'products'}
+    AGGREGATE_FUNCS = ['count', 'sum', 'mean', 'min', 'max', 'top']
+    # Columns whose group keys get a human-readable label attached
+    GROUP_LABELS = {'customer_id': ('customers', 'name'), 'supplier_id': ('suppliers', 'name')}
+
+    def _with_derived_columns(self, entity: str) -> pd.DataFrame:
+        df = getattr(self, self.AGGREGATE_TABLES[entity])
+        if entity == 'invoices':
+            outstanding = (pd.to_numeric(df['total_amount'], errors='coerce').fillna(0)
+                           - pd.to_numeric(df['paid_amount'], errors='coerce').fillna(0)).clip(lower=0)
+            df = df.assign(outstanding_amount=outstanding.where(df['status'] != 'Cancelled', 0))
+        elif entity == 'products':
+            stock = pd.to_numeric(df['stock_quantity'], errors='coerce').fillna(0)
+            df = df.assign(stock_value=pd.to_numeric(df['price'], errors='coerce').fillna(0) * stock,
+                           below_reorder=stock <= pd.to_numeric(df['reorder_level'], errors='coerce').fillna(0))
+        return df
+
+    @timed_operation('aggregate')
+    def aggregate(self, entity: str, agg: str = 'count', field: Optional[str] = None, group_by: Optional[str] = None,
+                  top_k: Optional[int] = None, filters: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        Computes a small summary over orders, invoices or products with vectorized pandas operations.
+
+        'top' returns the top_k records ranked by field; every other agg reduces field (or row count)
+        either to a scalar or, with group_by, to per-group values sorted descending and capped at top_k.
+        'count' counts the field's non-null values; the other functions treat it as numeric.
+        Raises ValueError for unknown entities, functions or columns.
+        """
+        if entity not in self.AGGREGATE_TABLES:
+            raise ValueError(f"Unknown entity '{entity}', expected one of {list(self.AGGREGATE_TABLES)}")
+        if agg not in self.AGGREGATE_FUNCS:
+            raise ValueError(f"Unknown aggregation '{agg}', expected one of {self.AGGREGATE_FUNCS}")
+        df = self._with_derived_columns(entity)
+        for col in [c for c in (field, group_by) if c] + list((filters or {}).keys()):
+            if col not in df.columns:
+                raise ValueError(f"Unknown column '{col}' for {entity}")
+        if agg != 'count' and not field:
+            raise ValueError(f"Aggregation '{agg}' requires a field")
+
+        for col, value in (filters or {}).items():
+            df = df[df[col].astype(str).str.lower() == str(value).lower()]
+
+        result = {'entity': entity, 'agg': agg, 'field': field, 'group_by': group_by, 'matched_rows': len(df)}
+        if not field:
+            values = pd.Series(1, index=df.index)
+        elif agg == 'count':
+            # Counts the field's non-empty values, whatever their type
+            values = df[field]
+        else:
+            values = pd.to_numeric(df[field], errors='coerce')
+        to_number = (lambda v: int(v)) if agg == 'count' else (lambda v: round(float(v), 2))
+
+        if agg == 'top':
+            top_values = values.nlargest(top_k or 5)
+            label_col = next(c for c in ('name', 'invoice_number', 'id') if c in df.columns)
+            result['result'] = [{'id': df.at[i, 'id'], 'label': df.at[i, label_col], field: round(float(v), 2)} for i, v in top_values.items()]
+        elif group_by:
+            grouped = values.groupby(df[group_by]).agg(agg).sort_values(ascending=False)
+            if top_k:
+                grouped = grouped.head(top_k)
+            rows = [{'group': str(k), 'value': to_number(v)} for k, v in grouped.items()]
+            if group_by in self.GROUP_LABELS:
+                table, label_col = self.GROUP_LABELS[group_by]
+                label_df = getattr(self, table)
+                labels = dict(zip(label_df['id'], label_df[label_col])) if not label_df.empty else {}
+                for row in rows:
+                    row['label'] = labels.get(row['group'])
+            result['result'] = rows
+        else:
+            reduced = values.agg(agg) if len(values) else 0
+            result['result'] = to_number(reduced) if pd.notna(reduced) else None
+        return result
+
+    # ==================== AUDIT HISTORY ====================
+
+    # Public entity name -> (DataFrame attribute, column the API's ids refer to)
+    HISTORY_ENTITIES = {'customers': ('customers', 'id'), 'products': ('products', 'id'),
+                        'employees': ('employees', 'employee_id'), 'orders': ('sales_orders', 'id'),
+                        'invoices': ('invoices', 'id')}
+
+    def _sync_history(self):
+        """In multi-process mode the history follows the shared change log, including other workers' writes."""
+        if self.store is None:
+            return
+        while True:
+            changes = self.store.changes_since(self.history.latest_seq, 5000)
+            if not changes:
+                return
+            self.history.extend(changes)
+
+    def _history_target(self, entity: str, item_id: str):
+        """(table, row id) for an API id, also finding deleted rows by their public id (e.g. an employee number)."""
+        if entity not in self.HISTORY_ENTITIES:
+            raise ValueError(f"Unknown entity '{entity}', expected one of {list(self.HISTORY_ENTITIES)}")
+        table, column = self.HISTORY_ENTITIES[entity]
+        self._sync_history()
+        if column == 'id':
+            return table, item_id
+        record_id = next((r['id'] for r in list(self.pk_index[table].values()) if r.get(column) == item_id), None)
+        return table, record_id or self.history.find(table, column, item_id) or item_id
+
+    @timed_operation('history')
+    def record_history(self, entity: str, item_id: str, as_of: Optional[str] = None) -> Optional[Dict]:
+        """
+        A record's versions (who changed which columns from what to what, and what was said), or with
+        `as_of` (a change-log seq or ISO timestamp) the record as it was then. None if it never existed.
+        Raises ValueError for unknown entities or unparseable as_of values.
+        """
+        table, record_id = self._history_target(entity, item_id)
+        current = self.pk_index[table].get(record_id)
+        if as_of is None:
+            versions = self.history.versions(table, record_id)
+            if versions is None and current is None:
+                return None
+            return {'entity': entity, 'id': item_id, 'current': current, 'versions': versions or []}
+        state = self.history.as_of(table, record_id, as_of)
+        if state is None:
+            if current is None:
+                return None
+            state = {'record': current, 'version': None, 'available': True}  # unchanged since the history began
+        return {'entity': entity, 'id': item_id, 'as_of': as_of, **state}
+
+    @timed_operation('history')
+    def table_as_of(self, entity: str, as_of: str) -> Dict:
+        """Every row of an entity as it was at `as_of`; `complete` is False if compaction lost some of that state."""
+        if entity not in self.HISTORY_ENTITIES:
+            raise ValueError(f"Unknown entity '{entity}', expected one of {list(self.HISTORY_ENTITIES)}")
+        table = self.HISTORY_ENTITIES[entity][0]
+        self._sync_history()
+        rows, complete = self.history.table_as_of(table, dict(self.pk_index[table]), as_of)
+        return {'entity': entity, 'as_of': as_of, 'complete': complete, 'records': rows}
     
 
 app = Flask(__name__)
 app.secret_key = 'your-very-secret-key-for-vue-erp-final'
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
-data_manager = DataManager(socketio)
+app.json = make_json_provider(app)
+# Multi-process mode: point every worker at the same state DB and Socket.IO message queue
+# (e.g. ERP_STATE_DB=/var/lib/erp/state.db SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet",
+                    message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE"))
+state_db = os.environ.get("ERP_STATE_DB")
+# The store retries contended writes with socketio.sleep, so waiting for another worker never blocks the hub
+data_manager = DataManager(socketio, SQLiteStateStore(state_db, sleep=socketio.sleep) if state_db else None)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# API endpoints that never read the tables: the change feed reads the log, UI commands are only broadcast
+STATELESS_ENDPOINTS = {'api_changes', 'api_ui_command'}
+
+@app.before_request
+def sync_shared_state():
+    # Pages, vendored assets and /metrics don't depend on the tables; writes reload stale tables
+    # in their store transaction anyway, so this only keeps reads from serving another worker's old data
+    if request.path.startswith('/api/') and request.endpoint not in STATELESS_ENDPOINTS:
+        data_manager.refresh_if_stale(STATE_REFRESH_SECONDS)
+
+@app.before_request
+def identify_actor():
+    utterance = request.headers.get('X-ERP-Utterance')
+    # Self-reported: the headers aren't authenticated, remote_addr is what actually identifies the caller
+    current_actor.set((request.headers.get('X-ERP-Actor') or f'http:{request.remote_addr}',
+                       unquote(utterance) if utterance else None, request.remote_addr))
+
+# after_request hooks run in reverse order, so this one sees the final (compressed) response
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    erp_metrics.observe('request_seconds', elapsed, route=route, method=request.method, status=str(response.status_code))
+    if not response.direct_passthrough:
+        erp_metrics.observe('response_bytes', response.content_length or 0, route=route, method=request.method)
+    # A long-poll is meant to take its wait and a stream is still open here, so neither counts as slow
+    if not response.is_streamed and elapsed - g.get('long_poll_wait', 0) >= SLOW_REQUEST_SECONDS:
+        erp_metrics.inc('slow_total', kind='request')
+        print(f"SLOW request {request.method} {request.full_path.rstrip('?')} -> {response.status_code}: "
+              f"{elapsed * 1000:.1f}ms, {response.content_length or 0} bytes")
+    return response
+
+@app.after_request
+def compress_api_response(response):
+    if request.path.startswith('/api/'):
+        return compress_response(response)
+    return response
+
+def records_response(df: pd.DataFrame):
+    """JSON list of a table's rows; NaN becomes null natively with orjson, otherwise via a cleanup pass."""
+    if df.empty:
+        return jsonify([])
+    if not app.json.handles_nan:
+        df = df.astype(object).where(pd.notnull(df), None)
+    return jsonify(df.to_dict('records'))
 
 # ==================== BASE HTML PAGE TEMPLATE  ====================
+# Vendored client libraries (static/vendor). File names carry the version, so they can be cached forever.
+VENDOR_VUE = 'vue-3.3.6.global.prod.js'
+VENDOR_SOCKETIO = 'socket.io-4.7.2.min.js'
+
 def create_base_html_page(vue_app_script="", page_specific_content="", current_page_path="", voice_backend_url="ws://127.0.0.1:7861/"):
     global_socket_script = """
     <script>
-        const globalSocket = io();
+        // WebSocket-only transport: no long-polling, so no sticky sessions are needed across workers
+        const globalSocket = io({ transports: ['websocket'] });
+        // Change feed position: after a reconnect only the changes missed meanwhile are replayed
+        let changeCursor = null;
+        let changeLogId = null;
+        let socketConnectedBefore = false;
+
+        async function fetchChanges(since, limit) {
+            const params = new URLSearchParams({ since, limit });
+            if (changeLogId) params.set('log', changeLogId);
+            const response = await fetch(`/api/changes?${params}`);
+            return response.json();
+        }
+
+        async function catchUpChanges() {
+            if (changeCursor === null) return;
+            // The page listeners reload what each event type touches, so one replayed update per type is enough
+            const latestByType = new Map();
+            let reset = false, missed = 0, result;
+            do {
+                // Page through the feed until the cursor reaches the newest change
+                result = await fetchChanges(changeCursor, 5000);
+                changeLogId = result.log_id;
+                changeCursor = result.cursor;
+                reset = reset || result.reset;
+                missed += result.changes.length;
+                result.changes.forEach(change => latestByType.set(change.type, { ...change, replayed: true }));
+            } while (result.more);
+            if (reset) {
+                ['customer', 'product', 'employee', 'order', 'invoice'].forEach(prefix => {
+                    const type = `${prefix}_updated`;
+                    if (!latestByType.has(type)) latestByType.set(type, { type, data: {}, replayed: true });
+                });
+            }
+            console.log(`Global Socket: replaying ${latestByType.size} missed update types (${reset ? 'log reset' : missed + ' changes'})`);
+            latestByType.forEach(msg => globalSocket.listeners('data_update').forEach(listener => listener(msg)));
+        }
+
         globalSocket.on('connect', () => {
             console.log('Global Socket: Connected!');
+            if (socketConnectedBefore) {
+                catchUpChanges().catch(e => console.error('Change feed catch-up failed:', e));
+            } else {
+                fetchChanges(0, 0).then(result => {
+                    changeLogId = result.log_id;
+                    if (changeCursor === null) changeCursor = result.cursor;
+                }).catch(e => console.error('Change feed unavailable:', e));
+            }
+            socketConnectedBefore = true;
         });
         
         globalSocket.on('data_update', (msg) => {
+            if (msg.seq) changeCursor = Math.max(changeCursor || 0, msg.seq);
+            if (msg.replayed) return;
             const notifications = document.getElementById('notifications');
             if (!notifications) return;
             const item = document.createElement('div');
@@ -204,12 +969,58 @@ def create_base_html_page(vue_app_script="", page_specific_content="", current_p
         let mediaRecorder;
         let audioChunks = [];
         let voiceSocket;
+        let currentAudio = null;
+        // True between sending 'cancel' and the server's 'cancelled' ack: drop the cancelled turn's messages
+        let discardingTurn = false;
+
+        // Compact audio both ways: Opus from the recorder where the browser has it, Ogg/Opus speech back
+        // when it can play it (localStorage.voiceOutput = 'mp3' forces MP3)
+        const RECORDER_FORMATS = [['audio/webm;codecs=opus', 'webm'], ['audio/ogg;codecs=opus', 'ogg'], ['audio/mp4', 'mp4']];
+        const recorderFormat = (window.MediaRecorder && RECORDER_FORMATS.find(([mime]) => MediaRecorder.isTypeSupported(mime))) || ['', 'webm'];
+        const OUTPUT_MIME = { ogg: 'audio/ogg', mp3: 'audio/mpeg' };
+        const STREAM_TIMESLICE_MS = 250;
+        const VOICE_HEARTBEAT_MS = 20000;
+        let outputFormat = localStorage.getItem('voiceOutput')
+            || (new Audio().canPlayType('audio/ogg; codecs=opus') ? 'ogg' : 'mp3');
+
+        function stopPlayback() {
+            if (!currentAudio) return;
+            currentAudio.pause();
+            URL.revokeObjectURL(currentAudio.src);
+            currentAudio = null;
+        }
+
+        // Barge-in: the user speaks while the assistant is still thinking or talking
+        function cancelCurrentTurn() {
+            if (assistantState !== 'processing' && assistantState !== 'speaking') return;
+            stopPlayback();
+            if (voiceSocket && voiceSocket.readyState === WebSocket.OPEN) {
+                voiceSocket.send(JSON.stringify({ type: 'cancel' }));
+                discardingTurn = true;
+            }
+            console.log('[voiceSocket] Cancelled the current turn.');
+        }
+
+        // Stable per-tab session id: keeps the agent conversation (and worker affinity) across page navigations
+        let voiceSessionId = sessionStorage.getItem('voiceSessionId');
+        if (!voiceSessionId) {
+            voiceSessionId = (crypto.randomUUID ? crypto.randomUUID() : String(Date.now()) + Math.random().toString(16).slice(2));
+            sessionStorage.setItem('voiceSessionId', voiceSessionId);
+        }
 
         function createVoiceSocket() {
             if (voiceSocket && voiceSocket.readyState !== WebSocket.CLOSED) voiceSocket.close();
-            voiceSocket = new WebSocket('__WEBSOCKET_URL_PLACEHOLDER__');
+            const voiceUrl = new URL('__WEBSOCKET_URL_PLACEHOLDER__');
+            voiceUrl.searchParams.set('session', voiceSessionId);
+            // localStorage.voiceTrace = '1' logs a per-stage timing table for every turn
+            if (localStorage.getItem('voiceTrace') === '1') voiceUrl.searchParams.set('trace', '1');
+            voiceUrl.searchParams.set('in', recorderFormat[1]);
+            voiceUrl.searchParams.set('out', outputFormat);
+            // The agent only gets the tools for the page the user is on
+            voiceUrl.searchParams.set('page', window.location.pathname);
+            voiceSocket = new WebSocket(voiceUrl.toString());
             
-            voiceSocket.onopen = () => console.log('[voiceSocket] Connection open.');
+            voiceSocket.onopen = () => { discardingTurn = false; console.log('[voiceSocket] Connection open.'); };
             voiceSocket.onclose = () => console.log('[voiceSocket] Connection closed.');
             voiceSocket.onerror = (error) => console.error('[voiceSocket] Error:', error);
             
@@ -217,29 +1028,61 @@ def create_base_html_page(vue_app_script="", page_specific_content="", current_p
                 if (typeof event.data === 'string') {
                     try {
                         const message = JSON.parse(event.data);
-                        if (message.type === 'transcription') {
+                        if (message.type === 'config') {
+                            outputFormat = message.output;
+                        } else if (message.type === 'pong') {
+                            return;
+                        } else if (message.type === 'cancelled') {
+                            discardingTurn = false;
+                        } else if (discardingTurn) {
+                            return;
+                        } else if (message.type === 'partial_transcript') {
+                            if (assistantState === 'listening' || assistantState === 'processing') {
+                                transcriptionDisplay.textContent = `Hearing: "${message.data}"`;
+                            }
+                        } else if (message.type === 'transcription') {
                             transcriptionDisplay.textContent = `You said: "${message.data}"`;
                             agentResponseDisplay.textContent = 'Agent is thinking...';
                         } else if (message.type === 'agent_response') {
                             agentResponseDisplay.textContent = `Agent: ${message.data}`;
+                        } else if (message.type === 'busy') {
+                            agentResponseDisplay.textContent = message.data;
+                            assistantState = 'idle';
+                        } else if (message.type === 'no_audio') {
+                            // The answer is on screen only: there was no voice capacity to speak it
+                            assistantState = 'idle';
+                        } else if (message.type === 'trace') {
+                            console.log(`[voiceSocket] Turn took ${message.data.total_ms}ms`);
+                            console.table(message.data.spans);
                         }
                     } catch (e) { /* Ignore non-JSON */ }
                     return;
                 }
+                if (discardingTurn) return;
 
                 assistantState = 'speaking'; // Set state BEFORE playing audio
                 console.log(`[voiceSocket] State changed to: ${assistantState}`);
 
-                const audioBlob = new Blob([event.data], { type: 'audio/mp3' });
+                stopPlayback();
+                const audioBlob = new Blob([event.data], { type: OUTPUT_MIME[outputFormat] });
                 const audioUrl = URL.createObjectURL(audioBlob);
                 const audio = new Audio(audioUrl);
+                currentAudio = audio;
                 
                 audio.play().catch(e => {
                     console.error('Error playing audio:', e);
                     assistantState = 'idle'; // Reset state on error
+                    if (outputFormat !== 'mp3' && e.name === 'NotSupportedError') {
+                        // canPlayType was too optimistic: switch the session to MP3
+                        localStorage.setItem('voiceOutput', 'mp3');
+                        outputFormat = 'mp3';
+                        if (voiceSocket.readyState === WebSocket.OPEN) voiceSocket.send(JSON.stringify({ type: 'config', output: 'mp3' }));
+                        else createVoiceSocket();
+                    }
                 });
                 
                 audio.onended = () => {
+                    currentAudio = null;
                     console.log('[voiceSocket] Finished playing audio.');
                     assistantState = 'idle';
                     console.log(`[voiceSocket] State changed to: ${assistantState}`);
@@ -258,21 +1101,39 @@ def create_base_html_page(vue_app_script="", page_specific_content="", current_p
 
         createVoiceSocket();
 
+        // Heartbeat: the server answers pings even in the middle of a turn, so idle proxies keep the socket open
+        setInterval(() => {
+            if (voiceSocket && voiceSocket.readyState === WebSocket.OPEN) voiceSocket.send(JSON.stringify({ type: 'ping' }));
+        }, VOICE_HEARTBEAT_MS);
+
         voiceBtn.addEventListener('click', async () => {
             if (!mediaRecorder) {
                 try {
+                    cancelCurrentTurn();
                     transcriptionDisplay.textContent = '';
                     agentResponseDisplay.textContent = 'Listening...';
                     assistantState = 'listening';
                     console.log(`[Button] State changed to: ${assistantState}`);
                     
-                    const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-                    mediaRecorder = new MediaRecorder(stream);
-                    mediaRecorder.ondataavailable = e => audioChunks.push(e.data);
+                    const stream = await navigator.mediaDevices.getUserMedia({ audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true } });
+                    // 24 kbit/s mono Opus is plenty for speech recognition and a fraction of the default upload
+                    const recorderOptions = recorderFormat[0] ? { mimeType: recorderFormat[0], audioBitsPerSecond: 24000 } : {};
+                    mediaRecorder = new MediaRecorder(stream, recorderOptions);
+                    // Stream the recording while the user speaks, so the server can transcribe it as it arrives
+                    const streaming = voiceSocket.readyState === WebSocket.OPEN;
+                    if (streaming) voiceSocket.send(JSON.stringify({ type: 'audio_start' }));
+                    mediaRecorder.ondataavailable = e => {
+                        if (streaming && voiceSocket.readyState === WebSocket.OPEN) voiceSocket.send(e.data);
+                        else audioChunks.push(e.data);
+                    };
                     mediaRecorder.onstop = () => {
-                        const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
+                        stream.getTracks().forEach(track => track.stop());
                         if (voiceSocket.readyState === WebSocket.OPEN) {
-                            voiceSocket.send(audioBlob);
+                            if (streaming) {
+                                voiceSocket.send(JSON.stringify({ type: 'audio_end' }));
+                            } else {
+                                voiceSocket.send(new Blob(audioChunks, { type: recorderFormat[0] || 'audio/webm' }));
+                            }
                             agentResponseDisplay.textContent = 'Processing...';
                             assistantState = 'processing';
                             console.log(`[Button] State changed to: ${assistantState}`);
@@ -281,7 +1142,7 @@ def create_base_html_page(vue_app_script="", page_specific_content="", current_p
                         }
                         audioChunks = [];
                     };
-                    mediaRecorder.start();
+                    mediaRecorder.start(STREAM_TIMESLICE_MS);
                     voiceBtn.textContent = '🛑 Stop';
                 } catch (error) { 
                     console.error('Error accessing microphone:', error);
@@ -309,8 +1170,8 @@ def create_base_html_page(vue_app_script="", page_specific_content="", current_p
 <head>
     <meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>ERP Vue System</title>
-    <script src="https://unpkg.com/vue@3/dist/vue.global.js"></script>
-    <script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script>
+    <script src="/vendor/{VENDOR_VUE}"></script>
+    <script src="/vendor/{VENDOR_SOCKETIO}"></script>
     <style>
         body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif; margin: 0; background-color: #f0f2f5; color: #1f2937; line-height: 1.6; }}
         .header {{ background: #ffffff; padding: 0.8rem 2rem; box-shadow: 0 2px 4px rgba(0,0,0,0.05); border-bottom: 1px solid #e5e7eb; }}
@@ -528,7 +1389,7 @@ CRM_VUE_SCRIPT = """
                 const isEditing = ref(false);
                 const formTitle = ref('Add New Customer');
                 const initialIntentMessage = ref('');
-                const socket = window.globalSocket || io();
+                const socket = window.globalSocket || io({ transports: ['websocket'] });
 
                 const fetchCustomers = async () => { /* This function remains the same */
                     try {
@@ -716,7 +1577,7 @@ INVENTORY_VUE_SCRIPT = """
                 const isEditing = ref(false);
                 const formTitle = ref('Add New Product');
                 const initialIntentMessage = ref('');
-                const socket = window.globalSocket || io();
+                const socket = window.globalSocket || io({ transports: ['websocket'] });
 
                 const fetchProducts = async () => { try { const r = await fetch('/api/products'); if(!r.ok) throw Error('Failed to fetch'); products.value = await r.json(); } catch(e){console.error(e);}};
                 
@@ -756,7 +1617,7 @@ INVENTORY_VUE_SCRIPT = """
                     const setupSocketListeners = (socketInstance) => {
                         console.log("Inventory: globalSocket is ready, setting up listeners.");
                         socketInstance.on('data_update', (msg) => {
-                            if (['product_added', 'product_updated', 'product_deleted'].includes(msg.type)) {
+                            if (['product_added', 'product_updated', 'product_deleted', 'order_placed'].includes(msg.type)) {
                                 fetchProducts();
                             }
                         });
@@ -828,7 +1689,7 @@ ORDERS_VUE_SCRIPT = """
                 const currentOrder = ref(initialOrderForm());
                 const orders = ref([]); const customers = ref([]);
                 const isEditing = ref(false); const formTitle = ref('Add New Order');
-                const socket = window.globalSocket || io();
+                const socket = window.globalSocket || io({ transports: ['websocket'] });
 
                 const fetchOrders = async () => { try { const r = await fetch('/api/orders'); if(!r.ok) throw Error('Failed to fetch orders'); orders.value = await r.json(); } catch(e){console.error(e);}};
                 const fetchCustomersForDropdown = async () => { try { const r = await fetch('/api/customers'); if(!r.ok) throw Error('Failed to fetch customers'); customers.value = await r.json(); } catch(e){console.error(e);}};
@@ -858,7 +1719,7 @@ ORDERS_VUE_SCRIPT = """
                     const setupSocketListeners = (socketInstance) => {
                         console.log("Orders: globalSocket is ready, setting up listeners.");
                         socketInstance.on('data_update', (msg) => {
-                            if (['order_added', 'order_updated', 'order_deleted'].includes(msg.type)) {
+                            if (['order_added', 'order_updated', 'order_deleted', 'order_placed'].includes(msg.type)) {
                                 fetchOrders();
                             }
                             // Also refresh the customer dropdown if customers are changed
@@ -937,7 +1798,7 @@ HR_VUE_SCRIPT = """
                 const currentEmployee = ref(initialEmployeeForm());
                 const employees = ref([]);
                 const isEditing = ref(false); const formTitle = ref('Add New Employee');
-                const socket = window.globalSocket || io();
+                const socket = window.globalSocket || io({ transports: ['websocket'] });
 
                 const fetchEmployees = async () => { try { const r = await fetch('/api/employees'); if(!r.ok) throw Error('Failed to fetch'); employees.value = await r.json(); } catch(e){console.error(e);}};
                 const submitEmployeeForm = async () => {
@@ -1007,10 +1868,10 @@ FINANCE_APP_HTML = """
     <div class="table-section"><div class="table-container">
         <h3>Invoice List</h3>
         <table>
-            <thead><tr><th>Inv #</th><th>Cust. ID</th><th>Order ID</th><th>Issue Date</th><th>Due Date</th><th>Total</th><th>Paid</th><th>Status</th><th>Actions</th></tr></thead>
+            <thead><tr><th>Inv #</th><th>Customer</th><th>Order ID</th><th>Issue Date</th><th>Due Date</th><th>Total</th><th>Paid</th><th>Status</th><th>Actions</th></tr></thead>
             <tbody>
                 <tr v-for="invoice in invoices" :key="invoice.id">
-                    <td>{{ invoice.invoice_number }}</td><td>{{ invoice.customer_id }}</td><td>{{ invoice.order_id }}</td>
+                    <td>{{ invoice.invoice_number }}</td><td>{{ invoice.customer_name || invoice.customer_id }}</td><td>{{ invoice.order_id }}</td>
                     <td>{{ invoice.issue_date }}</td><td>{{ invoice.due_date }}</td>
                     <td>${{ invoice.total_amount ? invoice.total_amount.toFixed(2) : '0.00' }}</td>
                     <td>${{ invoice.paid_amount ? invoice.paid_amount.toFixed(2) : '0.00' }}</td>
@@ -1039,14 +1900,15 @@ FINANCE_VUE_SCRIPT = """
                 const currentInvoice = ref(initialInvoiceForm());
                 const invoices = ref([]); const customers = ref([]); const orders = ref([]);
                 const isEditing = ref(false); const formTitle = ref('Create New Invoice');
-                const socket = window.globalSocket || io();
+                const socket = window.globalSocket || io({ transports: ['websocket'] });
 
                 const fetchData = async () => {
                     try {
-                        const [invRes, custRes, ordRes] = await Promise.all([fetch('/api/invoices'), fetch('/api/customers'), fetch('/api/orders')]);
-                        if(invRes.ok) invoices.value = await invRes.json(); else console.error('Failed to fetch invoices');
-                        if(custRes.ok) customers.value = await custRes.json(); else console.error('Failed to fetch customers for dropdown');
-                        if(ordRes.ok) orders.value = await ordRes.json(); else console.error('Failed to fetch orders for dropdown');
+                        // Server-side joined view: invoices with customer names plus slim dropdown lists
+                        const r = await fetch('/api/finance_view');
+                        if(!r.ok) { console.error('Failed to fetch finance view'); return; }
+                        const view = await r.json();
+                        invoices.value = view.invoices; customers.value = view.customers; orders.value = view.orders;
                     } catch(e){console.error("Fetch finance data error:", e);}
                 };
                 const submitInvoiceForm = async () => {
@@ -1074,7 +1936,7 @@ FINANCE_VUE_SCRIPT = """
                         console.log("Finance: globalSocket is ready, setting up listeners.");
                         socketInstance.on('data_update', (msg) => {
                             // Re-fetch all data for this page if any relevant item changes
-                            if (['invoice_added', 'invoice_updated', 'invoice_deleted', 'customer_added', 'order_added'].includes(msg.type)) {
+                            if (['invoice_added', 'invoice_updated', 'invoice_deleted', 'customer_added', 'order_added', 'order_placed'].includes(msg.type)) {
                                 fetchData();
                             }
                         });
@@ -1096,41 +1958,165 @@ FINANCE_VUE_SCRIPT = """
 """
 
 # ==================== FLASK ROUTES ====================
+# Page shells only depend on the voice backend URL, so they are rendered and compressed once at startup.
+PAGES = {
+    '/': (DASHBOARD_VUE_SCRIPT, DASHBOARD_APP_HTML),
+    '/crm_vue': (CRM_VUE_SCRIPT, CRM_APP_HTML),
+    '/inventory_vue': (INVENTORY_VUE_SCRIPT, INVENTORY_APP_HTML),
+    '/orders_vue': (ORDERS_VUE_SCRIPT, ORDERS_APP_HTML),
+    '/hr_vue': (HR_VUE_SCRIPT, HR_APP_HTML),
+    '/finance_vue': (FINANCE_VUE_SCRIPT, FINANCE_APP_HTML),
+}
+VOICE_BACKEND_URL = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
+page_shells = {
+    path: CompressedAsset(create_base_html_page(script, html, path, voice_backend_url=VOICE_BACKEND_URL).encode('utf-8'),
+                          'text/html; charset=utf-8')
+    for path, (script, html) in PAGES.items()
+}
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'vendor')
+vendor_assets = {}
+for _name in (VENDOR_VUE, VENDOR_SOCKETIO):
+    with open(os.path.join(VENDOR_DIR, _name), 'rb') as _f:
+        vendor_assets[_name] = CompressedAsset(_f.read(), 'application/javascript; charset=utf-8')
+
+@app.route('/vendor/<filename>')
+def vendor_asset(filename):
+    asset = vendor_assets.get(filename)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return asset.response('public, max-age=31536000, immutable')
+
 @app.route('/')
-def dashboard_page(): 
-    voice_url = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
-    return create_base_html_page(DASHBOARD_VUE_SCRIPT, DASHBOARD_APP_HTML, '/', voice_backend_url=voice_url)
+def dashboard_page(): return page_shells['/'].response()
 @app.route('/crm_vue')
-def crm_page(): 
-    voice_url = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
-    return create_base_html_page(CRM_VUE_SCRIPT, CRM_APP_HTML, '/crm_vue', voice_backend_url=voice_url)
+def crm_page(): return page_shells['/crm_vue'].response()
 @app.route('/inventory_vue')
-def inventory_page(): 
-    voice_url = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
-    return create_base_html_page(INVENTORY_VUE_SCRIPT, INVENTORY_APP_HTML, '/inventory_vue', voice_backend_url=voice_url)
+def inventory_page(): return page_shells['/inventory_vue'].response()
 @app.route('/orders_vue')
-def orders_page(): 
-    voice_url = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
-    return create_base_html_page(ORDERS_VUE_SCRIPT, ORDERS_APP_HTML, '/orders_vue', voice_backend_url=voice_url)
+def orders_page(): return page_shells['/orders_vue'].response()
 @app.route('/hr_vue')
-def hr_page(): 
-    voice_url = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
-    return create_base_html_page(HR_VUE_SCRIPT, HR_APP_HTML, '/hr_vue', voice_backend_url=voice_url)
+def hr_page(): return page_shells['/hr_vue'].response()
 @app.route('/finance_vue')
-def finance_page(): 
-    voice_url = os.environ.get("VOICE_BACKEND_URL", "ws://127.0.0.1:7861/")
-    return create_base_html_page(FINANCE_VUE_SCRIPT, FINANCE_APP_HTML, '/finance_vue', voice_backend_url=voice_url)
+def finance_page(): return page_shells['/finance_vue'].response()
 
 # ==================== API ENDPOINTS (Ensure all are implemented) ====================
 @app.route('/api/dashboard', methods=['GET'])
 def api_dashboard(): return jsonify(data_manager.get_dashboard_metrics())
 
+@app.route('/api/customers/<customer_id>/details', methods=['GET'])
+def api_customer_details(customer_id):
+    limit = request.args.get('limit', 5, type=int)
+    details = data_manager.get_customer_details(customer_id, limit)
+    return jsonify(details) if details else (jsonify({'error': 'Not found'}), 404)
+
+@app.route('/api/invoices/<invoice_id>/details', methods=['GET'])
+def api_invoice_details(invoice_id):
+    details = data_manager.get_invoice_details(invoice_id)
+    return jsonify(details) if details else (jsonify({'error': 'Not found'}), 404)
+
+@app.route('/api/finance_view', methods=['GET'])
+def api_finance_view(): return jsonify(data_manager.get_finance_view())
+
+@app.route('/api/aggregate/<entity>', methods=['GET'])
+def api_aggregate(entity):
+    """?agg=&field=&group_by=&top_k=, plus filter.<column>=<value> for each equality filter; other parameters are ignored."""
+    args = request.args
+    top_k = args.get('top_k')
+    filters = {key[len('filter.'):]: value for key, value in args.items() if key.startswith('filter.')}
+    try:
+        result = data_manager.aggregate(entity, args.get('agg', 'count'), args.get('field'), args.get('group_by'),
+                                        int(top_k) if top_k else None, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (per process: scrape every worker in multi-process mode)."""
+    return Response(erp_metrics.render_prometheus(), content_type='text/plain; version=0.0.4')
+
+@app.route('/api/data_version', methods=['GET'])
+def api_data_version(): return jsonify(data_manager.data_versions)
+
+CHANGES_MAX_WAIT = 30
+SSE_HEARTBEAT_SECONDS = 15
+
+@app.route('/api/changes', methods=['GET'])
+def api_changes():
+    """
+    Change feed: GET /api/changes?since=<seq> returns the changes after seq (at most `limit`, optionally
+    only some `tables`) with the cursor to pass next time, and `more: true` if the limit cut them short;
+    `wait` (seconds) long-polls until there is one; `limit=0` returns just the current cursor. With `Accept: text/event-stream` it streams
+    them as server-sent events instead, resuming from `since` or the Last-Event-ID header.
+    `reset: true` means the cursor is older than the retained log (or from before a restart):
+    reload the tables, then continue from `cursor`.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        return jsonify({'error': 'since is required'}), 400
+    if request.args.get('log') not in (None, data_manager.change_log.log_id):
+        since = -1  # a cursor from another log (the server restarted): make the client reload
+    tables = set(request.args['tables'].split(',')) if request.args.get('tables') else None
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        # eventlet's WSGI server otherwise holds back writes until 4 KB have accumulated (see also __main__)
+        request.environ['eventlet.minimum_write_chunk_size'] = 0
+        return Response(change_stream(since, tables), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    wait = min(request.args.get('wait', 0, type=float), CHANGES_MAX_WAIT)
+    g.long_poll_wait = wait
+    return jsonify(data_manager.wait_for_changes(since, wait, limit, tables))
+
+def change_stream(since: int, tables: Optional[set]):
+    last_sent = time.monotonic()
+    while True:
+        result = data_manager.change_log.read(since, tables=tables)
+        if result['reset']:
+            yield f"event: reset\ndata: {json.dumps({'log_id': result['log_id'], 'cursor': result['cursor']})}\n\n"
+        for change in result['changes']:
+            yield f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change, default=str)}\n\n"
+        if result['reset'] or result['changes']:
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+            yield ": heartbeat\n\n"
+            last_sent = time.monotonic()
+        since = result['cursor']
+        socketio.sleep(CHANGE_POLL_SECONDS)
+
+@app.route('/api/<entity>/<item_id>/history', methods=['GET'])
+def api_record_history(entity, item_id):
+    """
+    Audit history of one record: every version with the columns it changed (from/to), the actor, the
+    utterance behind it and the address the change came from. With ?as_of=<seq or ISO timestamp>,
+    the record as it was at that point.
+    """
+    try:
+        result = data_manager.record_history(entity, item_id, request.args.get('as_of'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result) if result else (jsonify({'error': 'Not found'}), 404)
+
+@app.route('/api/history/<entity>', methods=['GET'])
+def api_table_history(entity):
+    """Point-in-time read of a whole table: GET /api/history/<entity>?as_of=<seq or ISO timestamp>."""
+    if not request.args.get('as_of'):
+        return jsonify({'error': 'as_of is required'}), 400
+    try:
+        return jsonify(data_manager.table_as_of(entity, request.args['as_of']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/history', methods=['GET'])
+def api_history_stats(): return jsonify(data_manager.history.snapshot())
+
 # Customers
 
 @app.route('/api/customers', methods=['GET', 'POST'])
 def api_customers():
     if request.method == 'GET':
-        return jsonify(data_manager.customers.to_dict('records'))
+        return records_response(data_manager.customers)
         
     elif request.method == 'POST':
         item = data_manager.add_customer(request.get_json())
@@ -1151,13 +2137,7 @@ def api_customer_detail(customer_id):
 @app.route('/api/products', methods=['GET', 'POST'])
 def api_products():
     if request.method == 'GET':
-        product_df = data_manager.products
-        if product_df.empty:
-            return jsonify([])
-        # Replace pandas NaN with Python's None for valid JSON
-        records_df = product_df.where(pd.notnull(product_df), None)
-        records = records_df.to_dict('records')
-        return jsonify(records)
+        return records_response(data_manager.products)
         
     elif request.method == 'POST':
         item = data_manager.add_product(request.get_json())
@@ -1177,13 +2157,7 @@ def api_product_detail(product_id):
 @app.route('/api/employees', methods=['GET', 'POST'])
 def api_employees():
     if request.method == 'GET':
-        employees_df = data_manager.employees
-        if employees_df.empty:
-            return jsonify([])
-        # Replace pandas NaN with Python's None for valid JSON
-        records_df = employees_df.where(pd.notnull(employees_df), None)
-        records = records_df.to_dict('records')
-        return jsonify(records)
+        return records_response(data_manager.employees)
         
     elif request.method == 'POST': 
         new_emp = data_manager.add_employee(request.get_json())
@@ -1203,18 +2177,22 @@ def api_employee_detail(employee_id_custom):
 @app.route('/api/orders', methods=['GET', 'POST'])
 def api_orders():
     if request.method == 'GET':
-        orders_df = data_manager.sales_orders
-        if orders_df.empty:
-            return jsonify([])
-        # Replace pandas NaN with Python's None for valid JSON
-        records_df = orders_df.where(pd.notnull(orders_df), None)
-        records = records_df.to_dict('records')
-        return jsonify(records)
+        return records_response(data_manager.sales_orders)
         
     elif request.method == 'POST':
         item = data_manager.add_order(request.get_json())
         return jsonify(item), 201 if item else (jsonify({"error": "Missing required fields"}), 400)
     
+@app.route('/api/orders/place', methods=['POST'])
+def api_place_order():
+    try:
+        result = data_manager.place_order(request.get_json() or {})
+    except InsufficientStockError as e:
+        return jsonify({'error': str(e)}), 409
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result), 201
+
 @app.route('/api/orders/<order_id>', methods=['PUT', 'DELETE'])
 def api_order_detail(order_id):
     if request.method == 'PUT':
@@ -1229,13 +2207,7 @@ def api_order_detail(order_id):
 @app.route('/api/invoices', methods=['GET', 'POST'])
 def api_invoices():
     if request.method == 'GET':
-        invoices_df = data_manager.invoices
-        if invoices_df.empty:
-            return jsonify([])
-        # Replace pandas NaN with Python's None for valid JSON
-        records_df = invoices_df.where(pd.notnull(invoices_df), None)
-        records = records_df.to_dict('records')
-        return jsonify(records)
+        return records_response(data_manager.invoices)
         
     elif request.method == 'POST':
         new_invoice = data_manager.add_invoice(request.get_json())
@@ -1259,4 +2231,5 @@ def api_ui_command():
     return jsonify({'message': 'UI instruction sent', 'instruction': instruction}), 200
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # minimum_chunk_size=0: flush every write, so server-sent events (GET /api/changes) aren't held back
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('ERP_PORT', 5000)), debug=True, minimum_chunk_size=0)
\ No newline at end of file
@@ -0,0 +1,216 @@
+# admission.py
+#
+# Admission control for provider calls (speech-to-text, the agent's LLM and text-to-speech).
+# Each provider has a scheduler with a global concurrency limit, a per-session limit and an
+# optional token bucket sized to the account's requests-per-minute quota. Waiting calls are
+# granted round-robin across sessions, so a chatty session can't starve the others, and a call
+# that can't start before its deadline fails fast with Overloaded instead of queueing up behind
+# a provider that would answer with rate-limit errors anyway.
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+from loguru import logger
+
+from metrics import voice_metrics
+
+# --- Admission Configuration ---
+# Longest a turn's provider call may wait for a slot before the turn gets the busy response
+ADMISSION_MAX_WAIT = float(os.environ.get("VOICE_ADMISSION_MAX_WAIT", "4"))
+# Calls allowed to wait per provider; beyond this they are turned away at once
+ADMISSION_MAX_QUEUE = int(os.environ.get("VOICE_ADMISSION_MAX_QUEUE", "32"))
+# A turn's later LLM steps wait this long instead: its tools have already run, possibly writing to the ERP
+ADMISSION_FOLLOWUP_WAIT = float(os.environ.get("VOICE_ADMISSION_FOLLOWUP_WAIT", "30"))
+# Processes sharing the provider account's quota; the gateway sets it to its worker count, so
+# VOICE_<PROVIDER>_RPM can be the account quota and each process gets its share
+ADMISSION_PROCESSES = max(1, int(os.environ.get("VOICE_ADMISSION_PROCESSES", "1")))
+
+voice_metrics.describe("admission_wait_seconds", "Time provider calls waited for a slot, by provider")
+voice_metrics.describe("admission_rejected_total", "Provider calls turned away, by provider and reason (queue_full, rate_limit, timeout)")
+voice_metrics.describe("admission_in_flight", "Provider calls running, by provider")
+voice_metrics.describe("admission_waiting", "Provider calls waiting for a slot, by provider")
+
+
+class Overloaded(Exception):
+    """A provider call could not be admitted before its deadline."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+class TokenBucket:
+    """Requests-per-minute limiter; `burst` requests may go out back to back after an idle spell."""
+
+    def __init__(self, per_minute: float, burst: int = 0):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, int(self.rate * 10))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, needed: int = 1) -> float:
+        """Seconds until `needed` tokens are available."""
+        self._refill(now)
+        missing = needed - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Waiter:
+    __slots__ = ("session_id", "granted")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.granted = False
+
+
+class ProviderScheduler:
+    """Concurrency, rate and fairness limits for one provider. Used from the pipeline's worker threads."""
+
+    def __init__(self, provider: str, concurrency: int, per_session: int, per_minute: float = 0, burst: int = 0,
+                 max_queue: int = ADMISSION_MAX_QUEUE):
+        self.provider = provider
+        self.concurrency = concurrency
+        self.per_session = per_session
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(per_minute, burst) if per_minute > 0 else None
+        self.in_flight = 0
+        self.waiting = 0
+        self._session_in_flight: Counter = Counter()
+        # Sessions with waiting calls, in the order they get their next grant
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._changed = threading.Condition()
+
+    @contextmanager
+    def slot(self, session_id: str, max_wait: float = ADMISSION_MAX_WAIT):
+        """Holds one of the provider's slots for the block. max_wait=0 means best effort: run now or not at all."""
+        self._acquire(session_id, max_wait)
+        try:
+            yield
+        finally:
+            self._release(session_id)
+
+    def _acquire(self, session_id: str, max_wait: float):
+        start = time.monotonic()
+        deadline = start + max_wait
+        with self._changed:
+            if self.waiting >= self.max_queue:
+                self._reject("queue_full")
+            if self.bucket is not None and self.bucket.delay(start, self.waiting + 1) > max_wait:
+                # Even a free slot couldn't start this call before its deadline
+                self._reject("rate_limit")
+            waiter = _Waiter(session_id)
+            self._queues.setdefault(session_id, deque()).append(waiter)
+            self.waiting += 1
+            while True:
+                self._dispatch()
+                if waiter.granted:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._withdraw(waiter)
+                    self._reject("timeout")
+                refill = self.bucket.delay(time.monotonic()) if self.bucket is not None else 0.0
+                self._changed.wait(min(remaining, refill) if refill > 0 else remaining)
+            self._update_gauges()
+        voice_metrics.observe("admission_wait_seconds", time.monotonic() - start, provider=self.provider)
+
+    def _release(self, session_id: str):
+        with self._changed:
+            self.in_flight -= 1
+            self._session_in_flight[session_id] -= 1
+            if self._session_in_flight[session_id] <= 0:
+                del self._session_in_flight[session_id]
+            self._dispatch()
+            self._update_gauges()
+
+    def _dispatch(self):
+        """Grants free slots to waiting calls, one per session per round. Call with the lock held."""
+        granted = False
+        progress = True
+        while progress and self._queues and self.in_flight < self.concurrency:
+            progress = False
+            for session_id in list(self._queues):
+                if self.in_flight >= self.concurrency:
+                    break
+                if self._session_in_flight[session_id] >= self.per_session:
+                    continue
+                if self.bucket is not None:
+                    if self.bucket.delay(time.monotonic()) > 0:
+                        break
+                    self.bucket.take()
+                queue = self._queues.pop(session_id)
+                waiter = queue.popleft()
+                if queue:
+                    self._queues[session_id] = queue  # back of the line for its next call
+                waiter.granted = True
+                self.waiting -= 1
+                self.in_flight += 1
+                self._session_in_flight[session_id] += 1
+                granted = progress = True
+        if granted:
+            self._changed.notify_all()
+
+    def _withdraw(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.session_id)
+        if queue is not None:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.session_id]
+        self.waiting -= 1
+        self._update_gauges()
+
+    def _reject(self, reason: str):
+        voice_metrics.inc("admission_rejected_total", provider=self.provider, reason=reason)
+        logger.warning(f"🚦 {self.provider} call turned away ({reason}): {self.in_flight} running, {self.waiting} waiting")
+        raise Overloaded(self.provider, reason)
+
+    def _update_gauges(self):
+        voice_metrics.set("admission_in_flight", self.in_flight, provider=self.provider)
+        voice_metrics.set("admission_waiting", self.waiting, provider=self.provider)
+
+    def snapshot(self) -> dict:
+        with self._changed:
+            return {"in_flight": self.in_flight, "waiting": self.waiting, "sessions_waiting": len(self._queues),
+                    "concurrency": self.concurrency, "per_session": self.per_session,
+                    "per_minute": round(self.bucket.rate * 60, 1) if self.bucket else None,
+                    "tokens": round(self.bucket.tokens, 2) if self.bucket else None}
+
+
+def _scheduler(provider: str, concurrency: int, per_session: int) -> ProviderScheduler:
+    """
+    Limits from VOICE_<PROVIDER>_CONCURRENCY, _PER_SESSION, _RPM (0 = no rate limit) and _BURST.
+    Concurrency is per process; the RPM quota and burst are split across ADMISSION_PROCESSES.
+    """
+    prefix = f"VOICE_{provider.upper()}"
+    burst = int(os.environ.get(f"{prefix}_BURST", "0"))
+    return ProviderScheduler(
+        provider,
+        concurrency=int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency)),
+        per_session=int(os.environ.get(f"{prefix}_PER_SESSION", per_session)),
+        per_minute=float(os.environ.get(f"{prefix}_RPM", "0")) / ADMISSION_PROCESSES,
+        burst=max(1, burst // ADMISSION_PROCESSES) if burst else 0,
+    )
+
+
+# A final and a partial transcription of the same session may overlap; the agent's steps never do
+schedulers: Dict[str, ProviderScheduler] = {
+    "stt": _scheduler("stt", concurrency=8, per_session=2),
+    "llm": _scheduler("llm", concurrency=16, per_session=1),
+    "tts": _scheduler("tts", concurrency=8, per_session=1),
+}
+
+
+def provider_slot(provider: str, session_id: str, max_wait: float = ADMISSION_MAX_WAIT):
+    return schedulers[provider].slot(session_id, max_wait)
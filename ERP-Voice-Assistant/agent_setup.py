@@ -1,21 +1,85 @@
+import contextvars
+import functools
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from urllib.parse import quote
+
 import requests
-from langchain_groq import ChatGroq
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.prebuilt import create_react_agent
 from loguru import logger
-from typing import Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 import json
 
-# --- Agent Configuration ---
-model = ChatGroq(
-    model="meta-llama/llama-4-scout-17b-16e-instruct",
-    max_tokens=1024, # Increased for more complex reasoning
-)
+from admission import ADMISSION_FOLLOWUP_WAIT, ADMISSION_MAX_WAIT, provider_slot
+from metrics import voice_metrics
+from model_router import latency_callback, turn_router
+from prefetch import LIST_ENDPOINTS, list_prefetch, tables_mentioned
+from tool_format import format_aggregate, format_results
+from voice_session import PAGE_APPS
 
-memory = InMemorySaver()
+# --- Agent Configuration ---
+# The Groq clients and the agent graph are built on first use (or during the voice service's
+# warm-up), so importing this module doesn't pull in langchain/langgraph or need an API key.
+
+@functools.lru_cache(maxsize=None)
+def get_groq_http_client():
+    """One connection pool shared by every Groq API call (STT, chat, TTS), so warm-up connects it once."""
+    from groq import DefaultHttpxClient
+    return DefaultHttpxClient()
+
+AGENT_MODEL = os.environ.get("AGENT_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+# Simple turns (confirmations, navigation, form values, lookups) go to this model; set it empty to disable routing
+AGENT_SMALL_MODEL = os.environ.get("AGENT_SMALL_MODEL", "llama-3.1-8b-instant")
+
+@functools.lru_cache(maxsize=None)
+def get_model(name: str = AGENT_MODEL):
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model=name,
+        max_tokens=1024, # Increased for more complex reasoning
+        http_client=get_groq_http_client(),
+        callbacks=[latency_callback(name)],
+    )
+
+def make_checkpointer():
+    """
+    Conversation memory. Set AGENT_CHECKPOINT_DB to share it between voice worker processes
+    (requires the langgraph-checkpoint-sqlite package); otherwise it lives in this process.
+    """
+    path = os.environ.get("AGENT_CHECKPOINT_DB")
+    if not path:
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
 
 # --- ERP API Configuration ---
-BASE_URL = "http://127.0.0.1:5000/api"
+BASE_URL = os.environ.get("ERP_API_URL", "http://127.0.0.1:5000/api")
+# The voice turn the agent is working on: (session id, transcript). Its ERP writes carry both,
+# so the ERP's audit history shows which utterance led to each change (GET /api/<entity>/<id>/history).
+current_turn: contextvars.ContextVar = contextvars.ContextVar("current_turn", default=None)
+AUDIT_UTTERANCE_CHARS = 500
+
+class ERPSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        turn = current_turn.get()
+        if turn is not None and method.upper() != "GET":
+            session_id, transcript = turn
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "X-ERP-Actor": f"voice-agent:{session_id}",
+                                 "X-ERP-Utterance": quote(transcript[:AUDIT_UTTERANCE_CHARS])}
+        return super().request(method, url, **kwargs)
+
+class ThreadSessions(threading.local):
+    """An ERPSession per thread (requests.Session isn't thread-safe); attribute access goes to the calling thread's."""
+    def __init__(self):
+        self.session = ERPSession()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+# Keep-alive connections to the ERP API for all tools, one pool per executor/ToolNode thread
+erp_http = ThreadSessions()
 
 # --- Tool Definitions for ERP Co-Pilot ---
 
@@ -43,7 +107,7 @@ def navigate_to_page(target_app: Literal["crm", "inventory", "orders", "hr", "fi
     logger.info(f"▶️ Navigating to {target_app} module at {page_url}...")
     try:
         # === CHANGE THIS LINE ===
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         logger.success(f"✅ Navigation to {target_app} successful.")
         return f"Okay, I have navigated to the {target_app} page."
@@ -71,7 +135,7 @@ def fill_form_field(target_app: str, field_id: str, value: str):
     logger.info(f"📝 Filling field '{field_id}' with value '{value}' in {target_app}...")
     try:
         # === CHANGE THIS LINE ===
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         logger.debug(f"🔍 Server response: {response.text}")
         logger.success(f"✅ Field '{field_id}' filled.")
@@ -101,7 +165,7 @@ def create_customer(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Customer '{name}' created."
     except requests.exceptions.RequestException as e:
@@ -128,7 +192,7 @@ def update_customer(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.put(url, data=data, headers=headers)
+        response = erp_http.put(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Customer ID '{customer_id}' updated."
     except requests.exceptions.RequestException as e:
@@ -138,7 +202,7 @@ def delete_customer(customer_id: str):
     """Deletes a customer using their ID."""
     url = f"{BASE_URL}/customers/{customer_id}"
     try:
-        response = requests.delete(url)
+        response = erp_http.delete(url)
         response.raise_for_status()
         return f"Success: Customer ID '{customer_id}' has been deleted."
     except requests.exceptions.RequestException as e:
@@ -166,7 +230,7 @@ def create_product(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Product '{name}' created."
     except requests.exceptions.RequestException as e:
@@ -193,7 +257,7 @@ def update_product(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.put(url, data=data, headers=headers)
+        response = erp_http.put(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Product ID '{product_id}' updated."
     except requests.exceptions.RequestException as e:
@@ -203,7 +267,7 @@ def delete_product(product_id: str):
     """Deletes a product from inventory using its ID."""
     url = f"{BASE_URL}/products/{product_id}"
     try:
-        response = requests.delete(url)
+        response = erp_http.delete(url)
         response.raise_for_status()
         return f"Success: Product ID '{product_id}' has been deleted."
     except requests.exceptions.RequestException as e:
@@ -234,7 +298,7 @@ def create_employee(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Employee '{first_name} {last_name}' created."
     except requests.exceptions.RequestException as e:
@@ -262,7 +326,7 @@ def update_employee(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.put(url, data=data, headers=headers)
+        response = erp_http.put(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Employee ID '{employee_id_custom}' updated."
     except requests.exceptions.RequestException as e:
@@ -272,7 +336,7 @@ def delete_employee(employee_id_custom: str):
     """Deletes an employee using their custom employee ID (e.g., 'E001')."""
     url = f"{BASE_URL}/employees/{employee_id_custom}"
     try:
-        response = requests.delete(url)
+        response = erp_http.delete(url)
         response.raise_for_status()
         return f"Success: Employee ID '{employee_id_custom}' has been deleted."
     except requests.exceptions.RequestException as e:
@@ -298,12 +362,45 @@ def create_order(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Order created for customer '{customer_id}'."
     except requests.exceptions.RequestException as e:
         return f"Error creating order: {e}"
 
+def place_order(
+    customer_id: str,
+    items: List[Dict[str, Any]],
+    shipping_address: Optional[str] = None,
+    notes: Optional[str] = None,
+    create_invoice: bool = True
+):
+    """
+    Places an order for products in one atomic step: reserves stock, creates the order
+    with its line items and, by default, its invoice. Prefer this over create_order plus
+    create_invoice whenever the user names the products being ordered.
+    items is a list like [{"product_id": "prod001", "quantity": 2}]; use search_products to find IDs.
+    """
+    url = f"{BASE_URL}/orders/place"
+    order_data = {
+        "customer_id": customer_id, "items": items, "shipping_address": shipping_address,
+        "notes": notes, "create_invoice": create_invoice
+    }
+    payload = {k: v for k, v in order_data.items() if v is not None}
+    headers = {'Content-Type': 'application/json'}
+    data = json.dumps(payload)
+    try:
+        response = erp_http.post(url, data=data, headers=headers)
+        if response.status_code in (400, 409):
+            return f"Order not placed: {response.json().get('error')}"
+        response.raise_for_status()
+        result = response.json()
+        invoice = result.get('invoice')
+        inv_text = f" Invoice {invoice['invoice_number']} issued." if invoice else ""
+        return f"Success: Order {result['id']} placed for customer '{customer_id}', total {result['order']['total_amount']}.{inv_text}"
+    except requests.exceptions.RequestException as e:
+        return f"Error placing order: {e}"
+
 def update_order(
     order_id: str,
     customer_id: Optional[str] = None,
@@ -323,7 +420,7 @@ def update_order(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.put(url, data=data, headers=headers)
+        response = erp_http.put(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Order ID '{order_id}' updated."
     except requests.exceptions.RequestException as e:
@@ -333,7 +430,7 @@ def delete_order(order_id: str):
     """Deletes an order using its ID."""
     url = f"{BASE_URL}/orders/{order_id}"
     try:
-        response = requests.delete(url)
+        response = erp_http.delete(url)
         response.raise_for_status()
         return f"Success: Order ID '{order_id}' has been deleted."
     except requests.exceptions.RequestException as e:
@@ -360,7 +457,7 @@ def create_invoice(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.post(url, data=data, headers=headers)
+        response = erp_http.post(url, data=data, headers=headers)
         response.raise_for_status()
         # The response from a POST might contain the new invoice number
         new_invoice = response.json()
@@ -389,7 +486,7 @@ def update_invoice(
     headers = {'Content-Type': 'application/json'}
     data = json.dumps(payload)
     try:
-        response = requests.put(url, data=data, headers=headers)
+        response = erp_http.put(url, data=data, headers=headers)
         response.raise_for_status()
         return f"Success: Invoice ID '{invoice_id}' updated."
     except requests.exceptions.RequestException as e:
@@ -399,12 +496,21 @@ def delete_invoice(invoice_id: str):
     """Deletes an invoice using its ID."""
     url = f"{BASE_URL}/invoices/{invoice_id}"
     try:
-        response = requests.delete(url)
+        response = erp_http.delete(url)
         response.raise_for_status()
         return f"Success: Invoice ID '{invoice_id}' has been deleted."
     except requests.exceptions.RequestException as e:
         return f"Error deleting invoice: {e}"
     
+def fetch_list(table: str) -> list:
+    """All rows of an ERP table, from the speculative prefetch when it is still current."""
+    rows = list_prefetch.get(table)
+    if rows is None:
+        response = erp_http.get(f"{BASE_URL}/{LIST_ENDPOINTS[table]}")
+        response.raise_for_status()
+        rows = response.json()
+    return rows
+
 # ==============================================================================
 # AGENT "SEARCH" TOOL DEFINITIONS
 #
@@ -416,24 +522,21 @@ def search_customers(query: str):
     Searches for existing customers by name, email, or company.
     Returns a list of matching customers or a not found message.
     """
-    url = f"{BASE_URL}/customers"
     logger.info(f"🔎 Searching for customer matching '{query}'...")
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        all_customers = response.json()
+        all_customers = fetch_list("customers")
         query_lower = query.lower()
         
         matches = [
             c for c in all_customers if
-            query_lower in c.get('name', '').lower() or
-            query_lower in c.get('email', '').lower() or
-            query_lower in c.get('company', '').lower()
+            query_lower in (c.get('name') or '').lower() or
+            query_lower in (c.get('email') or '').lower() or
+            query_lower in (c.get('company') or '').lower()
         ]
         
         if not matches:
             return "No customer found matching that query."
-        return json.dumps(matches)
+        return format_results("customers", matches, query, ['name', 'email', 'company'])
     except requests.exceptions.RequestException as e:
         return f"Error searching customers: {e}"
 
@@ -442,23 +545,20 @@ def search_products(query: str):
     Searches for existing products by name or SKU.
     Returns a list of matching products or a not found message.
     """
-    url = f"{BASE_URL}/products"
     logger.info(f"🔎 Searching for product matching '{query}'...")
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        all_products = response.json()
+        all_products = fetch_list("products")
         query_lower = query.lower()
 
         matches = [
             p for p in all_products if
-            query_lower in p.get('name', '').lower() or
-            query_lower in p.get('sku', '').lower()
+            query_lower in (p.get('name') or '').lower() or
+            query_lower in (p.get('sku') or '').lower()
         ]
 
         if not matches:
             return "No product found matching that query."
-        return json.dumps(matches)
+        return format_results("products", matches, query, ['name', 'sku'])
     except requests.exceptions.RequestException as e:
         return f"Error searching products: {e}"
 
@@ -467,24 +567,21 @@ def search_employees(query: str):
     Searches for existing employees by first name, last name, or email.
     Returns a list of matching employees or a not found message.
     """
-    url = f"{BASE_URL}/employees"
     logger.info(f"🔎 Searching for employee matching '{query}'...")
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        all_employees = response.json()
+        all_employees = fetch_list("employees")
         query_lower = query.lower()
 
         matches = [
             e for e in all_employees if
-            query_lower in e.get('first_name', '').lower() or
-            query_lower in e.get('last_name', '').lower() or
-            query_lower in e.get('email', '').lower()
+            query_lower in (e.get('first_name') or '').lower() or
+            query_lower in (e.get('last_name') or '').lower() or
+            query_lower in (e.get('email') or '').lower()
         ]
 
         if not matches:
             return "No employee found matching that query."
-        return json.dumps(matches)
+        return format_results("employees", matches, query, ['first_name', 'last_name', 'email'])
     except requests.exceptions.RequestException as e:
         return f"Error searching employees: {e}"
     
@@ -493,23 +590,20 @@ def search_invoices(query: str):
     Searches for existing invoices by invoice number or customer ID.
     Returns a list of matching invoices or a not found message.
     """
-    url = f"{BASE_URL}/invoices"
     logger.info(f"🔎 Searching for invoice matching '{query}'...")
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        all_invoices = response.json()
+        all_invoices = fetch_list("invoices")
         query_lower = query.lower()
 
         matches = [
             i for i in all_invoices if
-            query_lower in i.get('invoice_number', '').lower() or
-            query_lower in i.get('customer_id', '').lower()
+            query_lower in (i.get('invoice_number') or '').lower() or
+            query_lower in (i.get('customer_id') or '').lower()
         ]
 
         if not matches:
             return "No invoice found matching that query."
-        return json.dumps(matches)
+        return format_results("invoices", matches, query, ['invoice_number', 'customer_id'])
     except requests.exceptions.RequestException as e:
         return f"Error searching invoices: {e}"
     
@@ -518,37 +612,107 @@ def search_orders(query: str):
     Searches for existing orders by customer ID or status.
     Returns a list of matching orders or a not found message.
     """
-    url = f"{BASE_URL}/orders"
     logger.info(f"🔎 Searching for order matching '{query}'...")
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        all_orders = response.json()
+        all_orders = fetch_list("sales_orders")
         query_lower = query.lower()
 
         matches = [
             o for o in all_orders if
-            query_lower in o.get('customer_id', '').lower() or
-            query_lower in o.get('status', '').lower()
+            query_lower in (o.get('customer_id') or '').lower() or
+            query_lower in (o.get('status') or '').lower()
         ]
 
         if not matches:
             return "No order found matching that query."
-        return json.dumps(matches)
+        return format_results("orders", matches, query, ['customer_id', 'status'])
     except requests.exceptions.RequestException as e:
         return f"Error searching orders: {e}"
 
+# --- Analytics Tools ---
+
+def aggregate_records(
+    entity: Literal["orders", "invoices", "products"],
+    agg: Literal["count", "sum", "mean", "min", "max", "top"] = "count",
+    field: Optional[str] = None,
+    group_by: Optional[str] = None,
+    top_k: Optional[int] = None,
+    status: Optional[str] = None
+):
+    """
+    Computes counts, totals, averages and rankings on the ERP server instead of searching raw records.
+    Numeric fields: orders -> total_amount; invoices -> total_amount, paid_amount, outstanding_amount;
+    products -> price, cost, stock_quantity, stock_value.
+    Useful group_by columns: customer_id, status, category, supplier_id.
+    Examples: top 5 customers by order value -> entity="orders", agg="sum", field="total_amount",
+    group_by="customer_id", top_k=5. Most valuable products -> agg="top", field="stock_value".
+    """
+    url = f"{BASE_URL}/aggregate/{entity}"
+    params = {"agg": agg, "field": field, "group_by": group_by, "top_k": top_k, "filter.status": status}
+    params = {k: v for k, v in params.items() if v is not None}
+    logger.info(f"📊 Aggregating {entity} with {params}...")
+    try:
+        response = erp_http.get(url, params=params)
+        if response.status_code == 400:
+            return f"Invalid aggregation: {response.json().get('error')}"
+        response.raise_for_status()
+        return format_aggregate(response.json())
+    except requests.exceptions.RequestException as e:
+        return f"Error aggregating {entity}: {e}"
+
+def get_outstanding_receivables(top_k: int = 5):
+    """
+    Returns the total amount customers still owe on unpaid invoices,
+    plus the customers with the largest outstanding balances.
+    """
+    url = f"{BASE_URL}/aggregate/invoices"
+    logger.info("📊 Computing outstanding receivables...")
+    try:
+        total = erp_http.get(url, params={"agg": "sum", "field": "outstanding_amount"})
+        total.raise_for_status()
+        by_customer = erp_http.get(url, params={"agg": "sum", "field": "outstanding_amount",
+                                                "group_by": "customer_id", "top_k": top_k})
+        by_customer.raise_for_status()
+        return format_aggregate(total.json()) + "\n" + format_aggregate(by_customer.json())
+    except requests.exceptions.RequestException as e:
+        return f"Error computing receivables: {e}"
+
 # Note: Search for Orders and Invoices can be added here if needed,
 # though they are less commonly searched by simple text queries.
 
 # --- Tool & System Prompt Definition ---
 
-tools = [navigate_to_page, fill_form_field, 
+def timed_tool(fn):
+    """Records each call of a tool (including its ERP HTTP round trip) in the tool_seconds histogram."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with voice_metrics.span("tool_seconds", tool=fn.__name__):
+            result = fn(*args, **kwargs)
+        if fn.__name__ not in READ_ONLY_TOOL_TABLES:
+            list_prefetch.clear()  # it may have written: later searches must see the change
+        return result
+    return wrapper
+
+tools = [timed_tool(t) for t in [
+         navigate_to_page, fill_form_field, 
          create_customer, update_customer, delete_customer, search_customers,
          create_employee, update_employee, delete_employee, search_employees,
-         create_order, update_order, delete_order,search_orders,
+         create_order, place_order, update_order, delete_order,search_orders,
          create_product, update_product, delete_product, search_products,
-         create_invoice, update_invoice, delete_invoice,search_invoices]
+         create_invoice, update_invoice, delete_invoice,search_invoices,
+         aggregate_records, get_outstanding_receivables]]
+
+# Tools with no side effects, mapped to the ERP tables their results depend on.
+# Turns that only call these tools can be answered from the response cache.
+READ_ONLY_TOOL_TABLES = {
+    "search_customers": ["customers"],
+    "search_products": ["products"],
+    "search_employees": ["employees"],
+    "search_invoices": ["invoices"],
+    "search_orders": ["sales_orders"],
+    "aggregate_records": ["sales_orders", "invoices", "products", "customers"],
+    "get_outstanding_receivables": ["invoices", "customers"],
+}
 
 # In agent_setup.py, replace the entire system_prompt string with this:
 
@@ -626,6 +790,11 @@ system_prompt_2 = """You are an ERP Voice Assistant that helps users perform bus
    - After required fields: Ask about optional fields before saving
    - Only use create/update tools after collecting data AND getting final confirmation
 
+6. **Questions About the Data**
+   - For totals, counts, averages or "top N" questions use `aggregate_records` or `get_outstanding_receivables`
+   - These are read-only: no navigation or confirmation is needed
+   - Read out the computed numbers; never list raw records
+
 **Response Style:**
 - Keep responses short and clear
 - Ask specific questions only
@@ -641,11 +810,95 @@ system_prompt_2 = """You are an ERP Voice Assistant that helps users perform bus
 
 Remember: Every operation requires explicit user confirmation before execution."""
 
-agent = create_react_agent(
-    model=model,
-    tools=tools,
-    prompt=system_prompt_2, # Use messages_modifier for newer LangGraph versions
-    checkpointer=memory,
-)
-
-agent_config = {"configurable": {"thread_id": "default_user"}}
\ No newline at end of file
+# --- Per-Page Tool Subsets ---
+# The model only sees the tool schemas for the page the user is on, plus navigation, form filling
+# and the read-only analytics tools. Subsets keep the order of `tools` and the system prompt never
+# changes, so every call from the same page sends a byte-identical prefix (good for prefix caching).
+ALWAYS_AVAILABLE_TOOLS = ["navigate_to_page", "fill_form_field", "aggregate_records", "get_outstanding_receivables"]
+APP_TOOLS = {
+    "crm": ["create_customer", "update_customer", "delete_customer", "search_customers"],
+    "hr": ["create_employee", "update_employee", "delete_employee", "search_employees"],
+    "inventory": ["create_product", "update_product", "delete_product", "search_products"],
+    "orders": ["create_order", "place_order", "update_order", "delete_order", "search_orders",
+               "search_customers", "search_products"],
+    "finance": ["create_invoice", "update_invoice", "delete_invoice", "search_invoices",
+                "search_customers", "search_orders"],
+}
+TABLE_APPS = {"customers": "crm", "employees": "hr", "products": "inventory", "sales_orders": "orders",
+              "invoices": "finance"}
+
+@dataclass
+class AgentContext:
+    """Per-turn context passed to the agent graph alongside the messages."""
+    page: str = "/"
+
+def tool_subset(messages, page: str) -> tuple:
+    """
+    Names of the tools the model gets for this step: the current page's tools, plus those of any
+    entity the user mentions and any page the turn has navigated to. The dashboard gets them all.
+    """
+    app = PAGE_APPS.get(page)
+    if app is None:
+        return tuple(t.__name__ for t in tools)
+    apps = {app}
+    turn_start = max((i for i, m in enumerate(messages) if getattr(m, "type", None) == "human"), default=0)
+    transcript = messages[turn_start].content if messages and isinstance(messages[turn_start].content, str) else ""
+    apps.update(TABLE_APPS[table] for table in tables_mentioned(transcript))
+    for message in messages[turn_start:]:
+        for call in getattr(message, "tool_calls", None) or []:
+            if call["name"] == "navigate_to_page":
+                apps.add(call["args"].get("target_app"))
+    names = set(ALWAYS_AVAILABLE_TOOLS).union(*(APP_TOOLS.get(a, ()) for a in apps))
+    return tuple(t.__name__ for t in tools if t.__name__ in names)
+
+@functools.lru_cache(maxsize=64)
+def bound_model(size: str, tool_names: tuple):
+    """A model with a tool subset bound. A failed small-model call is retried on the large model."""
+    selected = [t for t in tools if t.__name__ in tool_names]
+    large = get_model().bind_tools(selected)
+    if size == "small":
+        return scheduled(get_model(AGENT_SMALL_MODEL).bind_tools(selected).with_fallbacks([large]))
+    return scheduled(large)
+
+def scheduled(model):
+    """
+    Runs each LLM call under the llm admission limits, keyed by the conversation thread (the voice
+    session). Only a turn's first step fails fast: once its tools have run, giving up would leave
+    the user to retry a write that already happened, so later steps wait ADMISSION_FOLLOWUP_WAIT.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    def call(messages, config):
+        session_id = config.get("configurable", {}).get("thread_id", "default_user")
+        max_wait = ADMISSION_FOLLOWUP_WAIT if getattr(messages[-1], "type", None) == "tool" else ADMISSION_MAX_WAIT
+        with provider_slot("llm", session_id, max_wait):
+            return model.invoke(messages, config)
+    return RunnableLambda(call, name="scheduled_llm")
+
+def select_model(state, runtime):
+    """Dynamic model for the agent graph: the router's pick for the turn, with the page's tools."""
+    messages = state["messages"]
+    size = turn_router.route(messages).model if AGENT_SMALL_MODEL else "large"
+    page = getattr(runtime.context, "page", None) or "/"
+    return bound_model(size, tool_subset(messages, page))
+
+@functools.lru_cache(maxsize=None)
+def get_agent():
+    """Builds and compiles the agent graph once."""
+    from langgraph.prebuilt import create_react_agent
+    get_model()
+    if AGENT_SMALL_MODEL:
+        get_model(AGENT_SMALL_MODEL)
+    return create_react_agent(
+        model=select_model,
+        tools=tools,
+        prompt=system_prompt_2, # Use messages_modifier for newer LangGraph versions
+        checkpointer=make_checkpointer(),
+        context_schema=AgentContext,
+    )
+
+def session_config(session_id: str) -> dict:
+    """Agent config that keeps a separate conversation thread per voice session."""
+    return {"configurable": {"thread_id": session_id}}
+
+agent_config = session_config("default_user")
\ No newline at end of file
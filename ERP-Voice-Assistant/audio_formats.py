@@ -0,0 +1,50 @@
+# audio_formats.py
+#
+# Audio formats the voice WebSocket accepts and returns. Clients pick them with ?in=...&out=...
+# on the WebSocket URL; the server confirms the choice in a {"type": "config"} message.
+
+import io
+import os
+import wave
+
+# Compressed uploads (Opus in WebM/Ogg, AAC in MP4) go to Whisper as recorded, with no transcode
+PASSTHROUGH_INPUTS = {"webm": "audio.webm", "ogg": "audio.ogg", "mp4": "audio.m4a"}
+# "pcm16" is raw 16 kHz mono little-endian PCM, for clients without an Opus encoder
+INPUT_FORMATS = set(PASSTHROUGH_INPUTS) | {"pcm16"}
+PCM_INPUT_RATE = 16000
+
+OUTPUT_FORMATS = {"mp3", "ogg"}
+# Sample rate of Ogg/Opus speech; speech needs far less than the provider default
+TTS_SAMPLE_RATE = int(os.environ.get("VOICE_TTS_SAMPLE_RATE", "24000"))
+# The rates Groq's speech endpoint accepts; anything else fails every Ogg request with a 400
+TTS_SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+if TTS_SAMPLE_RATE not in TTS_SAMPLE_RATES:
+    raise ValueError(f"VOICE_TTS_SAMPLE_RATE={TTS_SAMPLE_RATE} is not supported, expected one of {TTS_SAMPLE_RATES}")
+
+DEFAULT_FORMATS = {"input": "webm", "output": "mp3"}
+
+
+def negotiate_formats(query_params) -> dict:
+    """The client's requested formats, falling back to WebM in / MP3 out for unknown or missing values."""
+    requested_in, requested_out = query_params.get("in"), query_params.get("out")
+    return {"input": requested_in if requested_in in INPUT_FORMATS else DEFAULT_FORMATS["input"],
+            "output": requested_out if requested_out in OUTPUT_FORMATS else DEFAULT_FORMATS["output"]}
+
+
+def prepare_upload(audio_data: bytes, audio_format: str) -> tuple:
+    """Returns the (filename, bytes) to send for transcription."""
+    if audio_format in PASSTHROUGH_INPUTS:
+        return PASSTHROUGH_INPUTS[audio_format], audio_data
+    # Raw PCM only needs a WAV header
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(PCM_INPUT_RATE)
+        wav.writeframes(audio_data)
+    return "audio.wav", buffer.getvalue()
+
+
+def tts_options(audio_format: str) -> dict:
+    """Extra speech-request parameters for an output format."""
+    return {"sample_rate": TTS_SAMPLE_RATE} if audio_format == "ogg" else {}
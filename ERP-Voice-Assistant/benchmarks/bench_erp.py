@@ -0,0 +1,229 @@
+"""
+Benchmarks DataManager and the REST API at scale. Seeds every entity table with N synthetic
+rows, then measures write/lookup throughput through direct method calls, list-endpoint
+latency and payload size through the Flask test client, and search-tool latency through a
+live local server. Prints one JSON object per measurement (and appends them to --output) so
+runs can be diffed over time.
+
+    python benchmarks/bench_erp.py --rows 1000 10000 100000 --output bench.jsonl
+    python benchmarks/bench_erp.py --rows 1000000 --ops 20 --skip search
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SUITES = ['direct', 'api', 'search']
+
+
+def make_tables(rows: int) -> dict:
+    """Synthetic tables with the same columns and dtypes as the sample data, with valid foreign keys."""
+    rng = np.random.default_rng(0)
+    ids = np.arange(rows)
+    dates = pd.date_range('2023-01-01', periods=730).strftime('%Y-%m-%d').to_numpy()
+    customer_ids = np.char.add('cust', np.char.zfill(ids.astype(str), 7))
+    order_ids = np.char.add('order', np.char.zfill(ids.astype(str), 7))
+    product_ids = np.char.add('prod', np.char.zfill(ids.astype(str), 7))
+    order_customers = rng.choice(customer_ids, rows)
+    order_totals = rng.uniform(10, 5000, rows).round(2)
+
+    customers = pd.DataFrame({
+        'id': customer_ids,
+        'name': [f'Customer {i}' for i in ids],
+        'email': [f'contact{i}@example.com' for i in ids],
+        'phone': '+1-555-0100',
+        'company': [f'Company {i % 5000}' for i in ids],
+        'address': '1 Main St',
+        'status': rng.choice(['Active', 'Lead', 'Inactive'], rows),
+        'lead_score': rng.integers(0, 100, rows),
+        'created_date': rng.choice(dates, rows),
+        'last_contact': rng.choice(dates, rows),
+        'notes': '',
+    })
+    products = pd.DataFrame({
+        'id': product_ids,
+        'name': [f'Product {i}' for i in ids],
+        'sku': [f'SKU-{i:07d}' for i in ids],
+        'category': rng.choice(['Electronics', 'Furniture', 'Gadgets'], rows),
+        'price': rng.uniform(1, 500, rows).round(2),
+        'cost': rng.uniform(1, 250, rows).round(2),
+        'stock_quantity': rng.integers(0, 500, rows),
+        'reorder_level': rng.integers(5, 50, rows),
+        'supplier_id': rng.choice(['supp001', 'supp002'], rows),
+        'warehouse_location': 'A-1-01',
+        'created_date': rng.choice(dates, rows),
+        'description': 'Lorem ipsum dolor sit amet.',
+    })
+    employees = pd.DataFrame({
+        'id': np.char.add('emp', ids.astype(str)),
+        'employee_id': np.char.add('EMP', np.char.zfill(ids.astype(str), 7)),
+        'first_name': [f'First{i}' for i in ids],
+        'last_name': [f'Last{i}' for i in ids],
+        'email': [f'employee{i}@company.com' for i in ids],
+        'phone': '+1-555-0200',
+        'department': rng.choice(['Sales', 'Engineering', 'Finance', 'HR'], rows),
+        'position': 'Staff',
+        'hire_date': rng.choice(dates, rows),
+        'salary': rng.integers(40000, 150000, rows),
+        'status': 'Active',
+        'manager_id': None,
+    })
+    sales_orders = pd.DataFrame({
+        'id': order_ids,
+        'customer_id': order_customers,
+        'order_date': rng.choice(dates, rows),
+        'status': rng.choice(['Pending', 'Processing', 'Shipped', 'Delivered'], rows),
+        'total_amount': order_totals,
+        'shipping_address': '1 Main St',
+        'notes': '',
+    })
+    invoices = pd.DataFrame({
+        'id': np.char.add('inv', np.char.zfill(ids.astype(str), 7)),
+        'invoice_number': np.char.add('INV-', np.char.zfill(ids.astype(str), 7)),
+        'order_id': order_ids,
+        'customer_id': order_customers,
+        'issue_date': rng.choice(dates, rows),
+        'due_date': rng.choice(dates, rows),
+        'total_amount': order_totals,
+        'status': rng.choice(['Draft', 'Sent', 'Paid', 'Overdue'], rows),
+        'paid_amount': 0.0,
+    })
+    return {'customers': customers, 'products': products, 'employees': employees,
+            'sales_orders': sales_orders, 'invoices': invoices}
+
+
+def seed(data_manager, rows: int) -> float:
+    start = time.perf_counter()
+    for name, df in make_tables(rows).items():
+        setattr(data_manager, name, df)
+    data_manager._rebuild_indexes()
+    return time.perf_counter() - start
+
+
+def latency_stats(samples: list) -> dict:
+    values = np.array(samples) * 1000
+    return {'ops': len(samples), 'ops_per_sec': round(len(samples) / (values.sum() / 1000), 1),
+            'p50_ms': round(float(np.percentile(values, 50)), 3),
+            'p95_ms': round(float(np.percentile(values, 95)), 3),
+            'max_ms': round(float(values.max()), 3)}
+
+
+def measure(fn, args_list) -> dict:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def bench_direct(dm, rows: int, ops: int, rng) -> dict:
+    """DataManager methods called in-process, without HTTP or JSON."""
+    picks = [f'cust{i:07d}' for i in rng.integers(0, rows, ops)]
+    results = {}
+    results['get_record'] = measure(dm.get_record, [('customers', p) for p in picks])
+    results['get_customer_details'] = measure(dm.get_customer_details, [(p,) for p in picks])
+    results['add_customer'] = measure(dm.add_customer, [({'name': f'Bench {i}', 'email': f'bench{i}@example.com'},)
+                                                        for i in range(ops)])
+    results['update_customer'] = measure(dm.update_customer, [(p, {'lead_score': i % 100}) for i, p in enumerate(picks)])
+    added = dm.customers['id'].iloc[-ops:].tolist()
+    results['delete_customer'] = measure(dm.delete_customer, [(c,) for c in added])
+    results['aggregate_revenue_by_customer'] = measure(dm.aggregate, [('orders', 'sum', 'total_amount', 'customer_id', 5, None)] * min(ops, 20))
+    return results
+
+
+def bench_api(client, rows: int, ops: int, repeat: int, rng) -> dict:
+    """REST endpoints through the Flask test client (routing, JSON encoding and compression included)."""
+    results = {}
+    for path in ('/api/customers', '/api/products', '/api/orders', '/api/invoices', '/api/finance_view'):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = client.get(path).get_data()
+            samples.append(time.perf_counter() - start)
+        gzipped = client.get(path, headers={'Accept-Encoding': 'gzip'}).get_data()
+        results[f'GET {path}'] = {**latency_stats(samples), 'bytes': len(body), 'gzip_bytes': len(gzipped)}
+
+    picks = [f'cust{i:07d}' for i in rng.integers(0, rows, ops)]
+    results['GET /api/customers/<id>/details'] = measure(lambda p: client.get(f'/api/customers/{p}/details'), [(p,) for p in picks])
+    results['PUT /api/customers/<id>'] = measure(lambda p, i: client.put(f'/api/customers/{p}', json={'lead_score': i % 100}),
+                                                 [(p, i) for i, p in enumerate(picks)])
+    results['POST /api/customers'] = measure(lambda i: client.post('/api/customers', json={'name': f'Api {i}', 'email': f'api{i}@example.com'}),
+                                             [(i,) for i in range(ops)])
+    results['GET /api/aggregate/orders'] = measure(lambda: client.get('/api/aggregate/orders?agg=sum&field=total_amount&group_by=status'),
+                                                   [()] * min(ops, 20))
+    return results
+
+
+def bench_search(app, ops: int) -> dict:
+    """The agent's search tools end to end: HTTP fetch of the list endpoint, filtering and formatting."""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['ERP_API_URL'] = f'http://127.0.0.1:{server.server_port}/api'
+    import agent_setup
+    agent_setup.BASE_URL = os.environ['ERP_API_URL']
+    try:
+        return {
+            'search_customers': measure(agent_setup.search_customers, [('Customer 42',)] * ops),
+            'search_products': measure(agent_setup.search_products, [('SKU-00000',)] * ops),
+            'search_orders': measure(agent_setup.search_orders, [('Pending',)] * ops),
+        }
+    finally:
+        server.shutdown()
+
+
+def run_info() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--ops', type=int, default=100, help='operations per write/lookup measurement')
+    parser.add_argument('--repeat', type=int, default=5, help='requests per list-endpoint measurement')
+    parser.add_argument('--skip', nargs='*', choices=SUITES, default=[])
+    parser.add_argument('--output', help='append results to this JSON-lines file')
+    args = parser.parse_args()
+
+    os.environ.pop('ERP_STATE_DB', None)  # benchmark the in-memory store
+    with contextlib.redirect_stdout(sys.stderr):  # keep the ERP's broadcast prints out of the results
+        import ERP
+    info = run_info()
+    out = open(args.output, 'a') if args.output else None
+
+    for rows in args.rows:
+        rng = np.random.default_rng(rows)
+        with contextlib.redirect_stdout(sys.stderr):
+            suites = {'seed': {'seconds': round(seed(ERP.data_manager, rows), 3)}}
+            if 'direct' not in args.skip:
+                suites.update(bench_direct(ERP.data_manager, rows, args.ops, rng))
+            if 'api' not in args.skip:
+                suites.update(bench_api(ERP.app.test_client(), rows, args.ops, args.repeat, rng))
+            if 'search' not in args.skip:
+                suites.update(bench_search(ERP.app, args.ops))
+        for name, result in suites.items():
+            line = json.dumps({**info, 'rows': rows, 'benchmark': name, **result})
+            print(line)
+            if out:
+                out.write(line + '\n')
+    if out:
+        out.close()
@@ -0,0 +1,89 @@
+"""
+Compares the API list-response paths: the original stdlib jsonify with a pd.notnull cleanup
+pass versus the orjson provider, plus the wire size after gzip/brotli compression.
+
+    python benchmarks/bench_json_encoding.py --rows 1000 10000 100000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from http_compression import brotli
+from json_provider import OrjsonProvider, StdJSONProvider, orjson
+
+
+def make_products(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'id': [f'prod{i:07d}' for i in range(rows)],
+        'name': [f'Product {i}' for i in range(rows)],
+        'sku': [f'SKU-{i:07d}' for i in range(rows)],
+        'category': rng.choice(['Electronics', 'Furniture', 'Gadgets'], rows),
+        'price': rng.uniform(1, 500, rows).round(2),
+        'cost': rng.uniform(1, 250, rows).round(2),
+        'stock_quantity': rng.integers(0, 500, rows),
+        'reorder_level': rng.integers(5, 50, rows),
+        'supplier_id': rng.choice(['supp001', 'supp002', None], rows),
+        'description': ['Lorem ipsum dolor sit amet, consectetur adipiscing elit.'] * rows,
+    })
+    df.loc[df.sample(frac=0.05, random_state=0).index, 'cost'] = np.nan
+    return df
+
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(rows: int, repeat: int) -> dict:
+    df = make_products(rows)
+    results = {'rows': rows}
+    providers = {'std_cleanup': StdJSONProvider}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider
+
+    for name, provider_cls in providers.items():
+        app = Flask(__name__)
+        app.json = provider_cls(app)
+
+        def encode():
+            frame = df
+            if not app.json.handles_nan:
+                frame = frame.astype(object).where(pd.notnull(frame), None)
+            return app.json.response(frame.to_dict('records')).get_data()
+
+        with app.app_context():
+            body = encode()
+            results[f'{name}_seconds'] = round(timed(encode, repeat), 5)
+        results[f'{name}_bytes'] = len(body)
+        json.loads(body)  # both paths must produce valid JSON
+
+    results['gzip5_bytes'] = len(gzip.compress(body, compresslevel=5))
+    results['gzip5_seconds'] = round(timed(lambda: gzip.compress(body, compresslevel=5), repeat), 5)
+    if brotli is not None:
+        results['br4_bytes'] = len(brotli.compress(body, quality=4))
+        results['br4_seconds'] = round(timed(lambda: brotli.compress(body, quality=4), repeat), 5)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(json.dumps(run(rows, args.repeat)))
@@ -0,0 +1,252 @@
+"""
+Offline end-to-end load test for the voice pipeline. Starts the local Groq stand-in
+(stub_providers.py), an ERP server and a voice server pointed at both, opens N concurrent WebSocket sessions
+that each replay recorded utterances, and reports latency percentiles together with the
+server's CPU and memory use. No network or API key is needed.
+
+    python benchmarks/loadtest_voice.py --audio recordings/*.webm --sessions 1 5 10 20 --turns 5
+    python benchmarks/loadtest_voice.py --audio a.webm --server voice_gateway:app --llm-latency fixed:800
+
+--tool-call-rate (default 0.5) is the fraction of turns whose first LLM step calls a search
+tool, so those turns also pay for the tool step and the ERP request behind it.
+
+Per turn it measures, from the moment the utterance is sent:
+    transcript   the transcription message arrives
+    text         the agent's text response arrives
+    first_audio  the first audio frame arrives (time to first audio)
+    e2e          the turn's audio is complete
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+
+try:
+    import psutil
+except ImportError:  # fall back to /proc on Linux
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORIGIN = 'http://localhost:5000'
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU % and resident memory of a process (and its children) every `interval` seconds."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._stop_event = threading.Event()
+
+    def _read(self):
+        """Returns (cpu seconds, rss bytes) summed over the process tree."""
+        if psutil is not None:
+            proc = psutil.Process(self.pid)
+            procs = [proc] + proc.children(recursive=True)
+            cpu = sum(sum(p.cpu_times()[:2]) for p in procs)
+            return cpu, sum(p.memory_info().rss for p in procs)
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        return cpu, int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+
+    def run(self):
+        last_cpu, last_time = self._read()[0], time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            try:
+                cpu, rss = self._read()
+            except (OSError, IndexError):
+                return
+            now = time.perf_counter()
+            self.cpu.append(100 * (cpu - last_cpu) / (now - last_time))
+            self.rss.append(rss)
+            last_cpu, last_time = cpu, now
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        self.join()
+        if not self.cpu:
+            return {}
+        return {'server_cpu_pct_mean': round(float(np.mean(self.cpu)), 1), 'server_cpu_pct_max': round(max(self.cpu), 1),
+                'server_rss_mb_max': round(max(self.rss) / 2**20, 1)}
+
+
+async def run_session(url: str, session_id: str, utterances: list, turns: int, think_time: float,
+                      turn_timeout: float, formats: str, results: list, errors: dict):
+    try:
+        async with websockets.connect(f"{url}?session={session_id}&{formats}", origin=ORIGIN, max_size=None) as ws:
+            for _ in range(turns):
+                marks = {}
+                start = time.perf_counter()
+                await ws.send(random.choice(utterances))
+                try:
+                    async with asyncio.timeout(turn_timeout):
+                        while True:
+                            message = await ws.recv()
+                            now = time.perf_counter() - start
+                            if isinstance(message, bytes):
+                                marks.setdefault('first_audio', now)
+                                marks['e2e'] = now
+                                marks['audio_bytes'] = len(message)
+                                break
+                            payload = json.loads(message)
+                            if payload.get('type') == 'transcription':
+                                marks['transcript'] = now
+                            elif payload.get('type') == 'agent_response':
+                                marks['text'] = now
+                            elif payload.get('type') == 'no_audio':
+                                marks['e2e'] = now
+                                marks['audio_bytes'] = 0
+                                break
+                            elif payload.get('type') == 'busy':
+                                errors['busy'] = errors.get('busy', 0) + 1
+                                return
+                except TimeoutError:
+                    errors['timeout'] = errors.get('timeout', 0) + 1
+                    return
+                results.append(marks)
+                if think_time:
+                    await asyncio.sleep(random.expovariate(1 / think_time))
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        key = type(e).__name__
+        errors[key] = errors.get(key, 0) + 1
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    arr = np.array(values) * 1000
+    return {f'p{q}_ms': round(float(np.percentile(arr, q)), 1) for q in (50, 95, 99)}
+
+
+async def run_level(url: str, sessions: int, args, utterances: list) -> dict:
+    results, errors = [], {}
+    formats = f'in={args.input_format}&out={args.output_format}'
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(url, f'loadtest-{sessions}-{i}', utterances, args.turns, args.think_time,
+                                       args.turn_timeout, formats, results, errors)
+                           for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    summary = {'sessions': sessions, 'turns_completed': len(results), 'errors': errors,
+               'turns_per_sec': round(len(results) / elapsed, 2),
+               'upload_bytes_mean': round(float(np.mean([len(u) for u in utterances]))),
+               'audio_bytes_mean': round(float(np.mean([r['audio_bytes'] for r in results]))) if results else None}
+    for mark in ('transcript', 'text', 'first_audio', 'e2e'):
+        for key, value in percentiles([r[mark] for r in results if mark in r]).items():
+            summary[f'{mark}_{key}'] = value
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--audio', nargs='+', required=True, help='recorded utterances to replay (in --input-format)')
+    parser.add_argument('--input-format', default='webm', choices=['webm', 'ogg', 'mp4', 'pcm16'])
+    parser.add_argument('--output-format', default='mp3', choices=['mp3', 'ogg'])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10], help='concurrency levels to run')
+    parser.add_argument('--turns', type=int, default=5, help='utterances per session')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between turns (seconds)')
+    parser.add_argument('--turn-timeout', type=float, default=120.0)
+    parser.add_argument('--server', default='voice_stream:app', help='ASGI app to load-test')
+    parser.add_argument('--target', help='test an already running server at this ws:// URL instead')
+    parser.add_argument('--stt-latency', default='lognormal:300,0.3')
+    parser.add_argument('--llm-latency', default='lognormal:700,0.5')
+    parser.add_argument('--tts-latency', default='lognormal:400,0.3')
+    parser.add_argument('--tool-call-rate', type=float, default=0.5, help='fraction of turns that call a search tool')
+    parser.add_argument('--erp-url', help='use this running ERP API (http://host:port/api) instead of starting one')
+    parser.add_argument('--output', help='append results to this JSON-lines file')
+    args = parser.parse_args()
+
+    utterances = []
+    for path in args.audio:
+        with open(path, 'rb') as f:
+            utterances.append(f.read())
+
+    processes = []
+    server = None
+    url = args.target
+    try:
+        if url is None:
+            stub_port, server_port = free_port(), free_port()
+            # Own process groups, so the ERP's reloader child and gateway workers are stopped too
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'stub_providers.py'), '--port', str(stub_port),
+                 '--stt-latency', args.stt_latency, '--llm-latency', args.llm_latency, '--tts-latency', args.tts_latency,
+                 '--tool-call-rate', str(args.tool_call_rate)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True))
+            erp_url = args.erp_url
+            if erp_url is None:
+                erp_port = free_port()
+                processes.append(subprocess.Popen(
+                    [sys.executable, 'ERP.py'], cwd=ROOT, env={**os.environ, 'ERP_PORT': str(erp_port)},
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True))
+                erp_url = f'http://127.0.0.1:{erp_port}/api'
+            wait_for(f'http://127.0.0.1:{stub_port}/stats')
+            wait_for(f'{erp_url}/customers')
+            env = {**os.environ, 'GROQ_BASE_URL': f'http://127.0.0.1:{stub_port}', 'GROQ_API_KEY': 'stub',
+                   'ERP_API_URL': erp_url}
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', args.server, '--host', '127.0.0.1', '--port', str(server_port)],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            processes.append(server)
+            wait_for(f'http://127.0.0.1:{server_port}/health')
+            url = f'ws://127.0.0.1:{server_port}/'
+
+        out = open(args.output, 'a') if args.output else None
+        for sessions in args.sessions:
+            sampler = ResourceSampler(server.pid) if server else None
+            if sampler:
+                sampler.start()
+            summary = asyncio.run(run_level(url, sessions, args, utterances))
+            if sampler:
+                summary.update(sampler.stop())
+            line = json.dumps({'server': args.server if server else url, 'input_format': args.input_format,
+                               'output_format': args.output_format, 'stt_latency': args.stt_latency,
+                               'llm_latency': args.llm_latency, 'tts_latency': args.tts_latency,
+                               'tool_call_rate': args.tool_call_rate, **summary})
+            print(line)
+            if out:
+                out.write(line + '\n')
+        if out:
+            out.close()
+    finally:
+        for process in reversed(processes):
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
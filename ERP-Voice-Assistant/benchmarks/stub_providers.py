@@ -0,0 +1,162 @@
+"""
+Local stand-in for the Groq API (speech-to-text, chat completions and text-to-speech), so the
+voice pipeline can be load-tested without a network or API quota. Point the voice agent at it
+with GROQ_BASE_URL=http://127.0.0.1:<port> (both the Groq client and ChatGroq honour it).
+
+Each endpoint waits for a delay drawn from a configurable distribution before answering:
+
+    fixed:MS           always MS milliseconds
+    uniform:LO,HI      uniformly between LO and HI ms
+    lognormal:MEDIAN,SIGMA
+                       log-normal with the given median (ms) and shape; long-tailed like real APIs
+
+    python benchmarks/stub_providers.py --port 8990 --llm-latency lognormal:600,0.5
+
+With --tool-call-rate, that fraction of chat completions answering a user message call one of
+the request's search tools instead of replying, so the agent's tool step (and the ERP behind it)
+runs as in a real turn. The completion that follows the tool result is a plain reply.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+import uvicorn
+
+# Speech runs at roughly 15 characters a second; at 32 kbit/s that is ~270 bytes of MP3 per character,
+# and ~200 bytes of 24 kbit/s Ogg/Opus
+TTS_BYTES_PER_CHAR = {'mp3': 270, 'ogg': 200}
+TTS_MEDIA_TYPES = {'mp3': 'audio/mpeg', 'ogg': 'audio/ogg'}
+
+UTTERANCES = [
+    "Show me the details for customer {n}",
+    "How many orders are still pending for account {n}",
+    "What is the stock level of product {n}",
+    "Create an invoice for order number {n}",
+    "Who are our top five customers this quarter, batch {n}",
+]
+
+
+def parse_latency(spec: str):
+    """Returns a zero-argument function drawing one delay in seconds from a latency spec."""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(*values) / 1000
+    if kind == 'lognormal' and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Invalid latency spec '{spec}' (expected fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA)")
+
+
+def pick_tool_call(payload: dict, last_user: str, tool_call_rate: float):
+    """A search tool call ({'id', 'type', 'function'}) for a fraction of turns, or None for a plain reply."""
+    messages = payload.get('messages', [])
+    if not messages or messages[-1].get('role') != 'user' or random.random() >= tool_call_rate:
+        return None
+    names = [t['function']['name'] for t in payload.get('tools', []) if t.get('function', {}).get('name', '').startswith('search_')]
+    if not names:
+        return None
+    words = re.findall(r'[A-Za-z]{3,}', last_user) or ['a']
+    return {'id': f"call_{uuid.uuid4().hex[:12]}", 'type': 'function',
+            'function': {'name': random.choice(names), 'arguments': json.dumps({'query': random.choice(words)})}}
+
+
+def create_app(stt_latency: str = 'lognormal:300,0.3', llm_latency: str = 'lognormal:700,0.5',
+               tts_latency: str = 'lognormal:400,0.3', tool_call_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    delays = {'stt': parse_latency(stt_latency), 'llm': parse_latency(llm_latency), 'tts': parse_latency(tts_latency)}
+    counter = itertools.count(1)
+    stats = {'stt': 0, 'llm': 0, 'llm_tool_calls': 0, 'tts': 0, 'llm_prompt_bytes': 0, 'audio_bytes_in': 0}
+
+    @app.post('/openai/v1/audio/transcriptions')
+    async def transcriptions(request: Request):
+        # Scan the multipart body directly rather than depend on python-multipart for form parsing
+        body = await request.body()
+        stats['audio_bytes_in'] += len(body)
+        stats['stt'] += 1
+        await asyncio.sleep(delays['stt']())
+        # A different sentence every call, so the response cache never short-circuits the agent
+        n = next(counter)
+        text = UTTERANCES[n % len(UTTERANCES)].format(n=n)
+        if re.search(rb'name="response_format"\r\n\r\ntext\r\n', body):
+            return PlainTextResponse(text)
+        return {'text': text}
+
+    @app.post('/openai/v1/chat/completions')
+    async def chat_completions(request: Request):
+        body = await request.body()
+        payload = json.loads(body)
+        stats['llm'] += 1
+        stats['llm_prompt_bytes'] += len(body)
+        await asyncio.sleep(delays['llm']())
+        last_user = next((m.get('content') for m in reversed(payload.get('messages', [])) if m.get('role') == 'user'), '')
+        tool_call = pick_tool_call(payload, last_user or '', tool_call_rate)
+        content = '' if tool_call else f"Here is what I found for: {last_user}"
+        finish_reason = 'tool_calls' if tool_call else 'stop'
+        stats['llm_tool_calls'] += bool(tool_call)
+        usage = {'prompt_tokens': len(body) // 4, 'completion_tokens': len(content) // 4,
+                 'total_tokens': (len(body) + len(content)) // 4}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = payload.get('model', 'stub')
+
+        if payload.get('stream'):
+            def events():
+                second = {'tool_calls': [{'index': 0, **tool_call}]} if tool_call else {'content': content}
+                for delta in ({'role': 'assistant', 'content': ''}, second):
+                    chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                             'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                final = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                         'choices': [{'index': 0, 'delta': {}, 'finish_reason': finish_reason}], 'x_groq': {'usage': usage}}
+                yield f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n"
+            return StreamingResponse(events(), media_type='text/event-stream')
+
+        message = {'role': 'assistant', 'content': content}
+        if tool_call:
+            message['tool_calls'] = [tool_call]
+        return {'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+                'usage': usage}
+
+    @app.post('/openai/v1/audio/speech')
+    async def speech(request: Request):
+        payload = await request.json()
+        audio_format = payload.get('response_format', 'mp3')
+        stats['tts'] += 1
+        await asyncio.sleep(delays['tts']())
+        return Response(bytes(TTS_BYTES_PER_CHAR.get(audio_format, 270) * len(payload.get('input', ''))),
+                        media_type=TTS_MEDIA_TYPES.get(audio_format, 'audio/mpeg'))
+
+    @app.get('/openai/v1/models')
+    async def models():
+        return {'object': 'list', 'data': [{'id': 'stub', 'object': 'model', 'created': 0, 'owned_by': 'stub'}]}
+
+    @app.get('/stats')
+    async def get_stats():
+        return stats
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8990)
+    parser.add_argument('--stt-latency', default='lognormal:300,0.3')
+    parser.add_argument('--llm-latency', default='lognormal:700,0.5')
+    parser.add_argument('--tts-latency', default='lognormal:400,0.3')
+    parser.add_argument('--tool-call-rate', type=float, default=0.0,
+                        help='fraction of replies to a user message that call a search tool')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.stt_latency, args.llm_latency, args.tts_latency, args.tool_call_rate),
+                host='127.0.0.1', port=args.port)
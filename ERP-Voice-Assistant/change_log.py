@@ -0,0 +1,179 @@
+# change_log.py
+#
+# Change-data-capture log for the ERP: every row insert, update and delete gets a monotonically
+# increasing sequence number, so clients can ask for "everything after seq N" instead of
+# reloading whole tables. The newest changes live in an in-memory ring buffer; older ones spill
+# to JSON-lines segment files on disk, bounded by size. In multi-process mode the shared SQLite
+# store assigns the sequence numbers (inside the write's transaction) and keeps the history,
+# and each worker's ring only caches the tail it has read from there.
+
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+# Changes kept in memory; older ones are read back from the spill
+CHANGE_LOG_CAPACITY = int(os.environ.get('ERP_CHANGE_LOG_CAPACITY', '10000'))
+# Where spilled changes go (default: a temporary directory removed at exit) and how much disk they may use
+CHANGE_SPILL_DIR = os.environ.get('ERP_CHANGE_SPILL_DIR')
+CHANGE_SPILL_MAX_BYTES = int(float(os.environ.get('ERP_CHANGE_SPILL_MB', '64')) * 2**20)
+SEGMENT_BYTES = 4 * 2**20
+
+
+class SegmentSpill:
+    """Changes evicted from the ring, as JSON-lines segment files; the oldest segment is dropped past max_bytes."""
+
+    shared = False
+
+    def __init__(self, directory: Optional[str] = CHANGE_SPILL_DIR, max_bytes: int = CHANGE_SPILL_MAX_BYTES,
+                 segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        # [first seq, last seq, path, size] per segment, oldest first
+        self.segments: Deque[list] = deque()
+        self.trimmed_seq = 0
+
+    def _path(self, first_seq: int) -> str:
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='erp-changes-')
+            atexit.register(shutil.rmtree, self.directory, True)
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f'changes-{first_seq:012d}.jsonl')
+
+    def write(self, changes: List[Dict]):
+        if not changes:
+            return
+        lines = ''.join(json.dumps(change, default=str) + '\n' for change in changes).encode()
+        if not self.segments or self.segments[-1][3] >= self.segment_bytes:
+            self.segments.append([changes[0]['seq'], changes[0]['seq'], self._path(changes[0]['seq']), 0])
+        segment = self.segments[-1]
+        with open(segment[2], 'ab') as f:
+            f.write(lines)
+        segment[1] = changes[-1]['seq']
+        segment[3] += len(lines)
+        while len(self.segments) > 1 and sum(s[3] for s in self.segments) > self.max_bytes:
+            dropped = self.segments.popleft()
+            self.trimmed_seq = dropped[1]
+            os.remove(dropped[2])
+
+    def oldest_seq(self) -> Optional[int]:
+        return self.segments[0][0] if self.segments else None
+
+    def read(self, since: int, limit: int) -> List[Dict]:
+        found = []
+        for first_seq, last_seq, path, _ in list(self.segments):
+            if last_seq <= since:
+                continue
+            with open(path, 'rb') as f:
+                for line in f:
+                    change = json.loads(line)
+                    if change['seq'] > since:
+                        found.append(change)
+                        if len(found) >= limit:
+                            return found
+        return found
+
+
+class StoreChanges:
+    """The shared store's change table, standing in for the spill in multi-process mode."""
+
+    shared = True
+
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def trimmed_seq(self) -> int:
+        return self.store.changes_trimmed()
+
+    def write(self, changes: List[Dict]):
+        pass  # already in the store
+
+    def oldest_seq(self) -> Optional[int]:
+        return self.store.changes_oldest()
+
+    def read(self, since: int, limit: int) -> List[Dict]:
+        return self.store.changes_since(since, limit)
+
+
+class ChangeLog:
+    """
+    Ordered row changes: {'seq', 'table', 'op' (insert/update/delete), 'id', 'type' (the
+    data_update event name), 'data' (the row after the change, None for deletes), 'before' (the
+    changed columns' old values, or the deleted row), 'actor', 'utterance', 'timestamp'}.
+    """
+
+    def __init__(self, capacity: int = CHANGE_LOG_CAPACITY, spill=None):
+        self.capacity = capacity
+        self.spill = spill if spill is not None else SegmentSpill()
+        self._ring: Deque[Dict] = deque()
+        self._lock = threading.Lock()
+        self.log_id = self.spill.store.change_log_id() if self.spill.shared else uuid.uuid4().hex[:12]
+        self.latest_seq = self.spill.store.changes_latest() if self.spill.shared else 0
+
+    def record(self, change: Dict) -> int:
+        """Appends a change made by this process and assigns its sequence number (single-process mode)."""
+        with self._lock:
+            self.latest_seq += 1
+            change['seq'] = self.latest_seq
+            self._push(change)
+        return change['seq']
+
+    def extend(self, changes: Iterable[Dict]):
+        """Appends changes that already have sequence numbers (read from the shared store)."""
+        with self._lock:
+            for change in changes:
+                if change['seq'] > self.latest_seq:
+                    self.latest_seq = change['seq']
+                    self._push(change)
+
+    def _push(self, change: Dict):
+        self._ring.append(change)
+        if len(self._ring) > self.capacity:
+            # Spill in batches so the disk sees a few large appends rather than one per write
+            batch = [self._ring.popleft() for _ in range(max(1, self.capacity // 10))]
+            self.spill.write(batch)
+
+    def catch_up(self):
+        """Pulls the changes other workers committed to the shared store since this worker last looked."""
+        if self.spill.shared:
+            self.extend(self.spill.read(self.latest_seq, self.capacity))
+
+    def read(self, since: int, limit: int = 500, tables: Optional[set] = None) -> Dict:
+        """
+        Changes with seq > since, oldest first, at most `limit` scanned. `cursor` is what to pass as
+        `since` next time, and `more` says the limit stopped the read before the newest change.
+        `reset` means changes after `since` are no longer available (or `since` is from another
+        log), so the client has to reload its tables and continue from `cursor`.
+        """
+        self.catch_up()
+        with self._lock:
+            latest = self.latest_seq
+            if since > latest or since < self.spill.trimmed_seq:
+                return {'log_id': self.log_id, 'changes': [], 'cursor': latest, 'reset': True, 'more': False}
+            newer = []
+            for change in reversed(self._ring):
+                if change['seq'] <= since:
+                    break
+                newer.append(change)
+            newer.reverse()
+            ring_start = self._ring[0]['seq'] if self._ring else latest + 1
+        window = self.spill.read(since, limit) if ring_start > since + 1 else []
+        window = [c for c in window if c['seq'] < ring_start] + newer
+        window = window[:limit]
+        cursor = window[-1]['seq'] if window else latest
+        if tables:
+            window = [c for c in window if c['table'] in tables]
+        return {'log_id': self.log_id, 'changes': window, 'cursor': cursor, 'reset': False, 'more': cursor < latest}
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'log_id': self.log_id, 'latest_seq': self.latest_seq, 'in_memory': len(self._ring),
+                    'oldest_in_memory': self._ring[0]['seq'] if self._ring else None,
+                    'oldest_available': self.spill.oldest_seq() or (self._ring[0]['seq'] if self._ring else None)}
@@ -0,0 +1,90 @@
+# http_compression.py
+#
+# Precompressed, ETag-validated responses for content that is built once and served many
+# times (rendered page shells, vendored JavaScript).
+
+import gzip
+import hashlib
+import os
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = int(os.environ.get('API_COMPRESS_MIN_SIZE', '1024'))
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Parses an Accept-Encoding header into the set of codings with a non-zero q-value."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        try:
+            if q.startswith('q=') and float(q[2:] or 0) == 0:
+                continue
+        except ValueError:
+            pass
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    accepted = accepted_encodings(accept_encoding)
+    for coding in ('br', 'gzip'):
+        if coding in available and (coding in accepted or '*' in accepted):
+            return coding
+    return 'identity'
+
+
+class CompressedAsset:
+    """A response body held in identity, gzip and (if available) brotli form, with a strong ETag per form."""
+
+    def __init__(self, body: bytes, content_type: str):
+        self.content_type = content_type
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=11)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {coding: f'"{digest}"' if coding == 'identity' else f'"{digest}-{coding}"' for coding in self.variants}
+
+    def response(self, cache_control: str = 'no-cache') -> Response:
+        coding = choose_encoding(request.headers.get('Accept-Encoding', ''), self.variants)
+        etag = self.etags[coding]
+        if etag in request.headers.get('If-None-Match', ''):
+            resp = Response(status=304)
+        else:
+            resp = Response(self.variants[coding], content_type=self.content_type)
+            if coding != 'identity':
+                resp.headers['Content-Encoding'] = coding
+        resp.headers['ETag'] = etag
+        resp.headers['Cache-Control'] = cache_control
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Compresses a dynamic response on the fly when the client accepts it and the body is large
+    enough. Uses fast settings (brotli quality 4, gzip level 5) since this runs per request.
+    """
+    response.headers.add('Vary', 'Accept-Encoding')
+    if (response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.content_length is None
+            or response.content_length < MIN_COMPRESS_SIZE):
+        return response
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    coding = choose_encoding(request.headers.get('Accept-Encoding', ''), available)
+    if coding == 'identity':
+        return response
+    body = response.get_data()
+    response.set_data(brotli.compress(body, quality=4) if coding == 'br' else gzip.compress(body, compresslevel=5))
+    response.headers['Content-Encoding'] = coding
+    return response
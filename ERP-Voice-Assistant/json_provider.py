@@ -0,0 +1,56 @@
+# json_provider.py
+#
+# Pluggable JSON encoding for the Flask app. ERP_JSON_ENCODER=orjson (default when installed)
+# serializes numpy/pandas scalars natively and writes NaN as null, so DataFrame records can be
+# returned without a cleanup pass; ERP_JSON_ENCODER=std keeps Flask's default encoder.
+
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    handles_nan = True
+    _options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=_default, option=self._options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=self._options), mimetype=self.mimetype
+        )
+
+
+class StdJSONProvider(DefaultJSONProvider):
+    # The stdlib encoder writes NaN as an invalid literal, so callers must clean records first
+    handles_nan = False
+
+
+def make_json_provider(app):
+    choice = os.environ.get("ERP_JSON_ENCODER", "orjson" if orjson else "std")
+    if choice == "orjson" and orjson is not None:
+        return OrjsonProvider(app)
+    return StdJSONProvider(app)
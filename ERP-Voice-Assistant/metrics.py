@@ -0,0 +1,152 @@
+# metrics.py
+#
+# Minimal in-process metrics shared by the voice agent and the ERP server: latency histograms
+# with p50/p95/p99 over a window of recent samples, counters, gauges, timing spans, and
+# rendering in the Prometheus text exposition format.
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW_SIZE = 2048
+
+# Per-request list of spans; set it for the duration of a request to get a trace back
+current_trace: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    """Cumulative Prometheus buckets plus a bounded window of recent samples for quantiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.window.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.window:
+            return {}
+        values = np.quantile(np.fromiter(self.window, dtype=float), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._buckets: Dict[str, tuple] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Optional[tuple] = None):
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Times the block into histogram `name` and appends it to the current request trace, if any."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed, **labels)
+            trace = current_trace.get()
+            if trace is not None:
+                trace.append({"span": name, **labels, "ms": round(elapsed * 1000, 1)})
+
+    def summary(self) -> Dict:
+        """Quantiles per histogram series plus counter and gauge values, for JSON endpoints and logs."""
+        with self._lock:
+            result = {}
+            for name, series in self._histograms.items():
+                for key, h in series.items():
+                    label = ",".join(f"{k}={v}" for k, v in key)
+                    q = h.quantiles()
+                    result[f"{name}{{{label}}}"] = {"count": h.count, **{f"p{int(k * 100)}": round(v, 4) for k, v in q.items()}}
+            for name, series in list(self._counters.items()) + list(self._gauges.items()):
+                for key, value in series.items():
+                    label = ",".join(f"{k}={v}" for k, v in key)
+                    result[f"{name}{{{label}}}"] = value
+            return result
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.namespace}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in series.items():
+                    for bound, count in zip(h.buckets, h.bucket_counts):
+                        lines.append(f"{full}_bucket{_labels(key, (('le', repr(bound)),))} {count}")
+                    lines.append(f"{full}_bucket{_labels(key, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{full}_sum{_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{full}_count{_labels(key)} {h.count}")
+                lines.append(f"# TYPE {full}_recent summary")
+                for key, h in series.items():
+                    for q, value in h.quantiles().items():
+                        lines.append(f"{full}_recent{_labels(key, (('quantile', str(q)),))} {value:.6f}")
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    full = f"{self.namespace}_{name}"
+                    if name in self._help:
+                        lines.append(f"# HELP {full} {self._help[name]}")
+                    lines.append(f"# TYPE {full} {kind}")
+                    for key, value in series.items():
+                        lines.append(f"{full}{_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# One registry per service
+voice_metrics = MetricsRegistry("voice")
+erp_metrics = MetricsRegistry("erp")
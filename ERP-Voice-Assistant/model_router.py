@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+from loguru import logger
+
+from metrics import voice_metrics
+
+# --- Router Configuration ---
+# Turns scoring below this complexity go to the small model...
+ROUTER_SMALL_MAX_COMPLEXITY = float(os.environ.get("ROUTER_SMALL_MAX_COMPLEXITY", "0.4"))
+# ...but only when the router is at least this sure; anything less falls back to the large model
+ROUTER_MIN_CONFIDENCE = float(os.environ.get("ROUTER_MIN_CONFIDENCE", "0.7"))
+LONG_TURN_WORDS = 25
+DECISION_MEMORY = 1024
+
+SMALLTALK = {"hello", "hi", "hey", "thanks", "thank", "you", "bye", "goodbye", "good", "morning", "afternoon",
+             "can", "hear", "me", "are", "there"}
+CONFIRMATIONS = {"yes", "yeah", "yep", "no", "nope", "sure", "ok", "okay", "confirm", "confirmed", "correct",
+                 "right", "cancel", "stop", "please", "do", "it", "go", "ahead", "that's", "thats", "fine"}
+NAVIGATION = re.compile(r"\b(go to|open|navigate|switch to|take me to|show me the \w+ (page|screen|app))\b")
+LOOKUP = re.compile(r"\b(find|search|look up|lookup|who is|what is|what's|show me|details|email|phone|status of)\b")
+ANALYTICS = re.compile(r"\b(total|sum|average|top|how many|how much|revenue|outstanding|receivables?|compare|"
+                       r"trend|most|least|highest|lowest|best|worst|breakdown)\b")
+WRITE = re.compile(r"\b(create|add|new|update|change|set|delete|remove|place|cancel the order|mark|record|"
+                   r"invoice for|pay|paid)\b")
+WRITE_TOOLS_PREFIXES = ("create_", "update_", "delete_", "place_")
+# The confirmation questions the system prompt requires before a create, update or delete
+CONFIRM_PROMPT = re.compile(r"\b(save|proceed|submit|confirm|go ahead|continue)\b")
+# Tools the assistant uses while preparing a write (filling its form, finding the record)
+WRITE_FLOW_TOOLS = ("fill_form_field", "search_")
+
+
+@dataclass
+class RouteDecision:
+    model: str  # "small" or "large"
+    complexity: float
+    confidence: float
+    reasons: List[str] = field(default_factory=list)
+
+
+def _words(text: str) -> List[str]:
+    return re.sub(r"[^a-z0-9'\s]", " ", text.lower()).split()
+
+
+def _recent_tool_calls(messages: Sequence) -> List[str]:
+    """Tool names the assistant called in the previous turn."""
+    names = []
+    for message in reversed(messages[:-1]):
+        if getattr(message, "type", None) == "human":
+            break
+        names.extend(call["name"] for call in (getattr(message, "tool_calls", None) or []))
+    return names
+
+
+def _last_ai_text(messages: Sequence) -> str:
+    for message in reversed(messages[:-1]):
+        if getattr(message, "type", None) == "ai" and isinstance(message.content, str) and message.content:
+            return message.content
+    return ""
+
+
+def score_turn(messages: Sequence) -> RouteDecision:
+    """
+    Scores how hard the turn ending in `messages` is, from the transcript, what the assistant
+    just asked and which tools the turn will likely need. Each matching rule proposes a
+    (complexity, confidence) pair; the most complex one wins.
+    """
+    transcript = messages[-1].content if isinstance(messages[-1].content, str) else ""
+    text = transcript.lower()
+    words = _words(transcript)
+    asked = _last_ai_text(messages).rstrip().endswith("?")
+    previous_tools = _recent_tool_calls(messages)
+    previous_wrote = any(name.startswith(WRITE_TOOLS_PREFIXES) for name in previous_tools)
+    proposals = []
+
+    if words and len(words) <= 6 and set(words) <= SMALLTALK:
+        proposals.append((0.05, 0.95, "smalltalk"))
+    elif words and len(words) <= 4 and set(words) <= CONFIRMATIONS | SMALLTALK:
+        question = _last_ai_text(messages).lower()
+        pending_write = (WRITE.search(question) is not None or CONFIRM_PROMPT.search(question) is not None
+                         or any(name.startswith(WRITE_FLOW_TOOLS) for name in previous_tools))
+        if asked and pending_write and not previous_wrote:
+            # "yes" to "shall I create it?" means assembling the full write call from the history
+            proposals.append((0.6, 0.8, "confirms a write"))
+        else:
+            proposals.append((0.2, 0.85, "confirmation"))
+    if NAVIGATION.search(text):
+        proposals.append((0.15, 0.9, "navigation"))
+    if asked and "fill_form_field" in previous_tools and len(words) <= 8 and not WRITE.search(text):
+        proposals.append((0.25, 0.8, "form field value"))
+    if LOOKUP.search(text) and not ANALYTICS.search(text):
+        proposals.append((0.35, 0.75, "lookup"))
+    if ANALYTICS.search(text):
+        proposals.append((0.8, 0.9, "analytics"))
+    if WRITE.search(text) and not NAVIGATION.search(text):
+        proposals.append((0.85, 0.85, "write"))
+
+    if not proposals:
+        complexity, confidence, reasons = 0.5, 0.3, ["unrecognized intent"]
+    else:
+        complexity, confidence, reason = max(proposals)
+        reasons = [reason]
+    if len(words) > LONG_TURN_WORDS:
+        complexity = min(1.0, complexity + 0.3)
+        reasons.append("long utterance")
+
+    if complexity >= ROUTER_SMALL_MAX_COMPLEXITY:
+        model = "large"
+    elif confidence < ROUTER_MIN_CONFIDENCE:
+        model = "large"
+        reasons.append("low confidence")
+    else:
+        model = "small"
+    return RouteDecision(model, round(complexity, 2), round(confidence, 2), reasons)
+
+
+voice_metrics.describe("route_total", "Agent turns by the model the router picked and the deciding reason")
+voice_metrics.describe("llm_seconds", "Latency of each LLM call, by model")
+voice_metrics.describe("llm_prompt_tokens", "Prompt tokens of each LLM call (system prompt, tool schemas and history), by model",
+                       buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000))
+voice_metrics.describe("llm_errors_total", "Failed LLM calls by model (small-model failures are retried on the large model)")
+
+
+class TurnRouter:
+    """
+    Picks the model for every LLM step of the agent. The decision is made once, on the turn's
+    first step, and kept for its tool-result follow-ups so a turn never switches models halfway.
+    """
+
+    def __init__(self):
+        self._decisions: "OrderedDict[str, RouteDecision]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def route(self, messages: Sequence) -> RouteDecision:
+        last_human = next((i for i in range(len(messages) - 1, -1, -1) if getattr(messages[i], "type", None) == "human"), None)
+        if last_human is None:
+            return RouteDecision("large", 1.0, 1.0, ["no user message"])
+        key = messages[last_human].id or str(id(messages[last_human]))
+        with self._lock:
+            decision = self._decisions.get(key)
+        if decision is not None:
+            return decision
+        decision = score_turn(messages[:last_human + 1])
+        with self._lock:
+            self._decisions[key] = decision
+            while len(self._decisions) > DECISION_MEMORY:
+                self._decisions.popitem(last=False)
+        voice_metrics.inc("route_total", model=decision.model, reason=decision.reasons[-1])
+        logger.info(f"🧭 Routed turn to the {decision.model} model (complexity {decision.complexity}, "
+                    f"confidence {decision.confidence}: {', '.join(decision.reasons)})")
+        return decision
+
+
+turn_router = TurnRouter()
+
+
+def latency_callback(model_name: str):
+    """A LangChain callback handler recording llm_seconds, llm_prompt_tokens and llm_errors_total for one model."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class ModelLatency(BaseCallbackHandler):
+        def __init__(self):
+            self._starts = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                voice_metrics.observe("llm_seconds", time.perf_counter() - start, model=model_name)
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            if usage.get("prompt_tokens"):
+                voice_metrics.observe("llm_prompt_tokens", usage["prompt_tokens"], model=model_name)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._starts.pop(run_id, None)
+            voice_metrics.inc("llm_errors_total", model=model_name)
+            logger.warning(f"⚠️ {model_name} call failed: {error}")
+
+    return ModelLatency()
@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from loguru import logger
+
+from metrics import voice_metrics
+
+# --- Prefetch Configuration ---
+# How long a speculatively fetched list stays usable (it is also checked against the ERP data version)
+PREFETCH_TTL_SECONDS = float(os.environ.get("VOICE_PREFETCH_TTL", "15"))
+
+# ERP list endpoint per table; the keys match the data_version table names
+LIST_ENDPOINTS = {
+    "customers": "customers",
+    "products": "products",
+    "employees": "employees",
+    "invoices": "invoices",
+    "sales_orders": "orders",
+}
+
+# Words in a partial transcript that make a search of that table likely
+TABLE_KEYWORDS = {
+    "customers": {"customer", "customers", "client", "clients", "lead", "leads", "account", "accounts", "company"},
+    "products": {"product", "products", "stock", "sku", "inventory", "item", "items"},
+    "employees": {"employee", "employees", "staff", "hr", "colleague", "manager"},
+    "invoices": {"invoice", "invoices", "bill", "bills", "receivable", "receivables", "unpaid", "overdue"},
+    "sales_orders": {"order", "orders", "shipment", "shipped", "pending", "delivered"},
+}
+
+voice_metrics.describe("prefetch_total", "Speculative list fetches by outcome (fetched, hit, stale)")
+
+
+def words(text: str) -> List[str]:
+    return re.sub(r"[^a-z0-9\s]", " ", text.lower()).split()
+
+
+def stable_prefix(previous: str, current: str) -> str:
+    """The leading words two consecutive partial transcripts agree on; later audio rarely changes them."""
+    stable = []
+    for a, b in zip(words(previous), words(current)):
+        if a != b:
+            break
+        stable.append(b)
+    return " ".join(stable)
+
+
+def tables_mentioned(text: str) -> List[str]:
+    found = set(words(text))
+    return [table for table, keywords in TABLE_KEYWORDS.items() if found & keywords]
+
+
+class _Entry:
+    __slots__ = ("rows", "version", "created")
+
+    def __init__(self, rows, version):
+        self.rows = rows
+        self.version = version
+        self.created = time.monotonic()
+
+
+class ListPrefetch:
+    """
+    ERP list responses fetched speculatively while the user is still speaking.
+
+    Each entry remembers the table's data version from just before it was fetched. The turn
+    records the versions it sees when it starts (note_versions), and a search tool only gets
+    an entry whose version is still the current one, so prefetched data is never staler than
+    a fresh request made at the start of the turn would be.
+    """
+
+    def __init__(self, ttl=PREFETCH_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[str, _Entry] = {}
+        self._in_flight = set()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def note_versions(self, versions: Optional[Dict[str, int]]):
+        with self._lock:
+            self._versions = dict(versions or {})
+
+    def warm(self, table: str, base_url: str, http=requests):
+        """Fetches a table's list unless a fresh copy is already cached or being fetched."""
+        with self._lock:
+            entry = self._entries.get(table)
+            if table in self._in_flight or (entry is not None and time.monotonic() - entry.created < self.ttl / 2):
+                return
+            self._in_flight.add(table)
+        try:
+            # Version first: a write racing the list fetch then makes the entry look stale, never fresh
+            version = http.get(f"{base_url}/data_version", timeout=2).json().get(table)
+            response = http.get(f"{base_url}/{LIST_ENDPOINTS[table]}", timeout=5)
+            response.raise_for_status()
+            with self._lock:
+                self._entries[table] = _Entry(response.json(), version)
+            voice_metrics.inc("prefetch_total", result="fetched", table=table)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"⚠️ Prefetch of {table} failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(table)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, table: str) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is None:
+                return None
+            current = self._versions.get(table)
+            if current is None or entry.version != current or time.monotonic() - entry.created > self.ttl:
+                del self._entries[table]
+                voice_metrics.inc("prefetch_total", result="stale", table=table)
+                return None
+        voice_metrics.inc("prefetch_total", result="hit", table=table)
+        return entry.rows
+
+
+list_prefetch = ListPrefetch()
@@ -1,39 +1,135 @@
-import os
-import tempfile
-import wave
-from typing import Any, Generator, Tuple
+import itertools
+import struct
+from typing import Any, Generator, Iterable, Tuple
 
 import numpy as np
 
+# Sample dtypes by (WAVE format tag, bits per sample); 0xFFFE is WAVE_FORMAT_EXTENSIBLE
+WAV_DTYPES = {
+    (1, 8): np.dtype("u1"),
+    (1, 16): np.dtype("<i2"),
+    (1, 32): np.dtype("<i4"),
+    (3, 32): np.dtype("<f4"),
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Streamed WAV responses don't know their length up front and put this in the size fields
+UNKNOWN_SIZE = 0xFFFFFFFF
+DEFAULT_FRAME_MS = 20
+
+
+class WavStreamError(ValueError):
+    """The byte stream is not a PCM WAV file this decoder understands."""
+
+
+class _ByteStream:
+    """Pulls exact byte counts out of an iterator of chunks, for parsing the header."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                raise WavStreamError("WAV stream ended inside the header")
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def read_wav_header(stream: _ByteStream) -> Tuple[int, int, np.dtype, int]:
+    """Parses RIFF chunks up to the start of the sample data: (sample_rate, channels, dtype, data_size)."""
+    riff, _, wave_id = struct.unpack("<4sI4s", stream.read(12))
+    if riff != b"RIFF" or wave_id != b"WAVE":
+        raise WavStreamError("Not a RIFF/WAVE stream")
+    fmt = None
+    while True:
+        chunk_id, chunk_size = struct.unpack("<4sI", stream.read(8))
+        if chunk_id == b"data":
+            break
+        body = stream.read(chunk_size + (chunk_size & 1))  # chunks are word aligned
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", body[:16])
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                # The real format tag is the first two bytes of the sub-format GUID
+                fmt = (struct.unpack("<H", body[24:26])[0],) + fmt[1:]
+    if fmt is None:
+        raise WavStreamError("WAV stream has no fmt chunk before its data")
+    format_tag, channels, sample_rate, _, _, bits = fmt
+    dtype = WAV_DTYPES.get((format_tag, bits))
+    if dtype is None:
+        raise WavStreamError(f"Unsupported WAV sample format (tag {format_tag}, {bits} bits)")
+    return sample_rate, channels, dtype, chunk_size
+
+
+def iter_wav_frames(
+    chunks: Iterable[bytes], frame_ms: int = DEFAULT_FRAME_MS
+) -> Generator[Tuple[int, np.ndarray], None, None]:
+    """
+    Decode a WAV byte stream incrementally into fixed-size frames.
+
+    The header is parsed from the first chunks; after that every frame that lies inside one
+    incoming chunk is a read-only `np.frombuffer` view of that chunk, so nothing is copied.
+    Only frames straddling two chunks are stitched together. The last frame may be shorter.
+
+    Args:
+        chunks: Iterable of raw bytes, e.g. an HTTP response's iter_bytes()
+        frame_ms: Frame length in milliseconds
+
+    Yields:
+        Tuples of (sample_rate, audio_array), audio_array shaped (channels, samples)
+    """
+    stream = _ByteStream(chunks)
+    sample_rate, channels, dtype, data_size = read_wav_header(stream)
+    block = dtype.itemsize * channels
+    frame_bytes = max(1, sample_rate * frame_ms // 1000) * block
+    remaining = None if data_size in (0, UNKNOWN_SIZE) else data_size
+
+    def frame(buffer, offset: int, size: int) -> np.ndarray:
+        return np.frombuffer(buffer, dtype=dtype, count=size // dtype.itemsize, offset=offset).reshape(-1, channels).T
+
+    carry = bytearray()
+    # Bytes read past the header belong to the first frames
+    for chunk in itertools.chain([stream.buffer], stream.chunks):
+        if remaining is not None:
+            chunk = memoryview(chunk)[:remaining]
+            remaining -= len(chunk)
+        offset = 0
+        if carry:
+            # Finish the frame left over from the previous chunk
+            take = min(frame_bytes - len(carry), len(chunk))
+            carry += chunk[:take]
+            offset = take
+            if len(carry) == frame_bytes:
+                yield sample_rate, frame(bytes(carry), 0, frame_bytes)
+                carry = bytearray()
+        while len(chunk) - offset >= frame_bytes:
+            yield sample_rate, frame(chunk, offset, frame_bytes)
+            offset += frame_bytes
+        carry += chunk[offset:]
+        if remaining == 0:
+            break
+    tail = len(carry) - len(carry) % block
+    if tail:
+        yield sample_rate, frame(bytes(carry), 0, tail)
+
 
 def process_groq_tts(
-    tts_response: Any,
+    tts_response: Any, frame_ms: int = DEFAULT_FRAME_MS
 ) -> Generator[Tuple[int, np.ndarray], None, None]:
     """
-    Process Groq TTS response into a complete audio segment.
+    Stream a Groq TTS response (response_format="wav") as audio frames.
 
-    This function reads the entire audio file and yields it as one piece.
+    Frames are yielded as soon as their bytes arrive, so playback or resampling can start on
+    the first one instead of after the whole utterance has been downloaded.
 
     Args:
-        tts_response: Groq TTS API response object
+        tts_response: Groq TTS API response object, or a streaming response from
+            audio.speech.with_streaming_response.create()
+        frame_ms: Frame length in milliseconds
 
     Yields:
-        A single tuple of (sample_rate, audio_array) for audio playback
+        Tuples of (sample_rate, audio_array) for audio playback
     """
-    temp_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    temp_file_path = temp_file.name
-    temp_file.close()
-
-    try:
-        tts_response.write_to_file(temp_file_path)
-
-        with wave.open(temp_file_path, "rb") as wf:
-            sample_rate = wf.getframerate()
-            n_frames = wf.getnframes()
-            audio_data = wf.readframes(n_frames)
-
-        audio_array = np.frombuffer(audio_data, dtype=np.int16).reshape(1, -1)
-        yield (sample_rate, audio_array)
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
\ No newline at end of file
+    yield from iter_wav_frames(tts_response.iter_bytes(), frame_ms)
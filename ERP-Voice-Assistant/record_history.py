@@ -0,0 +1,210 @@
+# record_history.py
+#
+# Audit history for ERP rows. Every change from the change log is kept per record as a chain of
+# column deltas: a snapshot to start from, then one small entry per later version holding only
+# the columns that changed, who changed them and (for the voice agent) what the user said. That
+# answers "what did the agent change, and was it what the user asked for", and lets a record or
+# a whole table be read as it was at an earlier point. Compaction folds the oldest versions of a
+# chain into its snapshot once the chain gets too long or too old, which bounds memory.
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Versions kept per record before the oldest are folded into its snapshot
+HISTORY_MAX_VERSIONS = int(os.environ.get('ERP_HISTORY_MAX_VERSIONS', '50'))
+# Versions older than this are folded too, and history of rows deleted this long ago is dropped
+HISTORY_RETAIN_DAYS = float(os.environ.get('ERP_HISTORY_RETAIN_DAYS', '30'))
+# Writes between age-based compaction sweeps
+COMPACT_EVERY = 1000
+
+
+class _Version:
+    """One version of a record. `delta` is the full row for snapshots, the changed columns for updates, None for deletes."""
+    __slots__ = ('version', 'seq', 'timestamp', 'op', 'actor', 'utterance', 'remote_addr', 'delta')
+
+    def __init__(self, version, seq, timestamp, op, actor, utterance, delta, remote_addr=None):
+        self.version = version
+        self.seq = seq
+        self.timestamp = timestamp
+        self.op = op
+        self.actor = actor
+        self.utterance = utterance
+        self.remote_addr = remote_addr
+        self.delta = delta
+
+    @property
+    def is_snapshot(self) -> bool:
+        return self.op in ('insert', 'initial', 'compacted')
+
+
+def _replay(chain: List[_Version], upto: int) -> Optional[Dict]:
+    """The record's state after chain[upto]; chain[0] is always a snapshot."""
+    state = None
+    for entry in chain[:upto + 1]:
+        if entry.is_snapshot:
+            state = dict(entry.delta)
+        elif entry.op == 'delete':
+            state = None
+        elif state is not None:
+            state.update(entry.delta)
+    return state
+
+
+def parse_point(at: Union[str, int]) -> Union[int, str]:
+    """
+    A point in history: a change-log sequence number, or an ISO timestamp normalized for comparison
+    with the change timestamps, which are naive local time. A timestamp with an offset (or Z) is
+    converted to local time first.
+    """
+    if isinstance(at, int) or str(at).isdigit():
+        return int(at)
+    point = datetime.fromisoformat(str(at))
+    if point.tzinfo is not None:
+        point = point.astimezone().replace(tzinfo=None)
+    return point.isoformat()
+
+
+def _before(entry: _Version, point: Union[int, str]) -> bool:
+    """Whether the version existed at `point`. The 'initial' snapshot predates everything."""
+    if entry.op == 'initial':
+        return True
+    return (entry.seq <= point) if isinstance(point, int) else (entry.timestamp <= point)
+
+
+class RecordHistory:
+    """Version chains keyed by (table, id), fed with change-log entries in sequence order."""
+
+    def __init__(self, max_versions: int = HISTORY_MAX_VERSIONS, retain_days: float = HISTORY_RETAIN_DAYS):
+        self.max_versions = max(2, max_versions)
+        self.retain = timedelta(days=retain_days)
+        self.latest_seq = 0
+        self.compacted_versions = 0
+        self._chains: Dict[Tuple[str, str], List[_Version]] = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def apply(self, change: Dict):
+        """Adds one change-log entry ({'seq', 'table', 'id', 'op', 'data', 'before', 'actor', 'utterance', 'remote_addr', 'timestamp'})."""
+        op, before = change['op'], change.get('before') or {}
+        if op == 'update':
+            delta = {column: change['data'][column] for column in before}
+            if not delta:
+                return  # nothing actually changed
+        else:
+            delta = dict(change['data']) if op == 'insert' else None
+        key = (change['table'], change['id'])
+        with self._lock:
+            self.latest_seq = max(self.latest_seq, change['seq'])
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = self._chains[key] = []
+                if op != 'insert':
+                    # First change to a row that predates the history: its prior state becomes the snapshot
+                    prior = dict(before) if op == 'delete' else {**change['data'], **before}
+                    chain.append(_Version(0, None, None, 'initial', None, None, prior))
+            version = chain[-1].version + 1 if chain else 1
+            chain.append(_Version(version, change['seq'], change['timestamp'], op, change.get('actor'),
+                                  change.get('utterance'), delta, change.get('remote_addr')))
+            if len(chain) > self.max_versions:
+                self._fold(chain, len(chain) - self.max_versions + 1)
+            self._writes += 1
+            if self._writes % COMPACT_EVERY == 0:
+                self._compact_old()
+
+    def extend(self, changes: Iterable[Dict]):
+        for change in changes:
+            if change['seq'] > self.latest_seq:
+                self.apply(change)
+
+    def _fold(self, chain: List[_Version], count: int):
+        """Replaces the first `count` versions with one snapshot of the state after them."""
+        last = chain[count - 1]
+        state = _replay(chain, count - 1)
+        chain[:count] = [_Version(last.version, last.seq, last.timestamp, 'compacted', last.actor, last.utterance, state,
+                                  last.remote_addr)]
+        self.compacted_versions += count - 1
+
+    def _compact_old(self):
+        cutoff = (datetime.now() - self.retain).isoformat()
+        for key, chain in list(self._chains.items()):
+            if chain[-1].op == 'delete' and chain[-1].timestamp < cutoff:
+                del self._chains[key]
+                continue
+            old = sum(1 for entry in chain[:-1] if entry.op == 'initial' or entry.timestamp < cutoff)
+            if old > 1:
+                self._fold(chain, old)
+
+    def versions(self, table: str, item_id: str) -> Optional[List[Dict]]:
+        """The record's versions, oldest first, with from/to values for every changed column."""
+        with self._lock:
+            chain = list(self._chains.get((table, item_id)) or ())
+        if not chain:
+            return None
+        result, state = [], None
+        for entry in chain:
+            item = {'version': entry.version, 'seq': entry.seq, 'timestamp': entry.timestamp, 'op': entry.op,
+                    'actor': entry.actor, 'utterance': entry.utterance, 'remote_addr': entry.remote_addr}
+            if entry.is_snapshot:
+                state = dict(entry.delta)
+                item['record'] = entry.delta
+            elif entry.op == 'delete':
+                item['record'], state = state, None
+            else:
+                item['changes'] = {column: {'from': (state or {}).get(column), 'to': value} for column, value in entry.delta.items()}
+                state = {**(state or {}), **entry.delta}
+            result.append(item)
+        return result
+
+    def as_of(self, table: str, item_id: str, at: Union[str, int]) -> Optional[Dict]:
+        """
+        The record at `at` (a sequence number or ISO timestamp): {'record', 'version', 'available'}.
+        None when the record has no history (it hasn't changed since the history began).
+        `available` is False when `at` predates what compaction kept.
+        """
+        point = parse_point(at)
+        with self._lock:
+            chain = list(self._chains.get((table, item_id)) or ())
+        if not chain:
+            return None
+        upto = max((i for i, entry in enumerate(chain) if _before(entry, point)), default=None)
+        if upto is None:
+            # Every version is later: the record didn't exist yet, unless its earlier versions were compacted away
+            return {'record': None, 'version': None, 'available': chain[0].op == 'insert'}
+        return {'record': _replay(chain, upto), 'version': chain[upto].version, 'available': True}
+
+    def table_as_of(self, table: str, current: Dict[str, Dict], at: Union[str, int]) -> Tuple[List[Dict], bool]:
+        """
+        The whole table at `at`: rows without history are unchanged, so they come from `current`
+        (id -> row); changed, deleted and later-inserted rows are replayed. Returns (rows, complete).
+        """
+        with self._lock:
+            item_ids = [item_id for (name, item_id) in self._chains if name == table]
+        rows = dict(current)
+        complete = True
+        for item_id in item_ids:
+            state = self.as_of(table, item_id, at)
+            if state is None:
+                continue
+            complete = complete and state['available']
+            if state['record'] is None:
+                rows.pop(item_id, None)
+            else:
+                rows[item_id] = state['record']
+        return list(rows.values()), complete
+
+    def find(self, table: str, column: str, value) -> Optional[str]:
+        """The id of a record (possibly deleted) whose history has `column` == value, e.g. an employee number."""
+        with self._lock:
+            chains = [(item_id, chain) for (name, item_id), chain in self._chains.items() if name == table]
+        for item_id, chain in chains:
+            if any(entry.delta and entry.delta.get(column) == value for entry in chain):
+                return item_id
+        return None
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'records': len(self._chains), 'versions': sum(len(c) for c in self._chains.values()),
+                    'compacted_versions': self.compacted_versions, 'latest_seq': self.latest_seq,
+                    'max_versions': self.max_versions}
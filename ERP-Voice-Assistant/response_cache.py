@@ -0,0 +1,147 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import requests
+from loguru import logger
+
+# --- Cache Configuration ---
+CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+# Optional local CPU embedding model (sentence-transformers), e.g. "all-MiniLM-L6-v2".
+# Leave unset to use exact (normalized) transcript matching only.
+CACHE_EMBED_MODEL = os.environ.get("RESPONSE_CACHE_EMBED_MODEL", "")
+CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
+FILLER_WORDS = {"um", "uh", "er", "hey", "please", "okay", "ok"}
+
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase, strip punctuation and filler words so trivial STT variations share a key."""
+    words = re.sub(r"[^a-z0-9\s]", " ", text.lower()).split()
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+
+def fetch_data_versions(base_url: str, http=requests) -> Optional[Dict[str, int]]:
+    """Returns the ERP per-table data versions, or None if the server can't be reached."""
+    try:
+        response = http.get(f"{base_url}/data_version", timeout=2)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"⚠️ Could not fetch data versions, bypassing cache: {e}")
+        return None
+
+
+class _Entry:
+    __slots__ = ("context", "response", "tables", "versions", "created", "embedding")
+
+    def __init__(self, context, response, tables, versions, embedding):
+        self.context = context
+        self.response = response
+        self.tables = tables
+        self.versions = versions
+        self.created = time.monotonic()
+        self.embedding = embedding
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of agent responses for read-only questions.
+
+    Entries are keyed on the conversation context and the normalized transcript, and remember
+    the version of every ERP table the answer was computed from; an entry is only served while
+    all of those versions are unchanged. The context is empty for self-contained questions and
+    otherwise pins the entry to where it was asked (e.g. the session and the assistant's last
+    message), so a bare "yes" never gets an answer meant for another question. When an embedding
+    model is configured, a miss on the exact key falls back to a cosine-similarity search over
+    the live entries with the same context.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS,
+                 embed_model=CACHE_EMBED_MODEL, similarity_threshold=CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._embed_model_name = embed_model
+        self._embedder = None
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "stale": 0, "evictions": 0, "stores": 0}
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if not self._embed_model_name:
+            return None
+        if self._embedder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                logger.warning("⚠️ sentence-transformers not installed, semantic cache lookup disabled")
+                self._embed_model_name = ""
+                return None
+            self._embedder = SentenceTransformer(self._embed_model_name, device="cpu")
+        return self._embedder.encode(text, normalize_embeddings=True)
+
+    def _is_valid(self, entry: _Entry, versions: Dict[str, int]) -> bool:
+        if time.monotonic() - entry.created > self.ttl:
+            return False
+        return all(versions.get(t) == entry.versions.get(t) for t in entry.tables)
+
+    def lookup(self, transcript: str, versions: Optional[Dict[str, int]], context: str = "") -> Optional[str]:
+        if versions is None:
+            return None
+        text = normalize_transcript(transcript)
+        key = (context, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_valid(entry, versions):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry.response
+                del self._entries[key]
+                self.stats["stale"] += 1
+
+        embedding = self._embed(text)
+        if embedding is not None:
+            with self._lock:
+                candidates = [(k, e) for k, e in self._entries.items()
+                              if e.context == context and e.embedding is not None and self._is_valid(e, versions)]
+                if candidates:
+                    scores = np.stack([e.embedding for _, e in candidates]) @ embedding
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        best_key, best_entry = candidates[best]
+                        self._entries.move_to_end(best_key)
+                        self.stats["semantic_hits"] += 1
+                        return best_entry.response
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def store(self, transcript: str, response: str, tables: Iterable[str], versions: Optional[Dict[str, int]],
+              context: str = ""):
+        if versions is None:
+            return
+        text = normalize_transcript(transcript)
+        key = (context, text)
+        tables = tuple(tables)
+        entry = _Entry(context, response, tables, {t: versions.get(t) for t in tables}, self._embed(text))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hit_rate = (self.stats["hits"] + self.stats["semantic_hits"]) / lookups if lookups else 0.0
+            return {**self.stats, "entries": len(self._entries), "hit_rate": round(hit_rate, 3)}
@@ -0,0 +1,194 @@
+# state_store.py
+#
+# Shared state backend for running several ERP.py worker processes against the same data.
+# Each worker keeps serving reads from its in-memory DataFrames; writes go through a SQLite
+# transaction and bump a per-table version, which other workers poll to reload stale tables.
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Changes kept in the store's change log (the CDC feed's history in multi-process mode)
+CHANGE_LOG_RETAIN = int(os.environ.get('ERP_CHANGE_LOG_RETAIN', '100000'))
+# How long a write waits for another process's transaction before giving up, and the longest pause between tries
+STORE_BUSY_TIMEOUT = float(os.environ.get('ERP_STORE_BUSY_TIMEOUT', '30'))
+STORE_RETRY_MAX_SECONDS = 0.05
+
+
+class StoreTransaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.touched = set()
+
+    def get_version(self, table: str) -> int:
+        row = self.conn.execute("SELECT version FROM versions WHERE tbl = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def upsert(self, table: str, record: Dict):
+        self.conn.execute(
+            "INSERT INTO records (tbl, id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(tbl, id) DO UPDATE SET data = excluded.data",
+            (table, record['id'], json.dumps(record, default=str)),
+        )
+        self.touched.add(table)
+
+    def delete(self, table: str, item_id: str):
+        self.conn.execute("DELETE FROM records WHERE tbl = ? AND id = ?", (table, item_id))
+        self.touched.add(table)
+
+    def bump(self, table: str) -> int:
+        self.conn.execute(
+            "INSERT INTO versions (tbl, version) VALUES (?, 1) "
+            "ON CONFLICT(tbl) DO UPDATE SET version = version + 1",
+            (table,),
+        )
+        self.touched.add(table)
+        return self.get_version(table)
+
+    def log_change(self, change: Dict) -> int:
+        """Appends to the change log; the sequence number becomes visible to other workers on commit."""
+        seq = self.conn.execute(
+            "INSERT INTO changes (tbl, data) VALUES (?, ?)", (change['table'], json.dumps(change, default=str))
+        ).lastrowid
+        if seq % 1000 == 0:
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGE_LOG_RETAIN,))
+        return seq
+
+
+class SQLiteStateStore:
+    """
+    SQLite (WAL mode) store of every table's records plus a version counter per table.
+
+    Writes are serialized within the process by a lock and across processes by BEGIN
+    IMMEDIATE; nested transaction() calls in the same context (thread or green thread) join
+    the outermost one, so multi-step operations commit or roll back as a unit. Waiting for
+    either never blocks inside SQLite: both are retried with `sleep`, which the ERP server
+    sets to its cooperative sleep so a contended write doesn't stall the other green threads
+    (eventlet is not monkey-patched). Reads use per-thread connections and never block on writers.
+    """
+
+    def __init__(self, path: str, sleep: Callable[[float], None] = time.sleep, busy_timeout: float = STORE_BUSY_TIMEOUT):
+        self.path = path
+        self.sleep = sleep
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # timeout=0: SQLITE_BUSY comes back at once and _begin() retries cooperatively
+        self._write_conn = self._connect(check_same_thread=False, timeout=0)
+        self._txn: contextvars.ContextVar = contextvars.ContextVar(f'store_txn_{id(self)}', default=None)
+        with self.transaction() as txn:
+            for statement in (
+                "CREATE TABLE IF NOT EXISTS records (tbl TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, UNIQUE (tbl, id))",
+                "CREATE TABLE IF NOT EXISTS versions (tbl TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+                "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, data TEXT NOT NULL)",
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+            ):
+                txn.conn.execute(statement)
+            txn.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('change_log_id', ?)", (uuid.uuid4().hex[:12],))
+
+    def _connect(self, check_same_thread=True, timeout: float = 30) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=check_same_thread)
+        # Startup may wait for another worker to finish switching the database to WAL
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _begin(self):
+        """Takes the process's write lock and the database's, pausing with self.sleep between tries."""
+        deadline = time.monotonic() + self.busy_timeout
+        pause = 0.001
+        while True:
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    self._write_conn.execute("BEGIN IMMEDIATE")
+                    return
+                except sqlite3.OperationalError as e:
+                    self._write_lock.release()
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+            if time.monotonic() >= deadline:
+                raise sqlite3.OperationalError(f'database is locked (waited {self.busy_timeout:.0f}s)')
+            self.sleep(pause)
+            pause = min(pause * 2, STORE_RETRY_MAX_SECONDS)
+
+    @contextmanager
+    def transaction(self):
+        txn = self._txn.get()
+        if txn is not None:
+            yield txn  # nested: part of the outermost transaction
+            return
+        self._begin()
+        txn = StoreTransaction(self._write_conn)
+        token = self._txn.set(txn)
+        try:
+            yield txn
+        except BaseException:
+            self._write_conn.execute("ROLLBACK")
+            raise
+        else:
+            self._write_conn.execute("COMMIT")
+        finally:
+            self._txn.reset(token)
+            self._write_lock.release()
+
+    def current_transaction(self) -> Optional[StoreTransaction]:
+        return self._txn.get()
+
+    def seed(self, tables: Dict[str, List[Dict]]) -> bool:
+        """Loads the initial records if the store is empty. Returns True if this call seeded it."""
+        with self.transaction() as txn:
+            if txn.conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0]:
+                return False
+            for table, records in tables.items():
+                for record in records:
+                    txn.upsert(table, record)
+                txn.conn.execute("INSERT INTO versions (tbl, version) VALUES (?, 0)", (table,))
+            return True
+
+    def versions(self) -> Dict[str, int]:
+        return dict(self._reader().execute("SELECT tbl, version FROM versions").fetchall())
+
+    def load(self, table: str) -> Tuple[List[Dict], int]:
+        """Returns all records of a table (in insertion order) and the version they correspond to."""
+        conn = self._reader()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT version FROM versions WHERE tbl = ?", (table,)).fetchone()
+            rows = conn.execute("SELECT data FROM records WHERE tbl = ? ORDER BY rowid", (table,)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return [json.loads(r[0]) for r in rows], (row[0] if row else 0)
+
+    # ==================== CHANGE LOG ====================
+
+    def change_log_id(self) -> str:
+        return self._reader().execute("SELECT value FROM meta WHERE key = 'change_log_id'").fetchone()[0]
+
+    def changes_since(self, since: int, limit: int) -> List[Dict]:
+        rows = self._reader().execute("SELECT seq, data FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)).fetchall()
+        return [dict(json.loads(data), seq=seq) for seq, data in rows]
+
+    def changes_latest(self) -> int:
+        row = self._reader().execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row[0] if row else 0
+
+    def changes_oldest(self) -> Optional[int]:
+        return self._reader().execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+
+    def changes_trimmed(self) -> int:
+        """Highest sequence number no longer in the log (changes up to here can't be replayed)."""
+        oldest = self.changes_oldest()
+        return (oldest - 1) if oldest is not None else self.changes_latest()
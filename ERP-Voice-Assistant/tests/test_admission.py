@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import Overloaded, ProviderScheduler, TokenBucket
+
+
+class Call(threading.Thread):
+    """Takes a slot for `session_id` and keeps it until released."""
+
+    def __init__(self, scheduler, session_id, granted):
+        super().__init__()
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.granted = granted
+        self.release = threading.Event()
+        self.start()
+
+    def run(self):
+        with self.scheduler.slot(self.session_id, max_wait=5):
+            self.granted.put(self)
+            self.release.wait()
+
+
+@pytest.fixture
+def granted():
+    return queue.Queue()
+
+
+def test_concurrency_limit_and_round_robin_between_sessions(granted):
+    scheduler = ProviderScheduler("test", concurrency=1, per_session=1)
+    for session_id in ("busy", "busy", "busy", "quiet"):
+        Call(scheduler, session_id, granted)
+        time.sleep(0.02)  # queue them in a known order
+    assert scheduler.snapshot()["in_flight"] == 1
+    assert scheduler.snapshot()["waiting"] == 3
+    order = []
+    for _ in range(4):
+        call = granted.get(timeout=1)
+        order.append(call.session_id)
+        call.release.set()
+        call.join()
+    # The quiet session's call goes ahead of the busy session's third one
+    assert order == ["busy", "busy", "quiet", "busy"]
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+def test_per_session_limit(granted):
+    scheduler = ProviderScheduler("test", concurrency=4, per_session=1)
+    first = Call(scheduler, "a", granted)
+    granted.get(timeout=1)
+    with pytest.raises(Overloaded):
+        with scheduler.slot("a", max_wait=0.05):
+            pass
+    with scheduler.slot("b", max_wait=0):
+        pass
+    first.release.set()
+    first.join()
+
+
+def test_waiting_past_the_deadline_is_rejected(granted):
+    scheduler = ProviderScheduler("test", concurrency=1, per_session=1)
+    holder = Call(scheduler, "a", granted)
+    granted.get(timeout=1)
+    with pytest.raises(Overloaded) as error:
+        with scheduler.slot("b", max_wait=0.05):
+            pass
+    assert error.value.reason == "timeout"
+    assert scheduler.snapshot()["waiting"] == 0
+    holder.release.set()
+    holder.join()
+
+
+def test_best_effort_calls_never_wait(granted):
+    scheduler = ProviderScheduler("test", concurrency=1, per_session=1)
+    holder = Call(scheduler, "a", granted)
+    granted.get(timeout=1)
+    start = time.monotonic()
+    with pytest.raises(Overloaded):
+        with scheduler.slot("b", max_wait=0):
+            pass
+    assert time.monotonic() - start < 0.05
+    holder.release.set()
+    holder.join()
+
+
+def test_full_queue_is_rejected_at_once(granted):
+    scheduler = ProviderScheduler("test", concurrency=1, per_session=1, max_queue=1)
+    holder = Call(scheduler, "a", granted)
+    granted.get(timeout=1)
+    waiter = Call(scheduler, "b", granted)
+    time.sleep(0.02)
+    with pytest.raises(Overloaded) as error:
+        with scheduler.slot("c"):
+            pass
+    assert error.value.reason == "queue_full"
+    for call in (holder, waiter):
+        call.release.set()
+    granted.get(timeout=1)
+    waiter.join()
+    holder.join()
+
+
+def test_rate_limit_rejects_calls_that_could_not_start_in_time():
+    scheduler = ProviderScheduler("test", concurrency=10, per_session=10, per_minute=60, burst=2)
+    for _ in range(2):
+        with scheduler.slot("a", max_wait=0):
+            pass
+    with pytest.raises(Overloaded) as error:
+        with scheduler.slot("a", max_wait=0.5):
+            pass
+    assert error.value.reason == "rate_limit"
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(per_minute=600, burst=1)
+    now = bucket.updated
+    assert bucket.delay(now) == 0
+    bucket.take()
+    assert bucket.delay(now) == pytest.approx(0.1)
+    assert bucket.delay(now + 0.1) == pytest.approx(0)
+
+
+def test_rpm_quota_is_split_between_processes(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_PROCESSES", 4)
+    monkeypatch.setenv("VOICE_LLM_RPM", "1000")
+    monkeypatch.setenv("VOICE_LLM_BURST", "20")
+    scheduler = admission._scheduler("llm", concurrency=16, per_session=1)
+    assert scheduler.snapshot()["per_minute"] == 250
+    assert scheduler.bucket.capacity == 5
+    assert scheduler.concurrency == 16
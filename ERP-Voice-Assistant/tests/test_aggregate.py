@@ -0,0 +1,81 @@
+import types
+
+import pytest
+
+ERP = pytest.importorskip("ERP")
+import agent_setup  # noqa: E402
+
+
+@pytest.fixture
+def data_manager(monkeypatch):
+    """A DataManager holding just the sample data, serving the API."""
+    data_manager = ERP.DataManager(ERP.socketio)
+    monkeypatch.setattr(ERP, "data_manager", data_manager)
+    return data_manager
+
+
+@pytest.fixture
+def client(data_manager):
+    return ERP.app.test_client()
+
+
+def test_count_rows_and_text_columns(data_manager):
+    assert data_manager.aggregate("orders")["result"] == 2
+    result = data_manager.aggregate("orders", "count", "status")
+    assert result["result"] == 2 and result["matched_rows"] == 2
+    rows = data_manager.aggregate("invoices", "count", "status", group_by="status")["result"]
+    assert sorted((r["group"], r["value"]) for r in rows) == [("Paid", 1), ("Pending", 1)]
+
+
+def test_sum_by_group_is_labelled_and_capped(data_manager):
+    rows = data_manager.aggregate("orders", "sum", "total_amount", "customer_id", top_k=1)["result"]
+    assert rows == [{"group": "cust001", "value": 1499.95, "label": "Acme Corporation"}]
+
+
+def test_top_records(data_manager):
+    rows = data_manager.aggregate("products", "top", "stock_value", top_k=2)["result"]
+    assert [r["id"] for r in rows] == ["prod001", "prod002"]
+    assert rows[1]["stock_value"] == round(449.99 * 45, 2)
+
+
+def test_filters_and_errors(data_manager):
+    result = data_manager.aggregate("invoices", "sum", "outstanding_amount", filters={"status": "pending"})
+    assert result["result"] == 899.97 and result["matched_rows"] == 1
+    for args in [("nothing",), ("orders", "median", "total_amount"), ("orders", "sum"),
+                 ("orders", "sum", "nope"), ("orders", "count", None, None, None, {"nope": "x"})]:
+        with pytest.raises(ValueError):
+            data_manager.aggregate(*args)
+
+
+def test_api_takes_filters_from_the_filter_prefix(client):
+    response = client.get("/api/aggregate/orders?agg=count&field=status&_=123")
+    assert response.status_code == 200 and response.get_json()["result"] == 2
+    response = client.get("/api/aggregate/orders?agg=sum&field=total_amount&filter.status=Pending")
+    assert response.get_json()["result"] == 899.97
+    assert client.get("/api/aggregate/orders?filter.nope=1").status_code == 400
+    assert client.get("/api/aggregate/orders?top_k=many").status_code == 400
+
+
+class ClientSession:
+    """Sends the agent tools' ERP requests to the Flask test client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url, params=None):
+        response = self.client.get(url.replace(agent_setup.BASE_URL, "/api"), query_string=params)
+        return types.SimpleNamespace(status_code=response.status_code, json=response.get_json,
+                                     raise_for_status=lambda: None)
+
+
+def test_agent_tools(client, monkeypatch):
+    monkeypatch.setattr(agent_setup, "erp_http", ClientSession(client))
+    assert agent_setup.aggregate_records("orders", "count", status="Processing") == "count of records in orders: 1 (1 records)"
+    text = agent_setup.aggregate_records("orders", "sum", "total_amount", group_by="customer_id", top_k=5)
+    assert text.splitlines() == ["sum of total_amount in orders by customer_id",
+                                 "cust001 (Acme Corporation): 1499.95", "cust002 (TechStart LLC): 899.97"]
+    assert agent_setup.aggregate_records("orders", "sum").startswith("Invalid aggregation")
+    assert agent_setup.get_outstanding_receivables().splitlines() == [
+        "sum of outstanding_amount in invoices: 899.97 (2 records)",
+        "sum of outstanding_amount in invoices by customer_id",
+        "cust002 (TechStart LLC): 899.97", "cust001 (Acme Corporation): 0"]
@@ -0,0 +1,90 @@
+import contextlib
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+voice_stream = pytest.importorskip("voice_stream")
+import agent_setup  # noqa: E402
+from admission import Overloaded  # noqa: E402
+
+
+class FakeState:
+    def __init__(self, messages):
+        self.values = {"messages": messages}
+
+
+class FakeAgent:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def get_state(self, config):
+        return FakeState(self.messages)
+
+
+def tool_turn(name):
+    return [
+        HumanMessage(content="earlier"), AIMessage(content="Done."),
+        HumanMessage(content="yes, save it"),
+        AIMessage(content="", tool_calls=[{"name": name, "args": {}, "id": "call1"}]),
+        ToolMessage(content="ok", tool_call_id="call1", name=name),
+    ]
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """Runs process_audio with a known transcript, the agent's LLM step turned away and `messages` in the thread."""
+    def run(messages, provider="llm"):
+        monkeypatch.setattr(voice_stream, "get_agent", lambda: FakeAgent(messages))
+        monkeypatch.setattr(voice_stream, "fetch_data_versions", lambda *args: {})
+        monkeypatch.setattr(voice_stream, "conversation_context", lambda session_id: "")
+
+        def overloaded(*args):
+            raise Overloaded(provider, "timeout")
+        monkeypatch.setattr(voice_stream, "run_agent", overloaded)
+        return voice_stream.process_audio(b"", "session", transcript="yes, save it")[0]
+    return run
+
+
+def test_busy_response_before_any_tool_ran(turn):
+    assert turn([HumanMessage(content="yes, save it")]) == voice_stream.BUSY_RESPONSE
+
+
+def test_read_only_tools_still_get_the_busy_response(turn):
+    assert turn(tool_turn("search_customers")) == voice_stream.BUSY_RESPONSE
+
+
+def test_a_write_that_already_ran_is_reported_as_done(turn):
+    assert turn(tool_turn("create_customer")) == voice_stream.WRITE_DONE_BUSY_RESPONSE
+
+
+def test_tts_saturated_without_canned_clip_is_text_only(monkeypatch):
+    monkeypatch.setattr(voice_stream, "canned_audio", {})
+
+    def overloaded(*args):
+        raise Overloaded("tts", "timeout")
+    monkeypatch.setattr(voice_stream, "tts_stream", overloaded)
+    assert voice_stream.synthesize_speech("Here you go", None, "mp3", "session") is None
+    assert voice_stream.synthesize_speech(voice_stream.BUSY_RESPONSE, None, "mp3", "session") is None
+
+    monkeypatch.setattr(voice_stream, "canned_audio", {(voice_stream.TTS_BUSY_RESPONSE, "mp3"): b"clip"})
+    assert voice_stream.synthesize_speech("Here you go", None, "mp3", "session") == b"clip"
+
+
+def test_only_the_first_llm_step_fails_fast(monkeypatch):
+    waits = []
+
+    @contextlib.contextmanager
+    def slot(provider, session_id, max_wait):
+        waits.append(max_wait)
+        yield
+    monkeypatch.setattr(agent_setup, "provider_slot", slot)
+
+    class Model:
+        def invoke(self, messages, config):
+            return AIMessage(content="ok")
+
+    step = agent_setup.scheduled(Model())
+    config = {"configurable": {"thread_id": "session"}}
+    step.invoke([HumanMessage(content="save it")], config)
+    step.invoke(tool_turn("create_customer"), config)
+    assert waits == [agent_setup.ADMISSION_MAX_WAIT, agent_setup.ADMISSION_FOLLOWUP_WAIT]
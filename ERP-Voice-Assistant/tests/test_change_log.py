@@ -0,0 +1,105 @@
+import pytest
+
+from change_log import ChangeLog, SegmentSpill
+
+
+def make_log(tmp_path, capacity=10, max_bytes=2**20, segment_bytes=2**20):
+    return ChangeLog(capacity, SegmentSpill(str(tmp_path), max_bytes, segment_bytes))
+
+
+def record(log, count, table="customers"):
+    for i in range(count):
+        log.record({"table": table, "op": "update", "id": f"c{i}", "data": {"id": f"c{i}"}})
+
+
+def seqs(result):
+    return [change["seq"] for change in result["changes"]]
+
+
+def test_reads_across_the_ring_and_the_spill(tmp_path):
+    log = make_log(tmp_path)
+    record(log, 25)
+    ring_start = log.snapshot()["oldest_in_memory"]
+    assert 1 < ring_start <= 16  # older changes were spilled in batches
+    assert seqs(log.read(0, limit=100)) == list(range(1, 26))
+    # Starting inside the spill, right at the ring boundary, and inside the ring
+    for since in (3, ring_start - 2, ring_start - 1, ring_start, 20):
+        result = log.read(since, limit=100)
+        assert seqs(result) == list(range(since + 1, 26))
+        assert result["cursor"] == 25 and not result["reset"]
+
+
+def test_limit_pages_through_the_boundary(tmp_path):
+    log = make_log(tmp_path)
+    record(log, 25)
+    since, pages, more = 0, [], True
+    while more:
+        result = log.read(since, limit=4)
+        assert len(result["changes"]) <= 4
+        pages += seqs(result)
+        since, more = result["cursor"], result["more"]
+    assert pages == list(range(1, 26)) and since == 25
+
+
+def test_limit_zero_returns_just_the_cursor(tmp_path):
+    log = make_log(tmp_path)
+    record(log, 5)
+    assert log.read(2, limit=0) == {"log_id": log.log_id, "changes": [], "cursor": 5, "reset": False, "more": False}
+
+
+def test_cursor_at_the_head_is_empty(tmp_path):
+    log = make_log(tmp_path)
+    record(log, 5)
+    assert log.read(5) == {"log_id": log.log_id, "changes": [], "cursor": 5, "reset": False, "more": False}
+
+
+def test_since_older_than_the_trimmed_range_resets(tmp_path):
+    # Tiny segments and spill budget: the oldest spilled changes are dropped
+    log = make_log(tmp_path, capacity=10, max_bytes=400, segment_bytes=100)
+    record(log, 60)
+    trimmed = log.spill.trimmed_seq
+    assert trimmed > 0
+    result = log.read(trimmed - 1)
+    assert result == {"log_id": log.log_id, "changes": [], "cursor": 60, "reset": True, "more": False}
+    # The first cursor still covered continues without a gap
+    assert seqs(log.read(trimmed, limit=1000)) == list(range(trimmed + 1, 61))
+
+
+def test_since_ahead_of_the_log_resets(tmp_path):
+    log = make_log(tmp_path)
+    record(log, 5)
+    assert log.read(9)["reset"]
+    assert log.read(-1)["reset"]
+
+
+def test_table_filter_still_advances_the_cursor(tmp_path):
+    log = make_log(tmp_path)
+    record(log, 3, "customers")
+    record(log, 2, "products")
+    result = log.read(0, tables={"products"})
+    assert seqs(result) == [4, 5]
+    assert result["cursor"] == 5
+    result = log.read(0, limit=3, tables={"products"})
+    assert result["changes"] == [] and result["cursor"] == 3 and result["more"]
+    result = log.read(3, limit=3, tables={"products"})
+    assert seqs(result) == [4, 5] and not result["more"]
+
+
+@pytest.fixture
+def client():
+    ERP = pytest.importorskip("ERP")
+    return ERP, ERP.app.test_client()
+
+
+def test_cursor_from_another_log_resets(client):
+    ERP, client = client
+    latest = ERP.data_manager.change_log.latest_seq
+    result = client.get(f"/api/changes?since={latest}&log=someotherlog").get_json()
+    assert result["reset"] and result["cursor"] == latest
+    result = client.get(f"/api/changes?since={latest}&log={result['log_id']}").get_json()
+    assert not result["reset"]
+
+
+def test_since_is_required(client):
+    _, client = client
+    assert client.get("/api/changes").status_code == 400
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+ERP = pytest.importorskip("ERP")
+eventlet = pytest.importorskip("eventlet")
+
+
+@pytest.fixture
+def data_manager():
+    return ERP.DataManager(ERP.socketio)
+
+
+def locked_section(data_manager, name, events, sleep):
+    with data_manager._entity_lock("products", "prod001"):
+        events.append(f"{name} in")
+        sleep(0.02)
+        events.append(f"{name} out")
+
+
+def test_green_threads_exclude_each_other(data_manager):
+    # Unpatched eventlet: both green threads run on this OS thread
+    events = []
+    threads = [eventlet.spawn(locked_section, data_manager, name, events, eventlet.sleep) for name in ("a", "b")]
+    for thread in threads:
+        thread.wait()
+    assert events == ["a in", "a out", "b in", "b out"]
+
+
+def test_os_threads_exclude_each_other(data_manager):
+    events = []
+    threads = [threading.Thread(target=locked_section, args=(data_manager, name, events, time.sleep)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert events in (["a in", "a out", "b in", "b out"], ["b in", "b out", "a in", "a out"])
+
+
+def test_reentrant_and_several_rows_at_once(data_manager):
+    with data_manager._entity_lock("products", "prod003", "prod001", "prod001"):
+        with data_manager._entity_lock("products", "prod001"):
+            with data_manager._entity_lock("sales_orders", "ord001"):
+                pass
+    assert not any(lock.locked() for locks in data_manager._entity_locks.values() for lock in locks)
+
+
+def test_unknown_ids_take_no_memory(data_manager, monkeypatch):
+    monkeypatch.setattr(ERP, "data_manager", data_manager)
+    client = ERP.app.test_client()
+    for i in range(200):
+        assert client.delete(f"/api/customers/nobody{i}").status_code == 404
+    assert all(len(locks) == ERP.ENTITY_LOCK_STRIPES for locks in data_manager._entity_locks.values())
@@ -0,0 +1,48 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from model_router import score_turn
+
+
+def conversation(transcript, asked="", tools=()):
+    """A previous turn (the assistant calling `tools`, then saying `asked`) followed by `transcript`."""
+    messages = [HumanMessage(content="earlier request")]
+    for i, name in enumerate(tools):
+        messages.append(AIMessage(content="", tool_calls=[{"name": name, "args": {}, "id": f"call{i}"}]))
+        messages.append(ToolMessage(content="ok", tool_call_id=f"call{i}"))
+    if asked:
+        messages.append(AIMessage(content=asked))
+    messages.append(HumanMessage(content=transcript))
+    return messages
+
+
+@pytest.mark.parametrize("transcript, asked, tools, model, reason", [
+    # Confirmations that execute a write need the large model
+    ("Yes.", "Would you like me to save this customer?", (), "large", "confirms a write"),
+    ("Yes, please.", "Shall I proceed with the update?", (), "large", "confirms a write"),
+    ("Yes", "Do you want me to submit the order?", (), "large", "confirms a write"),
+    ("Sure", "Should I go ahead?", (), "large", "confirms a write"),
+    ("Yes", "Shall I delete customer Acme?", (), "large", "confirms a write"),
+    ("Yes", "Is that right?", ("fill_form_field",), "large", "confirms a write"),
+    ("Yes", "Is this the one you mean?", ("search_customers",), "large", "confirms a write"),
+    # ...unless the write already happened or nothing was asked
+    ("Okay", "Anything else?", ("create_customer",), "small", "confirmation"),
+    ("Thanks", "", (), "small", "smalltalk"),
+    ("yes", "The customer was created.", (), "small", "confirmation"),
+    # Other intents
+    ("Go to the inventory page", "", (), "small", "navigation"),
+    ("Acme Corporation", "What company name should I use?", ("fill_form_field",), "small", "form field value"),
+    ("What is the phone number of Acme", "", (), "small", "lookup"),
+    ("Who are our top five customers by revenue", "", (), "large", "analytics"),
+    ("Create a new customer called Acme", "", (), "large", "write"),
+    ("blorp", "", (), "large", "unrecognized intent"),
+])
+def test_score_turn(transcript, asked, tools, model, reason):
+    decision = score_turn(conversation(transcript, asked, tools))
+    assert (decision.model, decision.reasons[0]) == (model, reason)
+
+
+def test_long_utterances_are_harder():
+    decision = score_turn(conversation("show me " + "the details of the customer " * 6))
+    assert decision.model == "large"
+    assert "long utterance" in decision.reasons
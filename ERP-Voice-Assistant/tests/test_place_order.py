@@ -0,0 +1,97 @@
+import pytest
+
+ERP = pytest.importorskip("ERP")
+from state_store import SQLiteStateStore  # noqa: E402
+
+ORDER = {"customer_id": "cust001", "items": [{"product_id": "prod001", "quantity": 2}]}
+
+
+@pytest.fixture
+def client():
+    return ERP.app.test_client()
+
+
+@pytest.mark.parametrize("body", [
+    ["cust001"],
+    {"customer_id": "cust001", "items": "prod001"},
+    {"customer_id": "cust001", "items": ["prod001"]},
+    {"customer_id": "cust001", "items": [{"product_id": ["prod001"], "quantity": 1}]},
+    {"customer_id": "cust001", "items": [{"product_id": "prod001", "quantity": [1]}]},
+    {"customer_id": "cust001", "items": [{"product_id": "prod001", "quantity": "two"}]},
+    {"customer_id": "cust001", "items": [{"product_id": "prod001", "quantity": 0}]},
+    {"customer_id": "cust001", "items": []},
+    {"customer_id": "nobody", "items": [{"product_id": "prod001", "quantity": 1}]},
+    {"customer_id": "cust001", "items": [{"product_id": "nothing", "quantity": 1}]},
+    {**ORDER, "order_date": "bad-date"},
+    {**ORDER, "due_days": "soon"},
+    {**ORDER, "due_days": -1},
+    {**ORDER, "create_invoice": "maybe"},
+    {**ORDER, "create_invoice": 0},
+])
+def test_malformed_orders_are_rejected(client, body):
+    stock = ERP.data_manager.get_record("products", "prod001")["stock_quantity"]
+    latest, versions = ERP.data_manager.change_log.latest_seq, dict(ERP.data_manager.data_versions)
+    response = client.post("/api/orders/place", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["error"]
+    assert ERP.data_manager.get_record("products", "prod001")["stock_quantity"] == stock
+    assert ERP.data_manager.change_log.latest_seq == latest
+    assert ERP.data_manager.data_versions == versions
+
+
+def test_insufficient_stock_writes_nothing(client):
+    orders = len(ERP.data_manager.sales_orders)
+    response = client.post("/api/orders/place", json={"customer_id": "cust001", "items": [
+        {"product_id": "prod001", "quantity": 1}, {"product_id": "prod003", "quantity": 10_000}]})
+    assert response.status_code == 409
+    assert len(ERP.data_manager.sales_orders) == orders
+
+
+def test_order_reserves_stock(client):
+    stock = ERP.data_manager.get_record("products", "prod002")["stock_quantity"]
+    response = client.post("/api/orders/place", json={"customer_id": "cust002", "items": [
+        {"product_id": "prod002", "quantity": 2}]})
+    assert response.status_code == 201
+    assert ERP.data_manager.get_record("products", "prod002")["stock_quantity"] == stock - 2
+
+
+def test_create_invoice_false_as_a_string(client):
+    response = client.post("/api/orders/place", json={**ORDER, "create_invoice": "false"})
+    assert response.status_code == 201
+    assert response.get_json()["invoice"] is None
+
+
+@pytest.fixture(params=["memory", "store"])
+def data_manager(request, tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db")) if request.param == "store" else None
+    return ERP.DataManager(ERP.socketio, store)
+
+
+def test_failure_after_writes_started_leaves_no_trace(data_manager, monkeypatch):
+    add_item = data_manager._add_item
+
+    def fail_on_invoice(df_name, *args, **kwargs):
+        if df_name == "invoices":
+            raise RuntimeError("disk full")
+        return add_item(df_name, *args, **kwargs)
+    monkeypatch.setattr(data_manager, "_add_item", fail_on_invoice)
+
+    latest, versions = data_manager.change_log.latest_seq, dict(data_manager.data_versions)
+    rows = {name: len(getattr(data_manager, name)) for name in ("sales_orders", "order_items", "invoices")}
+    with pytest.raises(RuntimeError):
+        data_manager.place_order(ORDER)
+    data_manager.refresh()
+    data_manager._sync_history()
+    assert data_manager.get_record("products", "prod001")["stock_quantity"] == 150
+    assert {name: len(getattr(data_manager, name)) for name in rows} == rows
+    assert data_manager.change_log.read(latest)["changes"] == []
+    assert data_manager.data_versions == versions
+    assert data_manager.history.versions("products", "prod001") is None
+
+    # The next order is published as usual
+    monkeypatch.undo()
+    order = data_manager.place_order(ORDER)
+    data_manager._sync_history()
+    tables = [change["table"] for change in data_manager.change_log.read(latest)["changes"]]
+    assert tables == ["products", "sales_orders", "order_items", "invoices"]
+    assert data_manager.history.versions("sales_orders", order["id"])[0]["op"] == "insert"
@@ -0,0 +1,87 @@
+import random
+import struct
+import uuid
+
+import numpy as np
+import pytest
+
+from process_tts import UNKNOWN_SIZE, WAVE_FORMAT_EXTENSIBLE, WavStreamError, iter_wav_frames
+
+RATE = 8000
+
+
+def make_wav(samples: np.ndarray, extensible=False, data_size=None, before_data=b"", after_data=b"") -> bytes:
+    """A WAV file around (channels, n) int16 samples."""
+    channels = samples.shape[0]
+    data = samples.T.astype("<i2").tobytes()
+    block = 2 * channels
+    fmt = struct.pack("<HHIIHH", WAVE_FORMAT_EXTENSIBLE if extensible else 1, channels, RATE, RATE * block, block, 16)
+    if extensible:
+        # cbSize, valid bits, channel mask, then the sub-format GUID starting with the real tag
+        fmt += struct.pack("<HHI", 22, 16, 0) + struct.pack("<H", 1) + uuid.uuid4().bytes[2:]
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + before_data
+            + b"data" + struct.pack("<I", len(data) if data_size is None else data_size) + data + after_data)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def random_chunks(data: bytes, rng: random.Random):
+    offset = 0
+    while offset < len(data):
+        size = rng.randint(1, 700)
+        yield data[offset:offset + size]
+        offset += size
+
+
+def decode(chunks, frame_ms=20):
+    frames = list(iter_wav_frames(chunks, frame_ms))
+    assert all(rate == RATE for rate, _ in frames)
+    return [frame for _, frame in frames]
+
+
+@pytest.fixture
+def samples():
+    return np.random.default_rng(0).integers(-2**15, 2**15, size=(2, 1234), dtype=np.int16)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunk_boundaries_decode_every_sample(samples, seed):
+    frames = decode(random_chunks(make_wav(samples), random.Random(seed)))
+    assert all(frame.shape == (2, RATE // 50) for frame in frames[:-1])
+    np.testing.assert_array_equal(np.concatenate(frames, axis=1), samples)
+
+
+def test_one_byte_chunks(samples):
+    wav = make_wav(samples)
+    frames = decode(wav[i:i + 1] for i in range(len(wav)))
+    np.testing.assert_array_equal(np.concatenate(frames, axis=1), samples)
+
+
+def test_unknown_size_reads_to_the_end_of_the_stream(samples):
+    frames = decode(random_chunks(make_wav(samples, data_size=UNKNOWN_SIZE), random.Random(1)))
+    np.testing.assert_array_equal(np.concatenate(frames, axis=1), samples)
+
+
+def test_wave_format_extensible(samples):
+    frames = decode([make_wav(samples, extensible=True)])
+    np.testing.assert_array_equal(np.concatenate(frames, axis=1), samples)
+
+
+def test_chunks_around_the_data_are_skipped(samples):
+    info = b"LIST" + struct.pack("<I", 5) + b"INFO!" + b"\0"  # odd size, padded to a word
+    trailer = b"id3 " + struct.pack("<I", 8) + b"\xff" * 8
+    wav = make_wav(samples, before_data=info, after_data=trailer)
+    for seed in range(5):
+        frames = decode(random_chunks(wav, random.Random(seed)))
+        np.testing.assert_array_equal(np.concatenate(frames, axis=1), samples)
+
+
+def test_partial_trailing_sample_is_dropped(samples):
+    wav = make_wav(samples, data_size=UNKNOWN_SIZE) + b"\x01"
+    frames = decode([wav])
+    np.testing.assert_array_equal(np.concatenate(frames, axis=1), samples)
+
+
+@pytest.mark.parametrize("wav", [b"RIFF\0\0\0\0WAVEfmt ", b"RIFX\0\0\0\0WAVE" + b"\0" * 40])
+def test_bad_headers_raise(wav):
+    with pytest.raises(WavStreamError):
+        decode([wav])
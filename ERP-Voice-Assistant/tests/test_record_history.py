@@ -0,0 +1,113 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from record_history import RecordHistory, parse_point
+
+T0 = datetime(2026, 1, 5, 12, 0, 0)
+
+
+def change(seq, op, data=None, before=None, item_id="c1", minutes=0, actor="tester"):
+    return {"seq": seq, "table": "customers", "id": item_id, "op": op, "data": data, "before": before,
+            "actor": actor, "utterance": None, "remote_addr": "10.0.0.1",
+            "timestamp": (T0 + timedelta(minutes=minutes)).isoformat()}
+
+
+@pytest.fixture
+def history():
+    history = RecordHistory(max_versions=50)
+    history.extend([
+        change(1, "insert", {"id": "c1", "name": "Acme", "phone": "1"}),
+        change(2, "update", {"id": "c1", "name": "Acme Corp", "phone": "1"}, {"name": "Acme"}, minutes=10),
+        change(3, "update", {"id": "c1", "name": "Acme Corp", "phone": "2"}, {"phone": "1"}, minutes=20),
+        change(4, "delete", None, {"id": "c1", "name": "Acme Corp", "phone": "2"}, minutes=30),
+    ])
+    return history
+
+
+def test_versions_list_changed_columns(history):
+    versions = history.versions("customers", "c1")
+    assert [v["op"] for v in versions] == ["insert", "update", "update", "delete"]
+    assert versions[1]["changes"] == {"name": {"from": "Acme", "to": "Acme Corp"}}
+    assert versions[3]["record"] == {"id": "c1", "name": "Acme Corp", "phone": "2"}
+    assert all(v["remote_addr"] == "10.0.0.1" for v in versions)
+
+
+@pytest.mark.parametrize("at, name", [(0, None), (1, "Acme"), (2, "Acme Corp"), (3, "Acme Corp"), (4, None)])
+def test_as_of_sequence_number(history, at, name):
+    state = history.as_of("customers", "c1", at)
+    assert (state["record"] or {}).get("name") == name
+    assert state["available"]
+
+
+def test_as_of_timestamp(history):
+    assert history.as_of("customers", "c1", (T0 + timedelta(minutes=15)).isoformat())["record"]["phone"] == "1"
+    assert history.as_of("customers", "c1", (T0 + timedelta(minutes=25)).isoformat())["record"]["phone"] == "2"
+
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    """Runs the test with the process in UTC+05:30, so local time and UTC differ."""
+    monkeypatch.setenv("TZ", "IST-05:30")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_aware_timestamps_are_converted_to_local_time(local_tz):
+    assert parse_point("2026-01-05T06:40:00Z") == "2026-01-05T12:10:00"
+    assert parse_point("2026-01-05T12:10:00+05:30") == "2026-01-05T12:10:00"
+    assert parse_point("2026-01-05T12:10:00") == "2026-01-05T12:10:00"
+    assert parse_point("7") == 7
+
+
+def test_as_of_with_an_offset_picks_the_right_version(history, local_tz):
+    # 06:45Z is 12:15 local: after the rename (12:10), before the phone change (12:20)
+    at = datetime(2026, 1, 5, 6, 45, tzinfo=timezone.utc).isoformat()
+    assert history.as_of("customers", "c1", at)["record"] == {"id": "c1", "name": "Acme Corp", "phone": "1"}
+
+
+def test_rows_older_than_the_history_start_from_their_prior_state():
+    history = RecordHistory()
+    history.apply(change(7, "update", {"id": "c9", "name": "New"}, {"name": "Old"}, item_id="c9"))
+    assert history.as_of("customers", "c9", 6)["record"] == {"id": "c9", "name": "Old"}
+    assert history.as_of("customers", "c9", 7)["record"] == {"id": "c9", "name": "New"}
+
+
+def test_compaction_keeps_the_latest_versions():
+    history = RecordHistory(max_versions=3)
+    history.apply(change(1, "insert", {"id": "c1", "n": 0}))
+    for seq in range(2, 8):
+        history.apply(change(seq, "update", {"id": "c1", "n": seq}, {"n": seq - 1}))
+    versions = history.versions("customers", "c1")
+    assert len(versions) == 3 and versions[0]["op"] == "compacted"
+    assert history.as_of("customers", "c1", 7)["record"]["n"] == 7
+    # Before the compacted snapshot the record's state is gone
+    assert history.as_of("customers", "c1", 1) == {"record": None, "version": None, "available": False}
+
+
+def test_table_as_of_replays_changed_rows(history):
+    rows, complete = history.table_as_of("customers", {"c2": {"id": "c2", "name": "Globex"}}, 2)
+    assert complete
+    assert sorted(r["name"] for r in rows) == ["Acme Corp", "Globex"]
+    rows, _ = history.table_as_of("customers", {"c2": {"id": "c2", "name": "Globex"}}, 4)
+    assert [r["id"] for r in rows] == ["c2"]
+
+
+def test_find_deleted_record(history):
+    assert history.find("customers", "name", "Acme") == "c1"
+    assert history.find("customers", "name", "Nobody") is None
+
+
+def test_erp_records_the_remote_address():
+    ERP = pytest.importorskip("ERP")
+    client = ERP.app.test_client()
+    response = client.post("/api/customers", json={"name": "Audit Test", "email": "audit@example.com"},
+                           headers={"X-ERP-Actor": "someone-else"}, environ_base={"REMOTE_ADDR": "192.0.2.7"})
+    assert response.status_code in (200, 201)
+    customer_id = response.get_json()["id"]
+    versions = client.get(f"/api/customers/{customer_id}/history").get_json()["versions"]
+    assert versions[-1]["actor"] == "someone-else"
+    assert versions[-1]["remote_addr"] == "192.0.2.7"
@@ -0,0 +1,91 @@
+import pytest
+
+from response_cache import ResponseCache, normalize_transcript
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("How many orders are pending?", "how many orders are pending"),
+    ("Um, okay, show me the invoices please.", "show me the invoices"),
+    ("Yes, please.", "yes"),
+    ("Can you delete it?", "can you delete it"),
+    ("Could you just list the products", "could you just list the products"),
+    ("What's the stock for SKU WH-PRO-001", "what s the stock for sku wh pro 001"),
+])
+def test_normalize_transcript(text, expected):
+    assert normalize_transcript(text) == expected
+
+
+def test_hit_while_versions_unchanged():
+    cache = ResponseCache()
+    cache.store("How many orders are pending?", "Two.", ["sales_orders"], {"sales_orders": 3, "customers": 1})
+    # Trivial STT variations and changes to unrelated tables still hit
+    assert cache.lookup("how many orders are pending", {"sales_orders": 3, "customers": 2}) == "Two."
+    assert cache.snapshot()["hits"] == 1
+
+
+def test_changed_table_version_invalidates():
+    cache = ResponseCache()
+    cache.store("How many orders are pending?", "Two.", ["sales_orders"], {"sales_orders": 3})
+    assert cache.lookup("How many orders are pending?", {"sales_orders": 4}) is None
+    assert cache.snapshot()["stale"] == 1
+    # The stale entry is gone, not just skipped
+    assert cache.lookup("How many orders are pending?", {"sales_orders": 3}) is None
+
+
+def test_unknown_versions_bypass_the_cache():
+    cache = ResponseCache()
+    cache.store("list products", "Three products.", ["products"], None)
+    assert cache.snapshot()["entries"] == 0
+    cache.store("list products", "Three products.", ["products"], {"products": 1})
+    assert cache.lookup("list products", None) is None
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl=0)
+    cache.store("list products", "Three products.", ["products"], {"products": 1})
+    assert cache.lookup("list products", {"products": 1}) is None
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    for question in ("list products", "list customers", "list invoices"):
+        cache.store(question, question.upper(), ["products"], {"products": 1})
+    assert cache.lookup("list products", {"products": 1}) is None
+    assert cache.lookup("list invoices", {"products": 1}) == "LIST INVOICES"
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_confirmation_only_answers_its_own_question():
+    cache = ResponseCache()
+    versions = {"customers": 1}
+    search_context = "session-a\nShould I look up Acme's orders?"
+    cache.store("Yes, please.", "Acme has two orders.", ["customers"], versions, search_context)
+    assert cache.lookup("yes", versions, search_context) == "Acme has two orders."
+    # The same words confirming something else, in this or another session, must reach the agent
+    assert cache.lookup("yes", versions, "session-a\nShall I delete Acme Corporation?") is None
+    assert cache.lookup("yes", versions, "session-b\nShould I look up Acme's orders?") is None
+    assert cache.lookup("yes", versions) is None
+
+
+def test_first_turn_questions_are_shared():
+    cache = ResponseCache()
+    cache.store("How many orders are pending?", "Two.", ["sales_orders"], {"sales_orders": 3})
+    assert cache.lookup("How many orders are pending?", {"sales_orders": 3}, "") == "Two."
+    # ...but not mid-conversation, where the question may refer back to earlier turns
+    assert cache.lookup("How many orders are pending?", {"sales_orders": 3}, "session-a\nAcme has two orders.") is None
+
+
+def test_cache_hits_are_recorded_in_the_conversation(monkeypatch):
+    pytest.importorskip("langgraph")
+    pytest.importorskip("langchain_groq")
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    import voice_stream
+
+    session_id = "cache-context-test"
+    assert voice_stream.conversation_context(session_id) == ""
+    voice_stream.record_cached_turn(session_id, "How many orders are pending?", "Two orders are pending.")
+    state = voice_stream.get_agent().get_state(voice_stream.session_config(session_id))
+    assert [(m.type, m.content) for m in state.values["messages"]] == [
+        ("human", "How many orders are pending?"), ("ai", "Two orders are pending.")]
+    assert state.next == ()
+    assert voice_stream.conversation_context(session_id) == f"{session_id}\nTwo orders are pending."
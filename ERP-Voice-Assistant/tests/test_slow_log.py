@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+ERP = pytest.importorskip("ERP")
+
+
+@pytest.fixture
+def slow(monkeypatch):
+    """The slow-log entries made by the requests in a test, with a 50 ms threshold."""
+    monkeypatch.setattr(ERP, "SLOW_REQUEST_SECONDS", 0.05)
+    monkeypatch.setattr(ERP, "CHANGE_POLL_SECONDS", 0.01)
+    entries = []
+    inc = ERP.erp_metrics.inc
+
+    def record(name, amount=1, **labels):
+        if name == "slow_total" and labels.get("kind") == "request":
+            entries.append(labels)
+        inc(name, amount, **labels)
+    monkeypatch.setattr(ERP.erp_metrics, "inc", record)
+    return entries
+
+
+def test_long_polls_and_streams_are_not_slow(slow):
+    client = ERP.app.test_client()
+    latest = ERP.data_manager.change_log.latest_seq
+    start = time.monotonic()
+    assert client.get(f"/api/changes?since={latest}&wait=0.2").get_json()["changes"] == []
+    assert time.monotonic() - start >= 0.2
+    # since=-1 starts with a reset event, so the stream's first chunk comes at once
+    response = client.get("/api/changes?since=-1", headers={"Accept": "text/event-stream"})
+    assert response.is_streamed
+    response.close()
+    assert slow == []
+
+
+def test_slow_requests_are_logged(slow, monkeypatch):
+    metrics = ERP.data_manager.get_dashboard_metrics
+    monkeypatch.setattr(ERP.data_manager, "get_dashboard_metrics", lambda: time.sleep(0.06) or metrics())
+    assert ERP.app.test_client().get("/api/dashboard").status_code == 200
+    assert len(slow) == 1
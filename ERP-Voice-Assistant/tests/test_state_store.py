@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from state_store import SQLiteStateStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def hold_write_lock(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    return conn
+
+
+def test_contended_write_waits_with_the_given_sleep(path):
+    other = None
+    pauses = []
+
+    def sleep(seconds):
+        pauses.append(seconds)
+        if len(pauses) == 5:
+            other.execute("COMMIT")
+
+    store = SQLiteStateStore(path, sleep=sleep)
+    other = hold_write_lock(path)
+    with store.transaction() as txn:
+        txn.upsert("customers", {"id": "c1", "name": "Acme"})
+    assert len(pauses) == 5
+    assert pauses == sorted(pauses)
+    assert store.load("customers")[0] == [{"id": "c1", "name": "Acme"}]
+
+
+def test_contended_write_gives_up_after_the_busy_timeout(path):
+    store = SQLiteStateStore(path, busy_timeout=0.05)
+    other = hold_write_lock(path)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            with store.transaction():
+                pass
+    finally:
+        other.execute("ROLLBACK")
+    # The failed attempt released the process lock
+    with store.transaction() as txn:
+        txn.upsert("customers", {"id": "c1", "name": "Acme"})
+
+
+def test_nested_transactions_commit_and_roll_back_together(path):
+    store = SQLiteStateStore(path)
+    with pytest.raises(RuntimeError):
+        with store.transaction() as outer:
+            outer.upsert("customers", {"id": "c1", "name": "Acme"})
+            with store.transaction() as inner:
+                assert inner is outer
+                inner.upsert("customers", {"id": "c2", "name": "Globex"})
+            raise RuntimeError
+    assert store.current_transaction() is None
+    assert store.load("customers")[0] == []
+
+
+def notes(client):
+    return next(c for c in client.get("/api/customers").get_json() if c["id"] == "cust001")["notes"]
+
+
+def test_only_api_reads_check_the_store_and_at_most_once_per_interval(path, monkeypatch):
+    ERP = pytest.importorskip("ERP")
+    writer, reader = (ERP.DataManager(ERP.socketio, SQLiteStateStore(path)) for _ in range(2))
+    monkeypatch.setattr(ERP, "data_manager", reader)
+    checks = []
+    versions = reader.store.versions
+    monkeypatch.setattr(reader.store, "versions", lambda: checks.append(1) or versions())
+    client = ERP.app.test_client()
+
+    monkeypatch.setattr(ERP, "STATE_REFRESH_SECONDS", 0)
+    for url in ("/", "/crm_vue", f"/vendor/{ERP.VENDOR_VUE}", "/metrics", "/api/changes?since=0"):
+        client.get(url)
+    assert checks == []
+    client.get("/api/data_version")
+    assert len(checks) == 1
+
+    writer.update_customer("cust001", {"notes": "changed on another worker"})
+    monkeypatch.setattr(ERP, "STATE_REFRESH_SECONDS", 60)
+    assert notes(client) == "Premium customer"
+    assert len(checks) == 1
+    monkeypatch.setattr(ERP, "STATE_REFRESH_SECONDS", 0)
+    assert notes(client) == "changed on another worker"
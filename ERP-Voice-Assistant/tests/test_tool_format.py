@@ -0,0 +1,50 @@
+import importlib
+import sys
+import types
+
+import tool_format
+from tool_format import format_results
+
+
+def test_lookup_fields_survive_projection():
+    customers = [{"id": "cust001", "name": "Acme Corporation", "company": "Acme Corp", "email": "contact@acme.com",
+                  "phone": "+1-555-0123", "address": "123 Business Ave, NYC", "status": "Active", "lead_score": 85}]
+    text = format_results("customers", customers, "acme", ["name"])
+    assert "+1-555-0123" in text and "123 Business Ave, NYC" in text
+    assert "lead_score" not in text
+
+
+def test_ranking_and_cap():
+    products = [{"id": f"prod{i}", "name": name, "sku": f"SKU{i}"} for i, name in
+                enumerate(["Chair stand", "Office Chair", "Chair"])]
+    lines = format_results("products", products, "chair", ["name"], limit=2).splitlines()
+    assert lines[0] == "3 products found, showing top 2"
+    assert lines[2].split("|")[1] == "Chair" and lines[3].split("|")[1] in ("Chair stand", "Office Chair")
+
+
+def test_offline_tiktoken_falls_back_to_estimate(monkeypatch):
+    def get_encoding(name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    try:
+        reloaded = importlib.reload(tool_format)
+        assert reloaded.count_tokens("x" * 40) == 10
+    finally:
+        monkeypatch.undo()
+        importlib.reload(tool_format)
+
+
+def test_every_call_is_counted_and_only_the_raw_comparison_is_sampled(monkeypatch):
+    monkeypatch.setattr(tool_format, "count_tokens", lambda text: len(text))
+    customers = [{"id": "cust001", "name": "Acme"}]
+    for rate, sampled in ((0, 0), (1, 1)):
+        monkeypatch.setattr(tool_format, "TOKEN_STATS_SAMPLE_RATE", rate)
+        before = dict(tool_format.token_stats)
+        text = format_results("customers", customers, "acme", ["name"])
+        after = tool_format.token_stats
+        assert after["calls"] == before["calls"] + 1
+        assert after["compact_tokens"] == before["compact_tokens"] + len(text)
+        assert after["sampled"] == before["sampled"] + sampled
+        assert after["sampled_compact_tokens"] == before["sampled_compact_tokens"] + sampled * len(text)
+        assert (after["raw_json_tokens"] > before["raw_json_tokens"]) == bool(sampled)
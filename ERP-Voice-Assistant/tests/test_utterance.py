@@ -0,0 +1,58 @@
+import asyncio
+
+import utterance
+from utterance import Utterance
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_partials_back_off_and_stop_at_the_limit(monkeypatch):
+    monkeypatch.setattr(utterance, "PARTIAL_INTERVAL", 0.01)
+    monkeypatch.setattr(utterance, "PARTIAL_BACKOFF", 2.0)
+    monkeypatch.setattr(utterance, "PARTIAL_MAX_COUNT", 3)
+    monkeypatch.setattr(utterance, "PARTIAL_MIN_BYTES", 1)
+    calls = []
+
+    async def transcribe(audio, previous, previous_stable):
+        calls.append((asyncio.get_running_loop().time(), len(audio)))
+        return f"words {len(audio)}", ""
+
+    async def speak():
+        current = Utterance()
+        current.start(FakeSocket(), transcribe)
+        for _ in range(40):
+            current.append(b"x" * 100)  # keep the recording growing, so every tick needs a partial
+            await asyncio.sleep(0.005)
+        transcript = await current.finish()
+        return current, transcript
+
+    current, transcript = asyncio.run(speak())
+    assert current.partials == len(calls) == 3
+    gaps = [b[0] - a[0] for a, b in zip(calls, calls[1:])]
+    assert gaps[1] > gaps[0] * 1.5
+    # The last partial is older than the recording, so the final transcription still has to run
+    assert transcript is None
+
+
+def test_no_partials_when_disabled(monkeypatch):
+    monkeypatch.setattr(utterance, "PARTIAL_INTERVAL", 0.01)
+    monkeypatch.setattr(utterance, "PARTIAL_MAX_COUNT", 0)
+    monkeypatch.setattr(utterance, "PARTIAL_MIN_BYTES", 1)
+
+    async def transcribe(audio, previous, previous_stable):
+        raise AssertionError("no partial should run")
+
+    async def speak():
+        current = Utterance()
+        current.start(FakeSocket(), transcribe)
+        current.append(b"x" * 1000)
+        await asyncio.sleep(0.05)
+        return await current.finish()
+
+    assert asyncio.run(speak()) is None
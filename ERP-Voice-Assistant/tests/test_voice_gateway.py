@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("voice_stream")
+import voice_gateway  # noqa: E402
+from voice_gateway import PipelineWorker, RemoteCancel, WorkerError  # noqa: E402
+
+
+class LocalWorker:
+    """Runs _serve_worker on a thread, with plain queues, and collects its results."""
+
+    def __init__(self):
+        self.requests, self.results = queue.Queue(), queue.Queue()
+        self.thread = threading.Thread(target=voice_gateway._serve_worker, args=(self.requests, self.results))
+        self.thread.start()
+        self.alive = True
+
+    def send(self, message):
+        self.requests.put(message)
+
+    def result(self):
+        return self.results.get(timeout=2)
+
+    def stop(self):
+        self.send(None)
+        self.thread.join()
+
+
+def test_cancel_reaches_the_running_call_and_partials_have_their_own_lane():
+    worker = LocalWorker()
+    cancel = RemoteCancel(worker)
+    started = threading.Event()
+
+    def turn(cancelled=None):
+        started.set()
+        return cancelled.wait(2)
+
+    worker.send(("call", 1, "turn", turn, (), cancel.token))
+    assert started.wait(2)
+    # A partial transcription isn't held up by the turn in progress
+    worker.send(("call", 2, "speculative", str.upper, ("partial",), None))
+    assert worker.result() == (2, None, "PARTIAL")
+    cancel.set()
+    assert cancel.is_set()
+    assert worker.result() == (1, None, True)
+
+    worker.send(("call", 3, "turn", int, ("x",), None))
+    call_id, error, _ = worker.result()
+    assert call_id == 3 and error.startswith("ValueError")
+    cancel.close()
+    cancel.set()  # after close, nothing more goes to the worker
+    worker.stop()
+    assert worker.results.get_nowait() is None and worker.requests.empty()
+
+
+def test_worker_process_runs_calls_concurrently_and_reports_its_exit():
+    async def main():
+        worker = PipelineWorker(multiprocessing.get_context("spawn"))
+        try:
+            pid = await asyncio.wait_for(worker.run("turn", os.getpid, ()), 60)
+            assert pid == worker.process.pid
+
+            start = time.monotonic()
+            await asyncio.gather(worker.run("turn", time.sleep, (0.5,)), worker.run("turn", time.sleep, (0.5,)),
+                                 worker.run("speculative", time.sleep, (0.5,)))
+            assert time.monotonic() - start < 1.2
+
+            with pytest.raises(WorkerError, match="ValueError"):
+                await worker.run("turn", int, ("x",))
+
+            pending = worker.run("turn", time.sleep, (30,))
+            worker.process.kill()
+            with pytest.raises(WorkerError, match="exited"):
+                await asyncio.wait_for(pending, 5)
+            assert not worker.alive
+        finally:
+            worker.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+
+import voice_session
+from voice_session import VoiceSession
+
+
+class FakeSocket:
+    def __init__(self, query_params=None):
+        self.query_params = query_params or {}
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    def send_text(self, control):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(control)})
+
+    def send_bytes(self, data):
+        self.incoming.put_nowait({"type": "websocket.receive", "bytes": data})
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect"})
+
+
+async def serve(websocket, run_turn, actions):
+    session = VoiceSession(websocket, "test-session", run_turn, None, threading.Event)
+    runner = asyncio.create_task(session.run())
+    await actions(session)
+    websocket.disconnect()
+    await runner
+    return session
+
+
+def test_unknown_pages_fall_back_to_the_dashboard():
+    websocket = FakeSocket({"page": "/crm_vue"})
+
+    async def actions(session):
+        await asyncio.sleep(0)
+        assert session.page == "/crm_vue"
+        websocket.send_text({"type": "config", "page": "<script>"})
+        await asyncio.sleep(0.01)
+        assert session.page == "/"
+        websocket.send_text({"type": "config", "page": "/hr_vue"})
+        await asyncio.sleep(0.01)
+        assert session.page == "/hr_vue"
+
+    asyncio.run(serve(websocket, None, actions))
+    assert VoiceSession(FakeSocket({"page": "/nope"}), "s", None, None, threading.Event).page == "/"
+
+
+def test_full_turn_queue_turns_utterances_away(monkeypatch):
+    monkeypatch.setattr(voice_session, "TURN_QUEUE_LIMIT", 2)
+    websocket = FakeSocket()
+    release = asyncio.Event()
+    ran = []
+
+    async def run_turn(audio, transcript, cancelled, formats, page):
+        ran.append(audio)
+        await release.wait()
+
+    async def actions(session):
+        for i in range(5):
+            websocket.send_bytes(b"turn%d" % i)
+        await asyncio.sleep(0.05)
+        # One turn running, two waiting, two turned away
+        assert session.processing and session.queued == 2
+        assert session.snapshot()["queued"] == 2
+        websocket.send_text({"type": "cancel"})
+        await asyncio.sleep(0.05)
+        assert session.queued == 0
+        release.set()
+        websocket.send_bytes(b"after")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(serve(websocket, run_turn, actions))
+    assert ran == [b"turn0", b"after"]
+    assert [m["type"] for m in websocket.sent].count("busy") == 2
+    assert {"type": "cancelled"} in websocket.sent
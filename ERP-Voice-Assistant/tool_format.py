@@ -0,0 +1,119 @@
+import json
+import os
+import random
+import threading
+from typing import Dict, List, Sequence
+
+from loguru import logger
+
+from metrics import voice_metrics
+
+# --- Formatter Configuration ---
+MAX_TOOL_RESULTS = int(os.environ.get("MAX_TOOL_RESULTS", "10"))
+# Share of search results also measured against their raw JSON token count for /tool_stats (0 disables);
+# the compact output itself is counted on every call
+TOKEN_STATS_SAMPLE_RATE = float(os.environ.get("TOOL_TOKEN_STATS_SAMPLE", "0.05"))
+
+# Fields the agent actually needs per entity: the id first, then a display name and a few key fields.
+ENTITY_FIELDS = {
+    "customers": ["id", "name", "company", "email", "phone", "address", "status"],
+    "products": ["id", "name", "sku", "category", "price", "stock_quantity", "description"],
+    "employees": ["id", "employee_id", "first_name", "last_name", "position", "department"],
+    "orders": ["id", "customer_id", "order_date", "status", "total_amount"],
+    "invoices": ["id", "invoice_number", "customer_id", "total_amount", "paid_amount", "status"],
+}
+
+try:
+    import tiktoken
+    # Downloads the BPE file on first use, which fails on an offline host
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+except Exception as e:
+    if not isinstance(e, ImportError):
+        logger.warning(f"⚠️ tiktoken encoding unavailable, estimating token counts: {e}")
+
+    def count_tokens(text: str) -> int:
+        # Rough estimate for Llama-style tokenizers when tiktoken is unavailable
+        return max(1, len(text) // 4)
+
+_stats_lock = threading.Lock()
+# compact_tokens covers every call; sampled_compact_tokens vs. raw_json_tokens compares the sampled calls only
+token_stats = {"calls": 0, "compact_tokens": 0, "sampled": 0, "sampled_compact_tokens": 0, "raw_json_tokens": 0}
+
+voice_metrics.describe("tool_result_tokens", "Tokens of each compact search tool result, by entity",
+                       buckets=(25, 50, 100, 200, 400, 800, 1600, 3200))
+
+
+def _match_score(record: Dict, query: str, search_fields: Sequence[str]) -> int:
+    """Exact field match beats prefix match beats substring match."""
+    best = 0
+    for field in search_fields:
+        value = str(record.get(field) or "").lower()
+        if value == query:
+            return 3
+        if value.startswith(query):
+            best = max(best, 2)
+        elif query in value:
+            best = max(best, 1)
+    return best
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def format_results(entity: str, matches: List[Dict], query: str, search_fields: Sequence[str],
+                   limit: int = MAX_TOOL_RESULTS) -> str:
+    """
+    Projects, ranks and caps search matches into a compact pipe-separated table.
+
+    Every call's output tokens are counted; for a sample of calls (TOOL_TOKEN_STATS_SAMPLE) they are
+    also compared with what the raw JSON dump would have cost, so the savings can be tracked.
+    """
+    fields = ENTITY_FIELDS[entity]
+    query = query.lower()
+    ranked = sorted(matches, key=lambda r: _match_score(r, query, search_fields), reverse=True)
+    shown = ranked[:limit]
+
+    lines = [f"{len(matches)} {entity} found" + (f", showing top {len(shown)}" if len(shown) < len(matches) else "")]
+    lines.append("|".join(fields))
+    lines.extend("|".join(_cell(r.get(f)) for f in fields) for r in shown)
+    text = "\n".join(lines)
+
+    compact_tokens = count_tokens(text)
+    voice_metrics.observe("tool_result_tokens", compact_tokens, entity=entity)
+    with _stats_lock:
+        token_stats["calls"] += 1
+        token_stats["compact_tokens"] += compact_tokens
+    if random.random() < TOKEN_STATS_SAMPLE_RATE:
+        raw_tokens = count_tokens(json.dumps(matches, default=str))
+        with _stats_lock:
+            token_stats["sampled"] += 1
+            token_stats["sampled_compact_tokens"] += compact_tokens
+            token_stats["raw_json_tokens"] += raw_tokens
+        logger.info(f"🧾 {entity} tool result: {compact_tokens} tokens (raw JSON would be {raw_tokens})")
+    else:
+        logger.info(f"🧾 {entity} tool result: {compact_tokens} tokens")
+    return text
+
+
+def format_aggregate(result: Dict) -> str:
+    """Renders an /api/aggregate result as one short line per value for the agent."""
+    subject = f"{result['agg']} of {result['field'] or 'records'} in {result['entity']}"
+    value = result["result"]
+    if not isinstance(value, list):
+        return f"{subject}: {_cell(value)} ({result['matched_rows']} records)"
+    lines = [subject + (f" by {result['group_by']}" if result["group_by"] else "")]
+    for row in value:
+        if "group" in row:
+            label = f" ({row['label']})" if row.get("label") else ""
+            lines.append(f"{row['group']}{label}: {_cell(row['value'])}")
+        else:
+            lines.append(f"{row['id']} ({row['label']}): {_cell(row[result['field']])}")
+    return "\n".join(lines)
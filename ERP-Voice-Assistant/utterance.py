@@ -0,0 +1,106 @@
+# utterance.py
+#
+# Streamed utterances: the browser sends {"type": "audio_start"}, the recording in chunks as it
+# is captured, then {"type": "audio_end"}. While the user is still speaking, the audio received
+# so far is transcribed and pushed to the client as a partial transcript; the words two partials
+# agree on (the stable prefix) start speculative read-only work in the pipeline. Shared by
+# voice_stream and the gateway, which differ only in where `transcribe_partial` runs.
+#
+# Every partial re-uploads the whole recording so far, so with a fixed interval the number of
+# STT requests would grow with utterance length and the billed audio with its square. Instead
+# the interval grows by PARTIAL_BACKOFF after each partial and there are at most
+# PARTIAL_MAX_COUNT of them. An utterance then costs at most that many extra STT requests, and
+# the audio uploaded for its partials is about PARTIAL_BACKOFF / (PARTIAL_BACKOFF - 1) times its
+# own length (3x at the default 1.5).
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional, Tuple
+
+from loguru import logger
+
+PARTIAL_INTERVAL = float(os.environ.get("VOICE_PARTIAL_INTERVAL", "0.8"))
+# Each wait is this much longer than the last (0.8 s, 1.2 s, 1.8 s, ...)
+PARTIAL_BACKOFF = max(1.0, float(os.environ.get("VOICE_PARTIAL_BACKOFF", "1.5")))
+# Partial transcriptions per utterance; the final transcription is not counted
+PARTIAL_MAX_COUNT = int(os.environ.get("VOICE_PARTIAL_MAX_COUNT", "6"))
+# Don't transcribe less than this (a WebM header and a fraction of a second of speech)
+PARTIAL_MIN_BYTES = int(os.environ.get("VOICE_PARTIAL_MIN_BYTES", "4000"))
+# Past this size only the final transcription runs (~40 s of 24 kbit/s Opus)
+PARTIAL_MAX_BYTES = int(os.environ.get("VOICE_PARTIAL_MAX_BYTES", "120000"))
+
+# (audio so far, previous partial, previous stable prefix) -> (partial, stable prefix)
+PartialTranscriber = Callable[[bytes, str, str], Awaitable[Tuple[str, str]]]
+
+
+class Utterance:
+    """An utterance being received in chunks, with its latest partial transcript."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.transcript = ""
+        self.transcript_size = 0
+        self.stable = ""
+        self.in_flight_size = 0
+        self.partials = 0
+        self.ended = False
+        self.task: Optional[asyncio.Task] = None
+
+    def append(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+
+    def audio(self) -> bytes:
+        if len(self.chunks) > 1:
+            self.chunks = [b"".join(self.chunks)]
+        return self.chunks[0] if self.chunks else b""
+
+    def needs_partial(self) -> bool:
+        return PARTIAL_MIN_BYTES <= self.size <= PARTIAL_MAX_BYTES and self.size != self.transcript_size
+
+    def final_transcript(self) -> Optional[str]:
+        """The latest partial, if it already covers the whole utterance (so STT needn't run again)."""
+        return self.transcript if self.transcript and self.transcript_size == self.size else None
+
+    def start(self, websocket, transcribe_partial: PartialTranscriber):
+        self.task = asyncio.create_task(self._stream_partials(websocket, transcribe_partial))
+
+    async def _stream_partials(self, websocket, transcribe_partial: PartialTranscriber):
+        interval = PARTIAL_INTERVAL
+        while not self.ended and self.partials < PARTIAL_MAX_COUNT:
+            await asyncio.sleep(interval)
+            if self.ended or not self.needs_partial():
+                continue
+            self.partials += 1
+            interval *= PARTIAL_BACKOFF
+            self.in_flight_size = self.size
+            try:
+                text, stable = await transcribe_partial(self.audio(), self.transcript, self.stable)
+            except Exception as e:
+                logger.warning(f"⚠️ Partial transcription failed, waiting for the final one: {e}")
+                return
+            finally:
+                size, self.in_flight_size = self.in_flight_size, 0
+            self.transcript, self.transcript_size, self.stable = text, size, stable
+            if text and not self.ended:
+                await websocket.send_json({"type": "partial_transcript", "data": text, "stable": stable})
+
+    async def finish(self) -> Optional[str]:
+        """Stops partial transcription and returns the final transcript if a partial already has it."""
+        self.ended = True
+        if self.task is not None and not self.task.done():
+            if self.in_flight_size and self.in_flight_size == self.size:
+                # The partial in flight covers all the audio: its result is the final transcript
+                try:
+                    await self.task
+                except Exception:
+                    pass
+            else:
+                self.task.cancel()
+        return self.final_transcript()
+
+    def abandon(self):
+        self.ended = True
+        if self.task is not None:
+            self.task.cancel()
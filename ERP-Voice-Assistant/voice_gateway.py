@@ -0,0 +1,417 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from loguru import logger
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import JSONResponse
+from starlette.websockets import WebSocketState
+from fastapi.middleware.cors import CORSMiddleware
+import uvicorn
+
+from voice_session import VoiceSession, sessions
+
+# Front WebSocket gateway for scaling the voice agent out across processes.
+# It holds no Groq client or agent itself: each session is pinned to one pipeline worker
+# process (which imports voice_stream and runs STT, the agent and TTS), and conversation
+# state lives in the shared checkpointer (AGENT_CHECKPOINT_DB) so any worker can resume it.
+# A worker runs its calls on voice_stream's own thread pools, the same way voice_stream's
+# server does: turns on its executor, partial transcriptions on the speculative executor.
+
+# --- Logger Setup ---
+logger.remove()
+logger.add(
+    lambda msg: print(msg),
+    colorize=True,
+    format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <level>{message}</level>",
+)
+
+# --- Gateway Configuration ---
+FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5000")
+NUM_WORKERS = int(os.environ.get("VOICE_WORKERS", str(os.cpu_count() or 2)))
+MAX_SESSIONS_PER_WORKER = int(os.environ.get("VOICE_WORKER_MAX_SESSIONS", "2"))
+ADMISSION_QUEUE_LIMIT = int(os.environ.get("VOICE_ADMISSION_QUEUE", "8"))
+ADMISSION_TIMEOUT = float(os.environ.get("VOICE_ADMISSION_TIMEOUT", "10"))
+AFFINITY_MEMORY = 10000
+
+app = FastAPI()
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[FRONTEND_URL],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class WorkerError(RuntimeError):
+    """A call failed inside a pipeline worker (carries the worker-side exception's type and message)."""
+
+
+def _serve_worker(requests, results):
+    """
+    Pipeline worker process main loop. Each ("call", id, lane, fn, args, cancel token) runs on the
+    lane's thread pool and its outcome goes back as (id, error or None, value). A cancel token
+    names a turn's cancel event, which ("cancel", token) sets and ("forget", token) drops.
+    """
+    from voice_stream import executor, speculative_executor
+    lanes = {"turn": executor, "speculative": speculative_executor}
+    cancel_events: Dict[int, threading.Event] = {}
+
+    def run(call_id: int, fn, args: tuple, cancelled: Optional[threading.Event]):
+        try:
+            value = fn(*args) if cancelled is None else fn(*args, cancelled=cancelled)
+        except Exception as e:
+            results.put((call_id, f"{type(e).__name__}: {e}", None))
+        else:
+            results.put((call_id, None, value))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == "call":
+            _, call_id, lane, fn, args, token = message
+            cancelled = cancel_events.setdefault(token, threading.Event()) if token is not None else None
+            lanes[lane].submit(run, call_id, fn, args, cancelled)
+        elif message[0] == "cancel":
+            cancel_events.setdefault(message[1], threading.Event()).set()
+        elif message[0] == "forget":
+            cancel_events.pop(message[1], None)
+    results.put(None)
+
+
+class RemoteCancel:
+    """
+    A turn's cancel event on the gateway side. is_set() is answered locally, so the event loop never
+    waits on another process; set() also tells the worker, where the pipeline checks its own copy.
+    """
+    _tokens = itertools.count()
+
+    def __init__(self, worker: "PipelineWorker"):
+        self.worker = worker
+        self.token = next(self._tokens)
+        self._set = False
+        self._closed = False
+
+    def set(self):
+        if not self._set:
+            self._set = True
+            if not self._closed:
+                self.worker.send(("cancel", self.token))
+
+    def is_set(self) -> bool:
+        return self._set
+
+    def close(self):
+        """Drops the worker's copy once none of the turn's calls is running."""
+        if not self._closed:
+            self._closed = True
+            self.worker.send(("forget", self.token))
+
+
+class PipelineWorker:
+    """
+    One long-lived pipeline process, created on the gateway's event loop. Calls go over a queue and
+    run concurrently inside the worker (see _serve_worker), so one session's TTS or partial
+    transcription doesn't hold up another session's turn. A reader thread resolves the results
+    on the loop and fails every pending call if the process dies.
+    """
+
+    def __init__(self, context):
+        self.loop = asyncio.get_running_loop()
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=_serve_worker, args=(self.requests, self.results), daemon=True)
+        self.process.start()
+        self.alive = True
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._calls = itertools.count()
+        threading.Thread(target=self._read_results, daemon=True).start()
+
+    def send(self, message: tuple):
+        # Queue.put only hands the message to the queue's feeder thread, which pickles and writes it
+        self.requests.put(message)
+
+    def run(self, lane: str, fn, args: tuple, cancelled: Optional[RemoteCancel] = None) -> asyncio.Future:
+        future = self.loop.create_future()
+        if not self.alive:
+            future.set_exception(WorkerError("pipeline worker exited"))
+            return future
+        call_id = next(self._calls)
+        self._pending[call_id] = future
+        self.send(("call", call_id, lane, fn, args, cancelled.token if cancelled is not None else None))
+        return future
+
+    def _read_results(self):
+        while True:
+            try:
+                message = self.results.get(timeout=1)
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+                message = None
+            callback, args = (self._exited, ()) if message is None else (self._resolve, message)
+            try:
+                self.loop.call_soon_threadsafe(callback, *args)
+            except RuntimeError:
+                return  # the event loop has closed
+            if message is None:
+                return
+
+    def _resolve(self, call_id: int, error: Optional[str], value):
+        future = self._pending.pop(call_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(WorkerError(error))
+        else:
+            future.set_result(value)
+
+    def _exited(self):
+        self.alive = False
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(WorkerError("pipeline worker exited"))
+        self._pending.clear()
+
+    def shutdown(self):
+        self.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class WorkerPool:
+    """
+    Fixed pool of pipeline worker processes with session affinity and admission control.
+
+    A session keeps the worker it was first assigned (and gets it back on reconnect while that
+    worker has room); new sessions go to the least-loaded worker. When every worker is at
+    MAX_SESSIONS_PER_WORKER, up to ADMISSION_QUEUE_LIMIT sessions wait ADMISSION_TIMEOUT seconds
+    for a slot and everyone else is turned away, instead of slowing down all active sessions.
+    Workers whose warm-up failed, or whose process died, are marked broken and never get sessions.
+    """
+
+    def __init__(self, num_workers: int, max_sessions: int):
+        context = multiprocessing.get_context("spawn")
+        self.workers = [PipelineWorker(context) for _ in range(num_workers)]
+        self.max_sessions = max_sessions
+        self.active = [0] * num_workers
+        self.broken = set()
+        self.waiting = 0
+        self.rejected = 0
+        self._affinity: "OrderedDict[str, int]" = OrderedDict()
+        self._changed = asyncio.Condition()
+
+    def _usable(self, worker: int) -> bool:
+        return worker not in self.broken and self.workers[worker].alive
+
+    def _pick(self, session_id: str) -> Optional[int]:
+        preferred = self._affinity.get(session_id)
+        if preferred is not None and self._usable(preferred) and self.active[preferred] < self.max_sessions:
+            return preferred
+        healthy = [i for i in range(len(self.workers)) if self._usable(i)]
+        least = min(healthy, key=lambda i: self.active[i], default=None)
+        return least if least is not None and self.active[least] < self.max_sessions else None
+
+    async def acquire(self, session_id: str) -> Optional[int]:
+        async with self._changed:
+            if self._pick(session_id) is None:
+                if self.waiting >= ADMISSION_QUEUE_LIMIT:
+                    self.rejected += 1
+                    return None
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self._pick(session_id) is not None), ADMISSION_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    return None
+                finally:
+                    self.waiting -= 1
+            worker = self._pick(session_id)
+            self.active[worker] += 1
+            self._affinity[session_id] = worker
+            self._affinity.move_to_end(session_id)
+            while len(self._affinity) > AFFINITY_MEMORY:
+                self._affinity.popitem(last=False)
+            return worker
+
+    async def release(self, worker: int):
+        async with self._changed:
+            self.active[worker] -= 1
+            self._changed.notify_all()
+
+    def run(self, worker: int, fn, *args, lane: str = "turn", cancelled: Optional[RemoteCancel] = None) -> asyncio.Future:
+        return self.workers[worker].run(lane, fn, args, cancelled)
+
+    def cancel_event(self, worker: int) -> RemoteCancel:
+        return RemoteCancel(self.workers[worker])
+
+    def snapshot(self) -> dict:
+        broken = [i for i in range(len(self.workers)) if not self._usable(i)]
+        return {"workers": len(self.workers), "max_sessions_per_worker": self.max_sessions,
+                "active": list(self.active), "broken": broken, "waiting": self.waiting, "rejected": self.rejected}
+
+
+# Pipeline entry points executed inside the worker processes
+def _worker_warm_up() -> dict:
+    from voice_stream import startup_stats, warm_up
+    warm_up()
+    return startup_stats
+
+# (a cancelled turn returns None; _serve_worker passes the turn's cancel event as `cancelled`)
+def _worker_process_audio(audio_data: bytes, session_id: str, audio_format: str, transcript: Optional[str],
+                          page: str, cancelled=None) -> Optional[tuple]:
+    from voice_stream import TurnCancelled, process_audio
+    try:
+        return process_audio(audio_data, session_id, cancelled, audio_format, transcript, page)
+    except TurnCancelled:
+        return None
+
+def _worker_partial_transcript(audio_data: bytes, audio_format: str, session_id: str, previous: str, previous_stable: str) -> tuple:
+    # Runs in the session's own worker, so what it prefetches is there when the turn starts
+    from voice_stream import partial_transcript
+    return partial_transcript(audio_data, audio_format, session_id, previous, previous_stable)
+
+def _worker_synthesize(text: str, audio_format: str, session_id: str, cancelled=None) -> Optional[bytes]:
+    from voice_stream import TurnCancelled, synthesize_speech
+    try:
+        return synthesize_speech(text, cancelled, audio_format, session_id)
+    except TurnCancelled:
+        return None
+
+def _worker_admission() -> dict:
+    from admission import schedulers
+    return {provider: scheduler.snapshot() for provider, scheduler in schedulers.items()}
+
+
+pool: Optional[WorkerPool] = None
+workers_ready = asyncio.Event()
+worker_startup = []
+
+async def warm_up_workers():
+    """Imports and warms the pipeline in every worker process in parallel, before sessions are admitted."""
+    results = await asyncio.gather(*(pool.run(i, _worker_warm_up) for i in range(len(pool.workers))),
+                                   return_exceptions=True)
+    worker_startup.extend({"error": str(r)} if isinstance(r, Exception) else r for r in results)
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            pool.broken.add(i)
+            logger.error(f"Pipeline worker {i} failed to warm up and won't take sessions: {result}")
+    workers_ready.set()
+    logger.info(f"🔥 {len(results) - len(pool.broken)} of {len(results)} pipeline workers warmed up")
+
+@app.on_event("startup")
+async def start_pool():
+    global pool
+    # The workers inherit this and split the VOICE_<PROVIDER>_RPM account quotas between them
+    os.environ.setdefault("VOICE_ADMISSION_PROCESSES", str(NUM_WORKERS))
+    pool = WorkerPool(NUM_WORKERS, MAX_SESSIONS_PER_WORKER)
+    app.state.warm_up = asyncio.create_task(warm_up_workers())
+    logger.info(f"🧵 Started {NUM_WORKERS} pipeline workers ({MAX_SESSIONS_PER_WORKER} sessions each)")
+
+@app.on_event("shutdown")
+async def stop_pool():
+    for worker in pool.workers:
+        worker.shutdown()
+
+@app.websocket("/")
+async def gateway_endpoint(websocket: WebSocket):
+    origin = websocket.headers.get("origin")
+    if not (origin and (FRONTEND_URL in origin or "localhost" in origin or "127.0.0.1" in origin)):
+        logger.warning(f"Rejecting connection from unauthorized origin: {origin}")
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    session_id = websocket.query_params.get("session") or str(uuid.uuid4())
+    await workers_ready.wait()
+    worker = await pool.acquire(session_id)
+    if worker is None:
+        logger.warning(f"🚫 All workers saturated, turning away session {session_id}")
+        await websocket.send_json({"type": "busy", "data": "The assistant is busy right now, please try again in a moment."})
+        await websocket.close(code=1013)  # Try Again Later
+        return
+
+    async def turn(audio: bytes, transcript: Optional[str], cancelled, formats: dict, page: str):
+        await run_turn(websocket, worker, audio, session_id, cancelled, formats, page, transcript)
+
+    async def transcribe_partial(audio: bytes, audio_format: str, previous: str, previous_stable: str) -> tuple:
+        return await pool.run(worker, _worker_partial_transcript, audio, audio_format, session_id, previous,
+                              previous_stable, lane="speculative")
+
+    session = VoiceSession(websocket, session_id, turn, transcribe_partial, lambda: pool.cancel_event(worker))
+    logger.info(f"WebSocket session {session_id} assigned to worker {worker} "
+                f"(audio in {session.formats['input']} / out {session.formats['output']})")
+    try:
+        await session.run()
+    except Exception as e:
+        logger.error(f"WebSocket connection error: {e}")
+    finally:
+        await pool.release(worker)
+        if websocket.client_state != WebSocketState.DISCONNECTED:
+            await websocket.close()
+
+async def run_turn(websocket: WebSocket, worker: int, audio: bytes, session_id: str, cancelled, formats: dict,
+                   page: str, transcript: Optional[str] = None):
+    try:
+        result = await pool.run(worker, _worker_process_audio, audio, session_id, formats["input"], transcript, page,
+                                cancelled=cancelled)
+        if result is None or cancelled.is_set():
+            return
+        response_text, transcript = result
+        if transcript:
+            await websocket.send_json({"type": "transcription", "data": transcript})
+        if response_text:
+            await websocket.send_json({"type": "agent_response", "data": response_text})
+
+        audio_out = await pool.run(worker, _worker_synthesize, response_text, formats["output"], session_id,
+                                   cancelled=cancelled)
+        if cancelled.is_set():
+            return
+        if audio_out is None:
+            # TTS was saturated and there is no pre-synthesized busy phrase: the answer is text-only
+            await websocket.send_json({"type": "no_audio"})
+            return
+        await websocket.send_bytes(audio_out)
+        logger.info(f"✅ Audio response sent (session {session_id})")
+    except Exception as e:
+        logger.error(f"Turn failed (session {session_id}): {e}")
+    finally:
+        cancelled.close()
+
+@app.get("/health")
+async def health_check():
+    return {"status": "ok", "pool": pool.snapshot() if pool else None}
+
+@app.get("/admission")
+async def admission_stats():
+    """Provider admission per worker; each worker process enforces its own limits."""
+    return await asyncio.gather(*(pool.run(i, _worker_admission) for i in range(len(pool.workers))))
+
+@app.get("/sessions")
+async def session_stats():
+    """Open sessions with their worker's turn queues, for spotting a backed-up session."""
+    return {session_id: session.snapshot() for session_id, session in sessions.items()}
+
+@app.get("/ready")
+async def readiness_check():
+    failed = [w for w in worker_startup if w.get("error") or w.get("warmup_error")]
+    if not workers_ready.is_set() or failed:
+        return JSONResponse({"status": "failed" if failed else "warming_up", "workers": worker_startup}, status_code=503)
+    return {"status": "ready", "workers": worker_startup}
+
+
+# --- Main Block for Local Development ONLY ---
+if __name__ == "__main__":
+    print(f"Starting voice gateway with {NUM_WORKERS} workers. Accepting connections from {FRONTEND_URL}")
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("VOICE_GATEWAY_PORT", "7861")))
@@ -0,0 +1,214 @@
+# voice_session.py
+#
+# One voice WebSocket session, shared by voice_stream and the gateway. A reader handles every
+# incoming message as soon as it arrives: control messages (cancel, config, ping) are answered
+# immediately and utterances go into a bounded per-session turn queue. A processor task runs the
+# queued turns one at a time, in order. The two servers differ only in the callables they pass:
+# where a turn and a partial transcription run, and what kind of cancel event they need.
+
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from loguru import logger
+
+from audio_formats import negotiate_formats
+from metrics import voice_metrics
+from utterance import Utterance
+
+# Utterances a session may have waiting behind the turn in progress
+TURN_QUEUE_LIMIT = int(os.environ.get("VOICE_TURN_QUEUE", "3"))
+# The ERP pages a client can say it is showing (?page=/crm_vue), by the app whose tools the agent gets there
+PAGE_APPS = {"/crm_vue": "crm", "/hr_vue": "hr", "/inventory_vue": "inventory", "/orders_vue": "orders",
+             "/finance_vue": "finance"}
+
+voice_metrics.describe("turn_queue_depth", "Turns waiting behind the one in progress, summed over sessions")
+voice_metrics.describe("turn_queue_wait_seconds", "Time a turn spent queued before processing started")
+voice_metrics.describe("turn_queue_rejected_total", "Utterances turned away because the session's turn queue was full")
+voice_metrics.describe("sessions_open", "Open voice WebSocket sessions")
+
+# (audio, transcript or None, cancel event, formats, page) -> None
+TurnRunner = Callable[[bytes, Optional[str], object, dict, str], Awaitable[None]]
+# (audio so far, input format, previous partial, previous stable prefix) -> (partial, stable prefix)
+PartialRunner = Callable[[bytes, str, str, str], Awaitable[tuple]]
+
+# Live sessions in this process, for /sessions and the queue depth gauge
+sessions: Dict[str, "VoiceSession"] = {}
+
+
+def _update_gauges():
+    voice_metrics.set("sessions_open", len(sessions))
+    voice_metrics.set("turn_queue_depth", sum(s.queued for s in sessions.values()))
+
+
+def ui_page(page: Optional[str]) -> str:
+    """The ERP page the client is showing; anything unknown counts as the dashboard, which gets every tool."""
+    return page if page in PAGE_APPS else "/"
+
+
+class QueuedTurn:
+    __slots__ = ("audio", "formats", "page", "enqueued")
+
+    def __init__(self, audio: Union[bytes, Utterance], formats: dict, page: str):
+        self.audio = audio
+        self.formats = formats
+        self.page = page
+        self.enqueued = time.perf_counter()
+
+
+# Queue marker: everything before it belongs to a cancelled turn, so the client's ack goes out after it
+_CANCEL_ACK = object()
+
+
+class VoiceSession:
+    def __init__(self, websocket, session_id: str, run_turn: TurnRunner, transcribe_partial: PartialRunner,
+                 new_cancel_event: Callable[[], object]):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.run_turn = run_turn
+        self.transcribe_partial = transcribe_partial
+        self.new_cancel_event = new_cancel_event
+        self.formats = negotiate_formats(websocket.query_params)
+        self.page = ui_page(websocket.query_params.get("page"))
+        self.turns: asyncio.Queue = asyncio.Queue()
+        # QueuedTurns in `turns` (cancel markers aren't counted)
+        self.queued = 0
+        self.utterance: Optional[Utterance] = None
+        self.cancelled = None
+        self.processing = False
+        self.turns_done = 0
+
+    def snapshot(self) -> dict:
+        return {"queued": self.queued, "processing": self.processing, "streaming": self.utterance is not None,
+                "turns_done": self.turns_done, "page": self.page, **self.formats}
+
+    async def run(self):
+        """Serves the session until the client disconnects."""
+        sessions[self.session_id] = self
+        _update_gauges()
+        await self.send_config()
+        processor = asyncio.create_task(self._process_turns())
+        try:
+            await self._read_messages()
+        finally:
+            self._cancel_current()
+            self._drop_queued()
+            processor.cancel()
+            if self.utterance is not None:
+                self.utterance.abandon()
+            if sessions.get(self.session_id) is self:
+                del sessions[self.session_id]
+            _update_gauges()
+
+    async def send_config(self):
+        await self.websocket.send_json({"type": "config", **self.formats, "page": self.page})
+
+    # --- Reader ---
+    async def _read_messages(self):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                logger.info(f"Client disconnected (session {self.session_id})")
+                return
+            if message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    continue
+                await self._handle_control(control)
+                continue
+            audio = message.get("bytes")
+            if not audio:
+                continue
+            if self.utterance is not None:
+                self.utterance.append(audio)
+            else:
+                logger.info(f"📥 Received audio data: {len(audio)} bytes (session {self.session_id})")
+                await self._enqueue(audio)
+
+    async def _handle_control(self, control: dict):
+        kind = control.get("type")
+        if kind == "cancel":
+            # Barge-in: stop the turn in flight and forget the ones waiting behind it
+            self._cancel_current()
+            self._drop_queued()
+            self.turns.put_nowait(_CANCEL_ACK)
+        elif kind in ("ping", "heartbeat"):
+            await self.websocket.send_json({"type": "pong", "queued": self.queued, "processing": self.processing})
+        elif kind == "config":
+            requested = {"in": control.get("input", self.formats["input"]), "out": control.get("output", self.formats["output"])}
+            self.formats = negotiate_formats(requested)
+            if control.get("page"):
+                self.page = ui_page(control["page"])
+            await self.send_config()
+        elif kind == "audio_start":
+            if self.utterance is not None:
+                self.utterance.abandon()
+            self.utterance = Utterance()
+            formats = self.formats
+            self.utterance.start(self.websocket, lambda audio, previous, stable: self.transcribe_partial(
+                audio, formats["input"], previous, stable))
+        elif kind == "audio_end" and self.utterance is not None:
+            streamed, self.utterance = self.utterance, None
+            logger.info(f"📥 Received streamed audio: {streamed.size} bytes (session {self.session_id})")
+            if streamed.size:
+                # Partials keep running while it waits, so the final transcript may be ready by its turn
+                await self._enqueue(streamed)
+            else:
+                streamed.abandon()
+
+    async def _enqueue(self, audio: Union[bytes, Utterance]):
+        waiting = self.queued
+        if not self.processing and waiting:
+            waiting -= 1  # the head of the queue is about to start, it isn't waiting behind anything
+        if waiting >= TURN_QUEUE_LIMIT:
+            voice_metrics.inc("turn_queue_rejected_total")
+            logger.warning(f"🚫 Turn queue full, dropping utterance (session {self.session_id})")
+            if isinstance(audio, Utterance):
+                audio.abandon()
+            await self.websocket.send_json({"type": "busy", "data": "I'm still working on your earlier requests, please wait a moment."})
+            return
+        self.turns.put_nowait(QueuedTurn(audio, self.formats, self.page))
+        self.queued += 1
+        _update_gauges()
+
+    def _cancel_current(self):
+        if self.cancelled is not None:
+            self.cancelled.set()
+
+    def _drop_queued(self):
+        while not self.turns.empty():
+            item = self.turns.get_nowait()
+            if isinstance(item, QueuedTurn):
+                self.queued -= 1
+                if isinstance(item.audio, Utterance):
+                    item.audio.abandon()
+        _update_gauges()
+
+    # --- Processor ---
+    async def _process_turns(self):
+        while True:
+            item = await self.turns.get()
+            if item is _CANCEL_ACK:
+                # Everything the client receives before this ack belongs to the cancelled turn
+                await self.websocket.send_json({"type": "cancelled"})
+                continue
+            self.queued -= 1
+            _update_gauges()
+            voice_metrics.observe("turn_queue_wait_seconds", time.perf_counter() - item.enqueued)
+            self.cancelled = self.new_cancel_event()
+            self.processing = True
+            try:
+                if isinstance(item.audio, Utterance):
+                    transcript = await item.audio.finish()
+                    audio = item.audio.audio()
+                else:
+                    transcript, audio = None, item.audio
+                await self.run_turn(audio, transcript, self.cancelled, item.formats, item.page)
+                self.turns_done += 1
+            except Exception as e:
+                logger.error(f"Turn failed (session {self.session_id}): {e}")
+            finally:
+                self.processing = False
@@ -1,16 +1,29 @@
+import time
+_import_start = time.perf_counter()
+
 import asyncio
-import io
+import functools
 import os
+import threading
+import uuid
 import concurrent.futures
+from typing import Optional
 
-import numpy as np
-from groq import Groq
+import requests
 from loguru import logger
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from pydub import AudioSegment
-from agent_setup import agent, agent_config
+from agent_setup import get_agent, get_groq_http_client, get_model, erp_http, session_config, current_turn, AgentContext, BASE_URL, READ_ONLY_TOOL_TABLES
+from response_cache import ResponseCache, fetch_data_versions
+from tool_format import token_stats
+from metrics import current_trace, voice_metrics
+from audio_formats import OUTPUT_FORMATS, prepare_upload, tts_options
+from prefetch import list_prefetch, stable_prefix, tables_mentioned
+from voice_session import VoiceSession, sessions
+from admission import Overloaded, provider_slot, schedulers
+from model_router import WRITE_TOOLS_PREFIXES
 
 # --- Logger Setup ---
 logger.remove()
@@ -21,11 +34,20 @@ logger.add(
 )
 
 # --- Client and App Initialization (Moved to Global Scope) ---
-groq_client = Groq()
+# groq and the agent graph are loaded lazily; warm_up() loads them before the first turn
+@functools.lru_cache(maxsize=None)
+def get_groq_client():
+    from groq import Groq
+    return Groq(http_client=get_groq_http_client())
+
 app = FastAPI()
 
 # --- Middleware Configuration (Moved to Global Scope) ---
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5000")
+# Send every client a per-turn timing trace (clients can also opt in with ?trace=1)
+TRACE_ALL_TURNS = os.environ.get("VOICE_TRACE", "") == "1"
+# Also run one tiny LLM completion during warm-up (costs one request per process start)
+WARMUP_INFERENCE = os.environ.get("VOICE_WARMUP_INFERENCE", "") == "1"
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[FRONTEND_URL],
@@ -36,31 +58,179 @@ app.add_middleware(
 
 # --- Thread Pool and Processing Function (Global Scope) ---
 executor = concurrent.futures.ThreadPoolExecutor()
+# Partial transcriptions and speculative prefetches get their own few threads, so under load they
+# never take an executor thread a turn is waiting for
+SPECULATIVE_THREADS = int(os.environ.get("VOICE_SPECULATIVE_THREADS", "2"))
+speculative_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SPECULATIVE_THREADS, thread_name_prefix="speculative")
+response_cache = ResponseCache()
+
+voice_metrics.describe("stage_seconds", "Latency of each voice pipeline stage")
+voice_metrics.describe("tool_seconds", "Latency of each agent tool call, including its ERP HTTP request")
+voice_metrics.describe("turn_seconds", "End-to-end latency of a voice turn, from audio received to audio sent")
+voice_metrics.describe("busy_turns_total", "Turns answered with the busy response because a provider call wasn't admitted, by provider")
+voice_metrics.describe("cancelled_turns_total", "Turns abandoned after a barge-in, cancel message or disconnect, by the stage they stopped before")
+
+
+# Spoken instead of an answer when STT or the agent can't get a provider slot in time...
+BUSY_RESPONSE = "Sorry, I'm handling a lot of requests right now. Please try again in a moment."
+# ...unless the turn's tools already wrote to the ERP: asking for a retry would repeat the write...
+WRITE_DONE_BUSY_RESPONSE = ("Done, that change has been saved. I'm handling a lot of requests right now, "
+                            "so I couldn't finish my reply.")
+# ...and instead of the answer's audio when only TTS is saturated (the text is already on screen)
+TTS_BUSY_RESPONSE = "I'm short on voice capacity right now, so the answer is on your screen."
+
 
-def process_audio(webm_data: bytes) -> tuple:
-    """Process WebM audio and return (response_text, is_navigation)"""
+class TurnCancelled(Exception):
+    """Raised inside the pipeline once the client has barged in, cancelled or gone away."""
+
+
+def check_cancelled(cancelled, stage: str):
+    """Cancellation checkpoint: stops the turn before its next provider call. `cancelled` is any Event-like object."""
+    if cancelled is not None and cancelled.is_set():
+        voice_metrics.inc("cancelled_turns_total", stage=stage)
+        raise TurnCancelled(stage)
+
+
+def traced(trace: list, fn, *args):
+    """Runs fn with `trace` as the current request trace; executor threads don't inherit context vars."""
+    token = current_trace.set(trace)
     try:
-        # Convert WebM to WAV
-        webm_audio = AudioSegment.from_file(io.BytesIO(webm_data), format="webm")
-        wav_audio = webm_audio.set_frame_rate(16000).set_channels(1)
-        wav_buffer = io.BytesIO()
-        wav_audio.export(wav_buffer, format="wav")
-        
-        # Transcribe audio
-        logger.info("🎙️ Processing audio input")
-        transcript = groq_client.audio.transcriptions.create(
-            file=("audio-file.wav", wav_buffer.getvalue()),
-            model="whisper-large-v3-turbo",
-            response_format="text",
-        )
+        return fn(*args)
+    finally:
+        current_trace.reset(token)
+
+
+def cacheable_tables(messages) -> list:
+    """Returns the tables the latest turn read from, or None if it called any tool with side effects."""
+    human_indices = [i for i, m in enumerate(messages) if getattr(m, "type", None) == "human"]
+    if human_indices:
+        messages = messages[human_indices[-1]:]
+    tool_names = [call["name"] for m in messages for call in (getattr(m, "tool_calls", None) or [])]
+    if not tool_names or any(name not in READ_ONLY_TOOL_TABLES for name in tool_names):
+        return None
+    return sorted({table for name in tool_names for table in READ_ONLY_TOOL_TABLES[name]})
+
+def conversation_context(session_id: str) -> str:
+    """
+    What a cached answer must have been given in: nothing for a session's first, self-contained
+    question; otherwise the session and the assistant's last message, so a "yes" is only ever
+    answered for the question it replies to.
+    """
+    messages = get_agent().get_state(session_config(session_id)).values.get("messages") or []
+    if not messages:
+        return ""
+    last_ai = next((m.content for m in reversed(messages) if getattr(m, "type", None) == "ai" and m.content), "")
+    return f"{session_id}\n{last_ai}"
+
+def record_cached_turn(session_id: str, transcript: str, response: str):
+    """A cache hit skips the agent, so the exchange goes into the conversation thread here for the next turn to see."""
+    from langchain_core.messages import AIMessage, HumanMessage
+    get_agent().update_state(session_config(session_id), {"messages": [HumanMessage(content=transcript),
+                                                                       AIMessage(content=response)]}, as_node="agent")
+
+def turn_wrote(session_id: str) -> bool:
+    """Whether the session's latest turn has already run a tool that writes to the ERP."""
+    messages = get_agent().get_state(session_config(session_id)).values.get("messages") or []
+    for message in reversed(messages):
+        if getattr(message, "type", None) == "human":
+            return False
+        if getattr(message, "type", None) == "tool" and (message.name or "").startswith(WRITE_TOOLS_PREFIXES):
+            return True
+    return False
+
+def close_pending_tool_calls(agent, config: dict, last_message):
+    """Answers the tool calls a cancelled turn will never run, so the thread stays valid for the next turn."""
+    tool_calls = getattr(last_message, "tool_calls", None)
+    if tool_calls:
+        from langchain_core.messages import ToolMessage
+        agent.update_state(config, {"messages": [
+            ToolMessage(content="Cancelled: the user interrupted before this ran.", tool_call_id=call["id"])
+            for call in tool_calls
+        ]}, as_node="tools")
+
+def run_agent(transcript: str, session_id: str, cancelled=None, page: str = "/") -> dict:
+    """Runs the agent one graph step at a time, so a cancelled turn stops before its next LLM or tool call."""
+    agent = get_agent()
+    config = session_config(session_id)
+    steps = agent.stream({"messages": [{"role": "user", "content": transcript}]}, config=config,
+                         context=AgentContext(page=page), stream_mode="values")
+    state = None
+    token = current_turn.set((session_id, transcript))
+    try:
+        for state in steps:
+            if cancelled is not None and cancelled.is_set():
+                steps.close()
+                close_pending_tool_calls(agent, config, state["messages"][-1])
+                check_cancelled(cancelled, "agent")
+    finally:
+        current_turn.reset(token)
+    return state
+
+def transcribe(upload: tuple) -> str:
+    return get_groq_client().audio.transcriptions.create(
+        file=upload,
+        model="whisper-large-v3-turbo",
+        response_format="text",
+    )
+
+def speculate(stable_text: str):
+    """Read-only work the coming turn will probably need: the lists it may search."""
+    try:
+        with voice_metrics.span("stage_seconds", stage="prefetch"):
+            for table in tables_mentioned(stable_text):
+                list_prefetch.warm(table, BASE_URL, erp_http)
+    except Exception as e:
+        logger.warning(f"⚠️ Speculative prefetch failed: {e}")
+
+def partial_transcript(audio_data: bytes, audio_format: str, session_id: str, previous: str = "", previous_stable: str = "") -> tuple:
+    """Transcribes the audio received so far and starts prefetching for its stable prefix. Returns (text, stable prefix)."""
+    # Partials are best effort: under load they give way to final transcriptions instead of queueing
+    with voice_metrics.span("stage_seconds", stage="stt_partial"), provider_slot("stt", session_id, max_wait=0):
+        text = transcribe(prepare_upload(audio_data, audio_format)).strip()
+    stable = stable_prefix(previous, text)
+    if stable and stable != previous_stable:
+        speculative_executor.submit(speculate, stable)
+    return text, stable
+
+def process_audio(audio_data: bytes, session_id: str = "default_user", cancelled=None, audio_format: str = "webm",
+                  transcript: Optional[str] = None, page: str = "/") -> tuple:
+    """
+    Process recorded audio and return (response_text, transcript). Raises TurnCancelled once `cancelled` is set.
+    A `transcript` already known from the partials skips speech-to-text; `page` is the UI page the user is on.
+    """
+    try:
+        if transcript is None:
+            with voice_metrics.span("stage_seconds", stage="decode"):
+                upload = prepare_upload(audio_data, audio_format)
+
+            # Transcribe audio
+            check_cancelled(cancelled, "stt")
+            logger.info("🎙️ Processing audio input")
+            with voice_metrics.span("stage_seconds", stage="stt"), provider_slot("stt", session_id):
+                transcript = transcribe(upload)
         logger.info(f'👂 Transcribed: "{transcript}"')
         
+        # Serve repeated read-only questions from the cache while their data is unchanged
+        with voice_metrics.span("stage_seconds", stage="cache_lookup"):
+            data_versions = fetch_data_versions(BASE_URL, erp_http)
+            list_prefetch.note_versions(data_versions)
+            context = conversation_context(session_id)
+            cached_response = response_cache.lookup(transcript, data_versions, context)
+        if cached_response is not None:
+            logger.info(f'⚡ Cache hit: "{cached_response}"')
+            record_cached_turn(session_id, transcript, cached_response)
+            return cached_response, transcript
+
         # Run agent
-        agent_response = agent.invoke(
-            {"messages": [{"role": "user", "content": transcript}]}, config=agent_config
-        )
+        check_cancelled(cancelled, "agent")
+        with voice_metrics.span("stage_seconds", stage="agent"):
+            agent_response = run_agent(transcript, session_id, cancelled, page)
         response_text = agent_response["messages"][-1].content
         logger.info(f'💬 Response: "{response_text}"')
+
+        tables = cacheable_tables(agent_response["messages"])
+        if tables:
+            response_cache.store(transcript, response_text, tables, data_versions, context)
         
         # Check for navigation keywords
         # navigation_keywords = [
@@ -71,11 +241,169 @@ def process_audio(webm_data: bytes) -> tuple:
         
         return response_text, transcript
             
+    except TurnCancelled:
+        raise
+    except Overloaded as e:
+        voice_metrics.inc("busy_turns_total", provider=e.provider)
+        if e.provider == "llm" and turn_wrote(session_id):
+            logger.warning(f"🚦 Turn wrote to the ERP before being turned away, reporting it as done: {e}")
+            return WRITE_DONE_BUSY_RESPONSE, transcript
+        logger.warning(f"🚦 Answering with the busy response: {e}")
+        return BUSY_RESPONSE, transcript or False
     except Exception as e:
         logger.error(f"Audio processing error: {e}")
         return "Sorry, I encountered an error processing your request.", False
 
+def tts_stream(text: str, cancelled, audio_format: str) -> bytes:
+    chunks = []
+    with get_groq_client().audio.speech.with_streaming_response.create(
+        model="playai-tts", voice="Celeste-PlayAI", response_format=audio_format, input=text, **tts_options(audio_format)
+    ) as tts_response:
+        for chunk in tts_response.iter_bytes(16384):
+            check_cancelled(cancelled, "tts_stream")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+# Busy phrases, synthesized for every output format during warm-up, so they play even when TTS is saturated
+CANNED_PHRASES = (BUSY_RESPONSE, TTS_BUSY_RESPONSE)
+canned_audio = {}
+
+def synthesize_canned_speech():
+    for text in CANNED_PHRASES:
+        for audio_format in OUTPUT_FORMATS:
+            try:
+                canned_audio[(text, audio_format)] = tts_stream(text, None, audio_format)
+            except Exception as e:
+                logger.warning(f"⚠️ Couldn't pre-synthesize a busy phrase ({audio_format}), it will be text-only: {e}")
+
+def synthesize_speech(text: str, cancelled=None, audio_format: str = "mp3", session_id: str = "default_user") -> Optional[bytes]:
+    """
+    Generate the spoken audio (MP3 or Ogg) for a response. A cancelled turn closes the TTS stream early.
+    Returns None when TTS is saturated and the busy phrase wasn't pre-synthesized: the turn is text-only.
+    """
+    check_cancelled(cancelled, "tts")
+    logger.info("🔊 Generating TTS audio...")
+    with voice_metrics.span("stage_seconds", stage="tts"):
+        if text == BUSY_RESPONSE:
+            audio_out = canned_audio.get((text, audio_format))
+        else:
+            try:
+                with provider_slot("tts", session_id):
+                    audio_out = tts_stream(text, cancelled, audio_format)
+            except Overloaded as e:
+                voice_metrics.inc("busy_turns_total", provider=e.provider)
+                audio_out = canned_audio.get((TTS_BUSY_RESPONSE, audio_format))
+    if audio_out is None:
+        logger.warning("🔇 No audio for this response, it is text-only")
+        return None
+    logger.info(f"🎵 Generated TTS audio: {len(audio_out)} bytes ({audio_format})")
+    return audio_out
+
+# --- Startup & Readiness ---
+startup_stats = {"import_seconds": None, "warmup_seconds": None, "first_turn_seconds": None, "warmup_error": None}
+ready = asyncio.Event()
+
+def warm_up():
+    """
+    Does the one-off work a first turn would otherwise pay for: builds the Groq client and
+    compiles the agent graph, opens the HTTP connections to Groq and the ERP API, and
+    synthesizes the busy phrases. With VOICE_WARMUP_INFERENCE=1 it also runs a one-token completion.
+    """
+    start = time.perf_counter()
+    client = get_groq_client()
+    get_agent()
+    logger.info(f"🧠 Agent graph compiled in {time.perf_counter() - start:.2f}s")
+    try:
+        erp_http.get(f"{BASE_URL}/data_version", timeout=2)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"⚠️ ERP API not reachable during warm-up: {e}")
+    try:
+        client.models.list()
+        if WARMUP_INFERENCE:
+            get_model().bind(max_tokens=1).invoke("Reply with OK")
+    except Exception as e:
+        logger.warning(f"⚠️ Groq API not reachable during warm-up: {e}")
+    synthesize_canned_speech()
+    startup_stats["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(f"🔥 Warm-up finished in {startup_stats['warmup_seconds']}s")
+
+async def run_warm_up():
+    try:
+        await asyncio.get_event_loop().run_in_executor(executor, warm_up)
+    except Exception as e:
+        startup_stats["warmup_error"] = str(e)
+        logger.error(f"Warm-up failed: {e}")
+    finally:
+        ready.set()
+
+@app.on_event("startup")
+async def start_warm_up():
+    # /health answers right away; /ready and new sessions wait for the warm-up
+    app.state.warm_up = asyncio.create_task(run_warm_up())
+
 # --- API Routes (Global Scope) ---
+async def run_turn(websocket: WebSocket, audio: bytes, session_id: str, cancelled: threading.Event, send_trace: bool,
+                   formats: dict, page: str, transcript: Optional[str] = None):
+    """One voice turn: STT and the agent, the text messages, then TTS and the audio. Nothing is sent once cancelled."""
+    loop = asyncio.get_event_loop()
+    turn_start = time.perf_counter()
+    trace = []
+    try:
+        response_text, transcript = await loop.run_in_executor(
+            executor,
+            lambda: traced(trace, process_audio, audio, session_id, cancelled, formats["input"], transcript, page)
+        )
+        check_cancelled(cancelled, "send")
+
+        send_start = time.perf_counter()
+        # ---- NEW CHANGE 1: Send the transcription to the frontend ----
+        if transcript:
+            logger.info("-=> Sending transcription to client")
+            await websocket.send_json({"type": "transcription", "data": transcript})
+
+        # ---- NEW CHANGE 2: Send the agent's text response to the frontend ----
+        if response_text:
+            logger.info("-=> Sending agent response to client")
+            await websocket.send_json({"type": "agent_response", "data": response_text})
+        send_seconds = time.perf_counter() - send_start
+
+        # Synthesize off the event loop so other sessions keep being served
+        audio_out = await loop.run_in_executor(
+            executor,
+            lambda: traced(trace, synthesize_speech, response_text, cancelled, formats["output"], session_id)
+        )
+        check_cancelled(cancelled, "send")
+
+        send_start = time.perf_counter()
+        if audio_out is None:
+            await websocket.send_json({"type": "no_audio"})
+        else:
+            await websocket.send_bytes(audio_out)
+        send_seconds += time.perf_counter() - send_start
+        voice_metrics.observe("stage_seconds", send_seconds, stage="socket_send")
+        trace.append({"span": "stage_seconds", "stage": "socket_send", "ms": round(send_seconds * 1000, 1)})
+
+        turn_seconds = time.perf_counter() - turn_start
+        voice_metrics.observe("turn_seconds", turn_seconds)
+        if startup_stats["first_turn_seconds"] is None:
+            startup_stats["first_turn_seconds"] = round(turn_seconds, 3)
+        stages = ", ".join(f"{s.get('stage') or s.get('tool')}={s['ms']}ms" for s in trace)
+        logger.info(f"✅ Audio response sent successfully in {turn_seconds * 1000:.0f}ms ({stages})")
+        if send_trace:
+            await websocket.send_json({"type": "trace", "data": {"total_ms": round(turn_seconds * 1000, 1), "spans": trace}})
+
+        # if is_navigation:
+        #     audio = AudioSegment.from_file(io.BytesIO(mp3_data), format="mp3")
+        #     duration_seconds = len(audio) / 1000.0
+        #     await asyncio.sleep(duration_seconds + 0.5)
+        #     logger.info("🚀 Sending navigation flag")
+        #     await websocket.send_text("NAVIGATE_NOW")
+        #     logger.info("✅ Navigation flag sent")
+    except TurnCancelled as e:
+        logger.info(f"✋ Turn cancelled before {e} (session {session_id})")
+    except Exception as e:
+        logger.error(f"Turn failed: {e}")
+
 @app.websocket("/")
 async def websocket_endpoint(websocket: WebSocket):
     from starlette.websockets import WebSocketState
@@ -88,61 +416,23 @@ async def websocket_endpoint(websocket: WebSocket):
         return
         
     await websocket.accept()
-    logger.info("WebSocket connection accepted")
-    
+    # The browser sends a stable per-tab id so the conversation survives reconnects
+    session_id = websocket.query_params.get("session") or str(uuid.uuid4())
+    send_trace = TRACE_ALL_TURNS or websocket.query_params.get("trace") == "1"
+    await ready.wait()
+    loop = asyncio.get_event_loop()
+
+    async def turn(audio: bytes, transcript: Optional[str], cancelled: threading.Event, formats: dict, page: str):
+        await run_turn(websocket, audio, session_id, cancelled, send_trace, formats, page, transcript)
+
+    async def transcribe_partial(audio: bytes, audio_format: str, previous: str, previous_stable: str) -> tuple:
+        return await loop.run_in_executor(
+            speculative_executor, partial_transcript, audio, audio_format, session_id, previous, previous_stable)
+
+    session = VoiceSession(websocket, session_id, turn, transcribe_partial, threading.Event)
+    logger.info(f"WebSocket connection accepted (session {session_id}, audio in {session.formats['input']} / out {session.formats['output']})")
     try:
-        while True:
-            if websocket.client_state == WebSocketState.DISCONNECTED:
-                logger.info("Client disconnected, stopping audio processing")
-                break
-                
-            try:
-                message = await websocket.receive_bytes()
-                logger.info(f"📥 Received audio data: {len(message)} bytes")
-            except Exception as e:
-                if "1001" in str(e) or "going away" in str(e):
-                    logger.info("Client disconnected during audio reception")
-                    break
-                else:
-                    logger.error(f"Error receiving audio: {e}")
-                    break
-            
-            # This function call doesn't change
-            response_text, transcript = await asyncio.get_event_loop().run_in_executor(
-                executor,
-                lambda: process_audio(message)
-            )
-            
-            # ---- NEW CHANGE 1: Send the transcription to the frontend ----
-            if transcript:
-                logger.info("-=> Sending transcription to client")
-                await websocket.send_json({"type": "transcription", "data": transcript})
-            
-            # ---- NEW CHANGE 2: Send the agent's text response to the frontend ----
-            if response_text:
-                logger.info("-=> Sending agent response to client")
-                await websocket.send_json({"type": "agent_response", "data": response_text})
-
-            # This part remains the same
-            logger.info("🔊 Generating TTS audio...")
-            tts_response = groq_client.audio.speech.create(
-                model="playai-tts", voice="Celeste-PlayAI", response_format="mp3", input=response_text
-            )
-            
-            mp3_data = b"".join(tts_response.iter_bytes())
-            logger.info(f"🎵 Generated TTS audio: {len(mp3_data)} bytes")
-            
-            await websocket.send_bytes(mp3_data)
-            logger.info("✅ Audio response sent successfully")
-            
-            # if is_navigation:
-            #     audio = AudioSegment.from_file(io.BytesIO(mp3_data), format="mp3")
-            #     duration_seconds = len(audio) / 1000.0
-            #     await asyncio.sleep(duration_seconds + 0.5)
-            #     logger.info("🚀 Sending navigation flag")
-            #     await websocket.send_text("NAVIGATE_NOW")
-            #     logger.info("✅ Navigation flag sent")
-                
+        await session.run()
     except Exception as e:
         if "1001" in str(e) or "going away" in str(e):
             logger.info("Client disconnected normally")
@@ -153,10 +443,45 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.close()
             logger.info("🔌 WebSocket connection closed")
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: per-stage, per-tool and end-to-end turn latency."""
+    return PlainTextResponse(voice_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness_check():
+    """200 once warm-up has finished, 503 before that (or if it failed), for load balancer readiness probes."""
+    if not ready.is_set():
+        return JSONResponse({"status": "warming_up", **startup_stats}, status_code=503)
+    if startup_stats["warmup_error"]:
+        return JSONResponse({"status": "failed", **startup_stats}, status_code=503)
+    return {"status": "ready", **startup_stats}
+
+@app.get("/sessions")
+async def session_stats():
+    """Open sessions with their turn queues, for spotting a backed-up session."""
+    return {session_id: session.snapshot() for session_id, session in sessions.items()}
+
+@app.get("/admission")
+async def admission_stats():
+    """Running and waiting provider calls per provider, against their concurrency and rate limits."""
+    return {provider: scheduler.snapshot() for provider, scheduler in schedulers.items()}
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return response_cache.snapshot()
+
+@app.get("/tool_stats")
+async def tool_stats():
+    return token_stats
+
+startup_stats["import_seconds"] = round(time.perf_counter() - _import_start, 3)
+logger.info(f"📦 voice_stream imported in {startup_stats['import_seconds']}s")
+
 
 # --- Main Block for Local Development ONLY ---
 if __name__ == "__main__":